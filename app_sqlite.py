@@ -1,20 +1,47 @@
-from flask import Flask, jsonify, request, render_template
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask import Flask, jsonify
 from sqlite_routes import register_sqlite_routes
 import os
 
-# Create a Flask application
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'dev_key_for_testing')
+def create_app(config=None):
+    """
+    Create the TwinFix SQLite API application.
+    Nothing touches the database here, so servers can preload the app
+    before forking workers (e.g. gunicorn --preload "app_sqlite:create_app()");
+    each worker opens its own connections and checks the schema on first use.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'dev_key_for_testing')
 
-# Register SQLite routes
-register_sqlite_routes(app)
+    # Storage settings, overridable per app (e.g. a temporary database in tests)
+    app.config.update(
+        STORAGE_BACKEND=os.environ.get('STORAGE_BACKEND', 'sqlite'),
+        SQLITE_DB_PATH=os.environ.get('SQLITE_DB_PATH', 'issues.db'),
+        SQLITE_ARCHIVE_PATH=os.environ.get('SQLITE_ARCHIVE_PATH'),
+        SQLITE_SHARDS=os.environ.get('SQLITE_SHARDS'),
+        SQLITE_SHARD_GROUPS=os.environ.get('SQLITE_SHARD_GROUPS'),
+        SQLITE_BUSY_TIMEOUT=os.environ.get('SQLITE_BUSY_TIMEOUT'),
+        SQLITE_WRITE_RETRIES=os.environ.get('SQLITE_WRITE_RETRIES'),
+        SQLITE_MAINTENANCE_INTERVAL=os.environ.get('SQLITE_MAINTENANCE_INTERVAL'),
+        SQLITE_MAINTENANCE_QUIET=os.environ.get('SQLITE_MAINTENANCE_QUIET'),
+        JOB_WORKERS=os.environ.get('JOB_WORKERS'),
+        JOB_WORKER_MODE=os.environ.get('JOB_WORKER_MODE', 'thread'),
+        ADMISSION_CONTROL=os.environ.get('ADMISSION_CONTROL', 'false'),
+        ADMISSION_READ_LIMIT=os.environ.get('ADMISSION_READ_LIMIT'),
+        ADMISSION_WRITE_LIMIT=os.environ.get('ADMISSION_WRITE_LIMIT'),
+    )
+    if config:
+        app.config.update(config)
 
-# Root route
-@app.route('/')
-def index():
-    return jsonify({"message": "TwinFix API with SQLite is running"})
+    # Register SQLite routes
+    register_sqlite_routes(app)
+
+    # Root route
+    @app.route('/')
+    def index():
+        return jsonify({"message": "TwinFix API with SQLite is running"})
+
+    return app
 
 # Run the application
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5001, debug=True)
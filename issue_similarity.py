@@ -0,0 +1,152 @@
+import hashlib
+import math
+import re
+import struct
+
+# MinHash signature of an issue's title and description trigrams, split into
+# LSH bands of ROWS values. Two issues share a band (and so become duplicate
+# candidates) with probability 1 - (1 - J ** ROWS) ** BANDS for trigram
+# Jaccard similarity J: about 0.8 at J = 0.3 and 0.99 at J = 0.5.
+BANDS = 16
+ROWS = 2
+
+# Each trigram is hashed BANDS * ROWS times as 32-bit slices of salted
+# blake2b digests; unlike hash(), these stay the same across processes, so
+# stored band keys remain comparable after restarts
+_SALTS = [str(n).encode() for n in range(BANDS * ROWS // 16)]
+_UNPACK = struct.Struct('<16I').unpack
+
+_WORD = re.compile(r'\w+')
+
+# Newest issues read per matching band, and candidates scored per lookup,
+# so a lookup stays bounded even where many issues share a band
+BAND_SCAN_LIMIT = 100
+MAX_CANDIDATES = 200
+
+# Defaults for find_similar_issues
+DEFAULT_SIMILAR_LIMIT = 5
+DEFAULT_MIN_SIMILARITY = 0.3
+
+# Distances at which proximity falls to zero: floor plan pixels, and metres
+PIN_RADIUS = 150.0
+GEO_RADIUS_M = 100.0
+
+# Weights of the title and description similarity, and of proximity when
+# both issues have a position
+TITLE_WEIGHT = 0.6
+PROXIMITY_WEIGHT = 0.3
+
+
+def trigrams(text):
+    """Get the set of character trigrams of a text's words, case-folded and padded"""
+    shingles = set()
+    for word in _WORD.findall((text or '').casefold()):
+        padded = f' {word} '
+        shingles.update(padded[n:n + 3] for n in range(len(padded) - 2))
+    return shingles
+
+
+def jaccard(first, second):
+    """Jaccard similarity of two sets (0 when both are empty)"""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def band_keys(location, title, description):
+    """
+    Get the LSH band keys of an issue: signed 64-bit integers, so they fit a
+    SQLite INTEGER. The location is part of every key, so only issues at
+    the same location can collide.
+    """
+    shingles = trigrams(title) | trigrams(description)
+    if not shingles:
+        return []
+    hashes = []
+    for shingle in shingles:
+        data = shingle.encode('utf-8')
+        hashes.append(sum((_UNPACK(hashlib.blake2b(data, salt=salt).digest()) for salt in _SALTS), ()))
+    signature = [min(column) for column in zip(*hashes)]
+    keys = []
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            f"{location}\x1f{band}\x1f{','.join(map(str, values))}".encode('utf-8'), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _distance(query, candidate):
+    """Get (proximity 0..1, distance) from floor plan pins, else coordinates, or (None, None)"""
+    pins = [_float(point.get(key)) for point in (query, candidate) for key in ('pin_x', 'pin_y')]
+    if None not in pins:
+        distance = math.hypot(pins[0] - pins[2], pins[1] - pins[3])
+        return max(0.0, 1 - distance / PIN_RADIUS), {"pixels": round(distance, 1)}
+
+    coordinates = [_float(point.get(key)) for point in (query, candidate) for key in ('latitude', 'longitude')]
+    if None not in coordinates:
+        lat1, lng1, lat2, lng2 = map(math.radians, coordinates)
+        # Haversine distance in metres
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distance = 2 * 6371000 * math.asin(math.sqrt(h))
+        return max(0.0, 1 - distance / GEO_RADIUS_M), {"metres": round(distance, 1)}
+
+    return None, None
+
+
+def score(query, candidate, query_trigrams=None):
+    """
+    Score how likely a candidate issue duplicates a query issue (both with
+    snake_case keys): trigram similarity of titles and descriptions,
+    blended with proximity when both have a pin or coordinates.
+    query_trigrams may pass the query's (title, description) trigrams in.
+    """
+    title_trigrams, description_trigrams = query_trigrams or (
+        trigrams(query.get('title')), trigrams(query.get('description'))
+    )
+    title = jaccard(title_trigrams, trigrams(candidate.get('title')))
+    description = jaccard(description_trigrams, trigrams(candidate.get('description')))
+    text = TITLE_WEIGHT * title + (1 - TITLE_WEIGHT) * description if query.get('description') else title
+
+    proximity, distance = _distance(query, candidate)
+    total = text if proximity is None else (1 - PROXIMITY_WEIGHT) * text + PROXIMITY_WEIGHT * proximity
+    return {
+        "score": round(total, 3),
+        "titleScore": round(title, 3),
+        "descriptionScore": round(description, 3),
+        "proximity": round(proximity, 3) if proximity is not None else None,
+        "distance": distance,
+    }
+
+
+def query_issue(issue):
+    """Map an issue as sent to create_issue (camelCase) to the stored column names"""
+    return {
+        "title": issue.get('title'),
+        "description": issue.get('description'),
+        "location": issue.get('location'),
+        "pin_x": issue.get('pinX'),
+        "pin_y": issue.get('pinY'),
+        "latitude": issue.get('latitude'),
+        "longitude": issue.get('longitude'),
+    }
+
+
+def rank_candidates(query, candidates, limit=DEFAULT_SIMILAR_LIMIT, min_score=DEFAULT_MIN_SIMILARITY):
+    """Score candidate issues against a query issue and get the best, each with a "similarity" entry"""
+    query_trigrams = (trigrams(query.get('title')), trigrams(query.get('description')))
+    scored = []
+    for candidate in candidates:
+        similarity = score(query, candidate, query_trigrams)
+        if similarity["score"] >= min_score:
+            scored.append({**candidate, "similarity": similarity})
+    scored.sort(key=lambda item: (-item["similarity"]["score"], -item["created_at"]))
+    return scored[:limit]
@@ -0,0 +1,684 @@
+import bisect
+import collections
+import math
+import threading
+from datetime import datetime, timedelta
+
+import issue_similarity
+from sqlite_db import (
+    ACTIVITY_COUNTERS, BUCKET_EXPRESSIONS, ISSUE_COLUMNS, ISSUE_UPDATE_FIELDS, PERCENTILE_GROUP_COLUMNS, PRIORITY_RANKS,
+    QUERY_FILTERS, SIMILAR_ISSUE_FIELDS, TIMESTAMP_FILTERS, USER_FEED_ROLES, IssueVersionConflict,
+    decode_feed_cursor, encode_feed_cursor, issue_projection, now_ms, parse_issue_sort, to_epoch_ms,
+)
+from storage_backend import DEFAULT_LEASE_SECONDS, DuplicateUsername, LeaseNotHeld, StorageBackend, extended_lease
+
+# Python equivalents of QUERY_FILTERS: name -> predicate(issue, value).
+# Comparisons against a missing value are false, as they are in SQL.
+MEMORY_FILTERS = {
+    'status': lambda issue, values: issue['status'] in values,
+    'issue_type': lambda issue, values: issue['issue_type'] in values,
+    'priority': lambda issue, values: issue['priority'] in values,
+    'location': lambda issue, value: issue['location'] == value,
+    'reported_by_id': lambda issue, value: issue['reported_by_id'] == value,
+    'created_from': lambda issue, value: issue['created_at'] >= value,
+    'created_to': lambda issue, value: issue['created_at'] < value,
+    'fixed_from': lambda issue, value: issue['fixed_at'] is not None and issue['fixed_at'] >= value,
+    'fixed_to': lambda issue, value: issue['fixed_at'] is not None and issue['fixed_at'] < value,
+    'min_estimated_cost': lambda issue, value: issue['estimated_cost'] is not None and issue['estimated_cost'] >= value,
+    'max_estimated_cost': lambda issue, value: issue['estimated_cost'] is not None and issue['estimated_cost'] <= value,
+    'min_final_cost': lambda issue, value: issue['final_cost'] is not None and issue['final_cost'] >= value,
+    'max_final_cost': lambda issue, value: issue['final_cost'] is not None and issue['final_cost'] <= value,
+}
+
+DAY_MS = 86400000
+
+
+def _sort_value(issue, key):
+    """Sort value for a QUERY_SORT_KEYS key; missing values sort first, as NULLs do in SQLite"""
+    if key == 'priority':
+        return (True, PRIORITY_RANKS.get(issue['priority'], 0))
+    value = issue[key]
+    return (value is not None, value if value is not None else 0)
+
+
+class InMemoryStorage(StorageBackend):
+    """
+    Storage kept in Python dicts, for tests and benchmarks. Issues are also
+    indexed by (created_at, id) in a sorted list and by status and type, so
+    listings do not scan every issue. Behaves like SQLiteStorage, which the
+    shared conformance tests check; nothing is persisted.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sequences = {'users': 0, 'issues': 0, 'images': 0, 'comments': 0, 'status_history': 0}
+        self._users = {}
+        self._user_ids_by_name = {}
+        # Live and archived rows per table
+        self._issues = {}
+        self._images = {}
+        self._comments = {}
+        self._history = {}
+        self._archive = {'issues': {}, 'images': {}, 'comments': {}, 'status_history': {}}
+        # Indexes over live issues, and child ids per issue (live and archived)
+        self._created_index = []
+        self._ids_by_status = {}
+        self._ids_by_type = {}
+        # Near-duplicate band keys: key -> ids, and id -> ((location, title, description), keys)
+        self._ids_by_band = {}
+        self._band_keys = {}
+        self._children = {'images': {}, 'comments': {}, 'status_history': {}}
+        self._version = 0
+        self._changed_at = datetime.utcnow().isoformat(timespec='milliseconds')
+        self._write_metrics = {"transactions": 0, "retries": 0, "giveUps": 0}
+
+    # Write bookkeeping
+    def _next_id(self, table):
+        self._sequences[table] += 1
+        return self._sequences[table]
+
+    def _changed(self):
+        """Count a write transaction that changed issue data"""
+        self._write_metrics["transactions"] += 1
+        self._version += 1
+        self._changed_at = datetime.utcnow().isoformat(timespec='milliseconds')
+
+    def _index_issue(self, issue):
+        bisect.insort(self._created_index, (issue['created_at'], issue['id']))
+        self._ids_by_status.setdefault(issue['status'], set()).add(issue['id'])
+        self._ids_by_type.setdefault(issue['issue_type'], set()).add(issue['id'])
+        # Band keys are only recomputed when the text they hash changed
+        text = (issue['location'], issue['title'], issue['description'])
+        cached = self._band_keys.get(issue['id'])
+        keys = cached[1] if cached and cached[0] == text else issue_similarity.band_keys(*text)
+        self._band_keys[issue['id']] = (text, keys)
+        for key in keys:
+            self._ids_by_band.setdefault(key, set()).add(issue['id'])
+
+    def _unindex_issue(self, issue, removed=False):
+        position = bisect.bisect_left(self._created_index, (issue['created_at'], issue['id']))
+        del self._created_index[position]
+        self._ids_by_status[issue['status']].discard(issue['id'])
+        self._ids_by_type[issue['issue_type']].discard(issue['id'])
+        _, keys = self._band_keys.pop(issue['id']) if removed else self._band_keys[issue['id']]
+        for key in keys:
+            self._ids_by_band[key].discard(issue['id'])
+
+    def _child_rows(self, table, issue_id):
+        """Get the live and archived child rows of an issue in id order"""
+        rows = self._child_tables(table)
+        return [
+            dict(rows[0].get(id) or rows[1][id])
+            for id in self._children[table].get(issue_id, [])
+        ]
+
+    def _child_tables(self, table):
+        live = {'images': self._images, 'comments': self._comments, 'status_history': self._history}[table]
+        return live, self._archive[table]
+
+    def _add_child(self, table, row):
+        self._child_tables(table)[0][row['id']] = row
+        self._children[table].setdefault(row['issue_id'], []).append(row['id'])
+        # Keep the activity counters in step, as the SQLite triggers do
+        issue = self._issues.get(row['issue_id'])
+        if issue:
+            issue[ACTIVITY_COUNTERS[table]] += 1
+            issue['last_activity_at'] = max(issue['last_activity_at'], row['created_at'])
+
+    def _image_urls(self, issue_id):
+        live, archived = self._child_tables('images')
+        return [
+            (live.get(id) or archived[id])['filename']
+            for id in self._children['images'].get(issue_id, ())
+        ]
+
+    def _full_issue(self, issue):
+        return {**issue, 'image_urls': self._image_urls(issue['id'])}
+
+    def _project(self, issues, fields):
+        """Copy issues with only the requested fields, like the SQL listings"""
+        columns, image_fields = issue_projection(fields)
+        projected = []
+        for issue in issues:
+            item = {column: issue[column] for column in columns}
+            if image_fields:
+                filenames = self._image_urls(issue['id'])
+                if 'thumbnail_url' in image_fields:
+                    item['thumbnail_url'] = filenames[0] if filenames else None
+                if 'image_urls' in image_fields:
+                    item['image_urls'] = filenames
+            projected.append(item)
+        return projected
+
+    def _newest_first(self, ids=None):
+        """Live issues newest first, optionally only those in a set of ids"""
+        if ids is None:
+            return [self._issues[id] for _, id in reversed(self._created_index)]
+        return sorted(
+            (self._issues[id] for id in ids),
+            key=lambda issue: (issue['created_at'], issue['id']), reverse=True
+        )
+
+    def get_write_metrics(self):
+        """Get counts of write transactions, lock retries and give-ups"""
+        with self._lock:
+            return dict(self._write_metrics)
+
+    def get_data_version(self):
+        """Get a counter that increases on every change to issue data"""
+        with self._lock:
+            return {"version": self._version, "changedAt": self._changed_at}
+
+    # Archive operations
+    def archive_fixed_issues(self, older_than_days=90, batch_size=500):
+        """Move issues fixed more than older_than_days ago, with their child rows, to the archive"""
+        cutoff = now_ms() - older_than_days * DAY_MS
+        with self._lock:
+            issues = sorted(
+                (issue for issue in self._issues.values()
+                 if issue['status'] == 'fixed' and issue['fixed_at'] is not None and issue['fixed_at'] < cutoff),
+                key=lambda issue: issue['fixed_at']
+            )
+            for issue in issues:
+                self._unindex_issue(issue, removed=True)
+                self._archive['issues'][issue['id']] = self._issues.pop(issue['id'])
+                for table in self._children:
+                    live, archived = self._child_tables(table)
+                    for id in self._children[table].get(issue['id'], []):
+                        if id in live:
+                            archived[id] = live.pop(id)
+            if issues:
+                self._changed()
+
+        return {
+            "archivedIssues": len(issues),
+            "batches": math.ceil(len(issues) / batch_size),
+            "cutoff": cutoff,
+        }
+
+    # User operations
+    def get_user(self, id):
+        """Get user by ID"""
+        with self._lock:
+            user = self._users.get(id)
+            return dict(user) if user else None
+
+    def get_user_by_username(self, username):
+        """Get user by username"""
+        with self._lock:
+            id = self._user_ids_by_name.get(username)
+            return dict(self._users[id]) if id else None
+
+    def create_user(self, user):
+        """Create a new user"""
+        with self._lock:
+            if user['username'] in self._user_ids_by_name:
+                raise DuplicateUsername(user['username'])
+            user_id = self._next_id('users')
+            self._users[user_id] = {
+                'id': user_id, 'username': user['username'], 'email': user.get('email'),
+                'password': user['password'], 'role': user['role'],
+            }
+            self._user_ids_by_name[user['username']] = user_id
+            self._write_metrics["transactions"] += 1
+        return {**user, 'id': user_id}
+
+    # Issue operations
+    def query_issues(self, filters=None, sort='-created_at', page=1, page_size=50, fields=None):
+        """Get one page of issues matching QUERY_FILTERS, plus the total number of matches"""
+        filters = filters or {}
+        unknown = [name for name in filters if name not in QUERY_FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+        key, descending = parse_issue_sort(sort)
+
+        predicates = []
+        for name, value in filters.items():
+            if value is None or value == []:
+                continue
+            if QUERY_FILTERS[name][1]:
+                value = set(value) if isinstance(value, (list, tuple, set)) else {value}
+            elif name in TIMESTAMP_FILTERS:
+                value = to_epoch_ms(value)
+            predicates.append((MEMORY_FILTERS[name], value))
+
+        with self._lock:
+            matches = [
+                issue for issue in self._issues.values()
+                if all(predicate(issue, value) for predicate, value in predicates)
+            ]
+            matches.sort(key=lambda issue: (_sort_value(issue, key), issue['id']), reverse=descending)
+            start = (page - 1) * page_size
+            items = self._project(matches[start:start + page_size], fields)
+
+        return {"items": items, "total": len(matches), "page": page, "pageSize": page_size}
+
+    def get_issues(self, fields=None):
+        """Get all issues, optionally only the given fields"""
+        with self._lock:
+            return self._project(self._newest_first(), fields)
+
+    def get_user_issues(self, user_id, role='reporter', statuses=None, limit=50, cursor=None, fields=None):
+        """Get a keyset-paginated page of the issues a user reported or fixed, and their counts per status"""
+        if role not in USER_FEED_ROLES:
+            raise ValueError(f"Unknown role: {role}")
+        user_column, time_column = USER_FEED_ROLES[role]
+        after = decode_feed_cursor(cursor) if cursor else None
+
+        def position(issue):
+            return (issue[time_column] or 0, issue['id'])
+
+        with self._lock:
+            issues = [issue for issue in self._issues.values() if issue[user_column] == user_id]
+            counts = collections.Counter(issue['status'] for issue in issues)
+            matches = [
+                issue for issue in issues
+                if (not statuses or issue['status'] in statuses) and (after is None or position(issue) < after)
+            ]
+            matches.sort(key=position, reverse=True)
+            page = matches[:limit]
+            items = self._project(page, fields)
+
+        next_cursor = encode_feed_cursor(*position(page[-1])) if len(matches) > limit else None
+        counts = dict(counts)
+        counts['total'] = sum(counts.values())
+        return {"items": items, "nextCursor": next_cursor, "counts": counts}
+
+    def get_issues_by_ids(self, ids, fields=None):
+        """Get many issues, archived ones included, in request order"""
+        ids = list(dict.fromkeys(int(id) for id in ids))
+        with self._lock:
+            found = [self._issues.get(id) or self._archive['issues'].get(id) for id in ids]
+            items = self._project([issue for issue in found if issue], fields)
+
+        return {"items": items, "missing": [id for id, issue in zip(ids, found) if issue is None]}
+
+    def get_issue(self, id, include_archived=True):
+        """Get issue by ID, including archived issues unless told otherwise"""
+        with self._lock:
+            issue = self._issues.get(id)
+            if issue is None and include_archived:
+                issue = self._archive['issues'].get(id)
+            return self._full_issue(issue) if issue else None
+
+    def create_issue(self, issue):
+        """Create a new issue"""
+        with self._lock:
+            now = now_ms()
+            row = {column: None for column in ISSUE_COLUMNS}
+            row.update({
+                'id': self._next_id('issues'),
+                'title': issue['title'], 'description': issue['description'], 'location': issue['location'],
+                'status': issue.get('status', 'pending'), 'priority': issue.get('priority', 'medium'),
+                'issue_type': issue.get('issueType', 'other'),
+                'latitude': issue.get('latitude'), 'longitude': issue.get('longitude'),
+                'pin_x': issue.get('pinX'), 'pin_y': issue.get('pinY'), 'is_interior_pin': issue.get('isInteriorPin'),
+                'reported_by_id': issue['reportedById'], 'reported_by_name': issue['reportedByName'],
+                'estimated_cost': issue.get('estimatedCost', 0),
+                'created_at': now, 'updated_at': now, 'version': 1,
+                'comment_count': 0, 'image_count': 0, 'status_change_count': 0, 'last_activity_at': now,
+            })
+            self._issues[row['id']] = row
+            self._index_issue(row)
+
+            for url in issue.get('imageUrls') or []:
+                self._add_child('images', {
+                    'id': self._next_id('images'), 'filename': url, 'issue_id': row['id'], 'created_at': now,
+                })
+            self._changed()
+            return self._full_issue(row)
+
+    def _check_version(self, issue, expected_version):
+        if expected_version is not None and issue['version'] != expected_version:
+            raise IssueVersionConflict(issue['id'], issue['version'])
+
+    def _apply(self, issue, changes):
+        """Update a live issue in place, keeping the indexes in step"""
+        self._unindex_issue(issue)
+        issue.update(changes)
+        issue['version'] += 1
+        self._index_issue(issue)
+
+    def update_issue(self, id, update_data, expected_version=None):
+        """Update an existing live issue"""
+        with self._lock:
+            issue = self._issues.get(id)
+            if issue is None:
+                return None
+            self._check_version(issue, expected_version)
+
+            changes = {
+                ISSUE_UPDATE_FIELDS[key]: value
+                for key, value in update_data.items() if key in ISSUE_UPDATE_FIELDS
+            }
+            changes['updated_at'] = now_ms()
+            self._apply(issue, changes)
+            self._changed()
+            return self._full_issue(issue)
+
+    def delete_issue(self, id):
+        """Delete an issue"""
+        with self._lock:
+            issue = self._issues.pop(id, None)
+            if issue is None:
+                return False
+            self._unindex_issue(issue, removed=True)
+            self._changed()
+            return True
+
+    def find_similar_issues(self, issue, limit=issue_similarity.DEFAULT_SIMILAR_LIMIT,
+                            min_score=issue_similarity.DEFAULT_MIN_SIMILARITY):
+        """Get open issues at the same location likely duplicating an issue, from the band index"""
+        keys = issue_similarity.band_keys(issue.get('location'), issue.get('title'), issue.get('description'))
+        with self._lock:
+            shared_bands = collections.Counter(
+                id for key in keys for id in self._ids_by_band.get(key, ())
+                if self._issues[id]['status'] != 'fixed'
+            )
+            best = sorted(shared_bands, key=lambda id: (-shared_bands[id], -id))[:issue_similarity.MAX_CANDIDATES]
+            candidates = [{field: self._issues[id][field] for field in SIMILAR_ISSUE_FIELDS} for id in best]
+
+        return issue_similarity.rank_candidates(issue_similarity.query_issue(issue), candidates, limit, min_score)
+
+    def get_nearby_issues(self, lat, lng, radius):
+        """Get issues near a geographical point (flat-earth approximation, as in SQLite)"""
+        with self._lock:
+            issues = []
+            for id in sorted(self._issues):
+                issue = self._issues[id]
+                if not issue['latitude'] or not issue['longitude']:
+                    continue
+                distance = ((float(issue['latitude']) - float(lat)) ** 2 +
+                            (float(issue['longitude']) - float(lng)) ** 2) ** 0.5
+                if distance * 111 <= float(radius):
+                    issues.append(self._full_issue(issue))
+            return issues
+
+    def get_heatmap_points(self):
+        """Get (latitude, longitude, priority rank) rows for open issues with coordinates"""
+        with self._lock:
+            return [
+                (float(issue['latitude']), float(issue['longitude']), PRIORITY_RANKS.get(issue['priority'], 0))
+                for issue in self._issues.values()
+                if issue['latitude'] is not None and issue['longitude'] is not None and issue['status'] != 'fixed'
+            ]
+
+    # Comment operations
+    def get_comments(self, issue_id):
+        """Get comments for an issue, including archived ones"""
+        with self._lock:
+            return sorted(self._child_rows('comments', issue_id), key=lambda comment: comment['created_at'])
+
+    def create_comment(self, comment):
+        """Create a new comment"""
+        with self._lock:
+            row = {
+                'id': self._next_id('comments'), 'content': comment['content'],
+                'user_id': comment['userId'], 'user_name': comment['userName'],
+                'issue_id': comment['issueId'], 'created_at': now_ms(),
+            }
+            self._add_child('comments', row)
+            self._changed()
+            return dict(row)
+
+    # Image operations
+    def get_image(self, id):
+        """Get image by ID"""
+        with self._lock:
+            image = self._images.get(id)
+            return dict(image) if image else None
+
+    def get_images_by_issue_id(self, issue_id):
+        """Get all images for an issue, including archived ones"""
+        with self._lock:
+            return self._child_rows('images', issue_id)
+
+    def create_image(self, image):
+        """Add an image to an issue"""
+        with self._lock:
+            row = {
+                'id': self._next_id('images'), 'filename': image['filename'],
+                'issue_id': image['issueId'], 'created_at': now_ms(),
+            }
+            self._add_child('images', row)
+            self._changed()
+            return dict(row)
+
+    # Status history operations
+    def get_status_history(self, issue_id):
+        """Get status change history for an issue, including archived changes"""
+        with self._lock:
+            return sorted(
+                self._child_rows('status_history', issue_id),
+                key=lambda history: history['created_at'], reverse=True
+            )
+
+    def _add_history(self, issue_id, old_status, new_status, changed_by_id, changed_by_name, notes, now):
+        row = {
+            'id': self._next_id('status_history'), 'issue_id': issue_id,
+            'old_status': old_status, 'new_status': new_status,
+            'changed_by_id': changed_by_id, 'changed_by_name': changed_by_name,
+            'notes': notes, 'created_at': now,
+        }
+        self._add_child('status_history', row)
+        return row
+
+    def create_status_history(self, history):
+        """Record a status change in history"""
+        with self._lock:
+            row = self._add_history(
+                history['issueId'], history['oldStatus'], history['newStatus'],
+                history.get('changedById'), history.get('changedByName'), history.get('notes'), now_ms()
+            )
+            self._changed()
+            return dict(row)
+
+    # Status filtering operations
+    def get_issues_by_status(self, status, fields=None):
+        """Get issues filtered by status"""
+        with self._lock:
+            issues = self._newest_first(self._ids_by_status.get(status, ()))
+            return self._project(issues, fields)
+
+    def get_issues_by_type(self, issue_type, fields=None):
+        """Get issues filtered by type"""
+        with self._lock:
+            issues = self._newest_first(self._ids_by_type.get(issue_type, ()))
+            return self._project(issues, fields)
+
+    def update_issue_status(self, id, new_status, changed_by_id=None, changed_by_name=None, notes=None,
+                            expected_version=None):
+        """Update an issue's status, record the change in history and return the issue"""
+        with self._lock:
+            issue = self._issues.get(id)
+            if issue is None:
+                return None
+            self._check_version(issue, expected_version)
+            now = now_ms()
+            # The technician holding a work queue lease keeps it while working
+            renews_lease = (
+                issue['lease_expires_at'] is not None and changed_by_id is not None
+                and changed_by_id == issue['claimed_by_id'] and new_status not in ('fixed', 'pending')
+            )
+            lease_expires_at = extended_lease(issue['lease_expires_at'], now) if renews_lease else None
+            if issue['status'] == new_status:
+                if renews_lease:
+                    self._apply(issue, {'lease_expires_at': lease_expires_at})
+                    self._changed()
+                return self._full_issue(issue)
+
+            old_status = issue['status']
+            changes = {'status': new_status, 'updated_at': now, 'lease_expires_at': lease_expires_at}
+            if new_status == 'pending':
+                changes.update({'claimed_by_id': None, 'claimed_by_name': None})
+            if new_status == 'fixed':
+                changes.update({
+                    'fixed_at': now, 'time_to_fix': (now - issue['created_at']) // 60000,
+                    'fixed_by_id': changed_by_id, 'fixed_by_name': changed_by_name,
+                })
+            self._apply(issue, changes)
+            self._add_history(id, old_status, new_status, changed_by_id, changed_by_name, notes, now)
+            self._changed()
+            return self._full_issue(issue)
+
+    def mark_issue_as_fixed(self, id, fixed_by_id, fixed_by_name, notes=None, expected_version=None):
+        """Mark an issue as fixed"""
+        return self.update_issue_status(id, 'fixed', fixed_by_id, fixed_by_name, notes, expected_version)
+
+    # Work queue operations
+    def claim_next_issue(self, claimed_by_id, claimed_by_name, issue_types=None, location=None,
+                         lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Claim the most urgent, oldest pending issue of the given types and location, or get None"""
+        with self._lock:
+            now = now_ms()
+            expired = [
+                self._issues[id] for id in sorted(self._ids_by_status.get('in_progress', ()))
+                if self._issues[id]['lease_expires_at'] is not None and self._issues[id]['lease_expires_at'] < now
+            ]
+            for issue in expired:
+                self._apply(issue, {
+                    'status': 'pending', 'claimed_by_id': None, 'claimed_by_name': None, 'lease_expires_at': None,
+                    'updated_at': now,
+                })
+                self._add_history(issue['id'], 'in_progress', 'pending', None, None, 'Lease expired', now)
+
+            candidates = [
+                self._issues[id] for id in self._ids_by_status.get('pending', ())
+                if (not issue_types or self._issues[id]['issue_type'] in issue_types)
+                and (not location or self._issues[id]['location'] == location)
+            ]
+            if not candidates:
+                if expired:
+                    self._changed()
+                return None
+
+            issue = min(
+                candidates,
+                key=lambda issue: (-PRIORITY_RANKS.get(issue['priority'], 0), issue['created_at'], issue['id'])
+            )
+            self._apply(issue, {
+                'status': 'in_progress', 'claimed_by_id': claimed_by_id, 'claimed_by_name': claimed_by_name,
+                'lease_expires_at': now + lease_seconds * 1000, 'updated_at': now,
+            })
+            self._add_history(
+                issue['id'], 'pending', 'in_progress', claimed_by_id, claimed_by_name, 'Claimed from the work queue', now
+            )
+            self._changed()
+            return self._full_issue(issue)
+
+    def _held_issue(self, id, claimed_by_id):
+        """Get a live issue claimed_by_id holds the lease of, None if it does not exist, or raise LeaseNotHeld"""
+        issue = self._issues.get(id)
+        if issue is None:
+            return None
+        if (issue['status'] != 'in_progress' or issue['claimed_by_id'] != claimed_by_id
+                or issue['lease_expires_at'] is None):
+            raise LeaseNotHeld(id, claimed_by_id)
+        return issue
+
+    def renew_issue_lease(self, id, claimed_by_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a claimed issue's lease to lease_seconds from now, or get None if it does not exist"""
+        with self._lock:
+            issue = self._held_issue(id, claimed_by_id)
+            if issue is None:
+                return None
+            now = now_ms()
+            self._apply(issue, {'lease_expires_at': now + lease_seconds * 1000, 'updated_at': now})
+            self._changed()
+            return self._full_issue(issue)
+
+    def release_issue_lease(self, id, claimed_by_id, notes=None):
+        """Hand a claimed issue back to the queue as pending, or get None if it does not exist"""
+        with self._lock:
+            issue = self._held_issue(id, claimed_by_id)
+            if issue is None:
+                return None
+            now = now_ms()
+            claimed_by_name = issue['claimed_by_name']
+            self._apply(issue, {
+                'status': 'pending', 'claimed_by_id': None, 'claimed_by_name': None, 'lease_expires_at': None,
+                'updated_at': now,
+            })
+            self._add_history(
+                id, 'in_progress', 'pending', claimed_by_id, claimed_by_name, notes or 'Released to the work queue', now
+            )
+            self._changed()
+            return self._full_issue(issue)
+
+    # Analytics operations
+    def get_issue_statistics(self, issue_type=None):
+        """Get statistics about issues"""
+        with self._lock:
+            issues = [
+                issue for issue in self._issues.values()
+                if issue_type is None or issue['issue_type'] == issue_type
+            ]
+
+        fixed = [issue for issue in issues if issue['status'] == 'fixed']
+        fix_times = [issue['time_to_fix'] for issue in fixed if issue['time_to_fix'] is not None]
+        location_counts = {}
+        for issue in issues:
+            location_counts[issue['location']] = location_counts.get(issue['location'], 0) + 1
+        fix_dates = [issue['fixed_at'] for issue in fixed if issue['fixed_at'] is not None]
+
+        return {
+            "totalIssues": len(issues),
+            "openIssues": sum(1 for issue in issues if issue['status'] is not None and issue['status'] != 'fixed'),
+            "fixedIssues": len(fixed),
+            "averageFixTime": sum(fix_times) / len(fix_times) if fix_times else None,
+            "mostReportedLocation": max(location_counts, key=location_counts.get) if location_counts else None,
+            "lastFixDate": max(fix_dates) if fix_dates else None,
+        }
+
+    def get_issue_timeseries(self, bucket='day', start=None, end=None):
+        """Get issues opened and fixed per bucket, plus the open backlog at the end of each"""
+        if bucket not in BUCKET_EXPRESSIONS:
+            raise ValueError(f"Unsupported bucket: {bucket}")
+
+        today = datetime.utcnow().date()
+        end = end or today + timedelta(days=1)
+        start = start or end - timedelta(days=30 if bucket == 'day' else 7 * 12)
+        if bucket == 'week':
+            start -= timedelta(days=start.weekday())
+        step = timedelta(days=7 if bucket == 'week' else 1)
+
+        with self._lock:
+            created = [created_at for created_at, _ in self._created_index]
+            fixed = sorted(issue['fixed_at'] for issue in self._issues.values() if issue['fixed_at'] is not None)
+
+        points = []
+        bucket_start = start
+        while bucket_start < end:
+            low, high = to_epoch_ms(bucket_start), to_epoch_ms(bucket_start + step)
+            opened_before = bisect.bisect_left(created, high)
+            fixed_before = bisect.bisect_left(fixed, high)
+            points.append({
+                "bucket": bucket_start.isoformat(),
+                "opened": opened_before - bisect.bisect_left(created, low),
+                "fixed": fixed_before - bisect.bisect_left(fixed, low),
+                "backlog": opened_before - fixed_before,
+            })
+            bucket_start += step
+        return points
+
+    def get_fix_time_percentiles(self, group_by='issue_type'):
+        """Get mean, median and p90 time to fix (in minutes) per group, using nearest-rank percentiles"""
+        if group_by not in PERCENTILE_GROUP_COLUMNS:
+            raise ValueError(f"Unsupported group: {group_by}")
+
+        groups = {}
+        with self._lock:
+            for issue in self._issues.values():
+                if issue['status'] == 'fixed' and issue['time_to_fix'] is not None:
+                    groups.setdefault(issue[group_by], []).append(issue['time_to_fix'])
+
+        percentiles = []
+        for group in sorted(groups, key=lambda group: (group is not None, group or '')):
+            times = sorted(groups[group])
+            percentiles.append({
+                "group": group,
+                "count": len(times),
+                "averageFixTime": sum(times) / len(times),
+                "medianFixTime": times[max(math.ceil(0.5 * len(times)), 1) - 1],
+                "p90FixTime": times[max(math.ceil(0.9 * len(times)), 1) - 1],
+            })
+        return percentiles
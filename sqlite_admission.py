@@ -0,0 +1,171 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+# Priority classes, most urgent first: technicians working issues, regular
+# traffic, then bulk and reporting calls
+PRIORITY_CLASSES = ('high', 'normal', 'low')
+
+# Defaults per request kind: concurrent requests, queued requests, seconds queued at most.
+# SQLite has one writer, so only a few writes run at once and the rest wait
+# here instead of on the database lock.
+DEFAULT_LIMITS = {
+    'read': {"limit": 16, "max_queue": 128, "max_wait": 2.0},
+    'write': {"limit": 4, "max_queue": 64, "max_wait": 5.0},
+}
+
+# Seconds a rejected client is told to wait before retrying
+DEFAULT_RETRY_AFTER = 1
+
+# Admission waits kept for the percentiles in the metrics
+WAIT_SAMPLES = 1024
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted: the queue was full, it waited too long, or it was shed"""
+    def __init__(self, kind, reason, retry_after):
+        super().__init__(f"{kind} request rejected: {reason}")
+        self.kind = kind
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.outcome = None
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class AdmissionQueue:
+    """
+    Bounded concurrency for one kind of request. Up to limit requests run at
+    once; up to max_queue more wait, most urgent class first and oldest
+    first within a class, for at most max_wait seconds. When the queue is
+    full, an arrival sheds the newest waiter of a less urgent class, or is
+    rejected itself.
+    """
+    def __init__(self, kind, limit, max_queue, max_wait, retry_after=DEFAULT_RETRY_AFTER):
+        if limit < 1:
+            raise ValueError("An admission queue needs a limit of at least one request")
+        self.kind = kind
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._active = 0
+        # Heap of (class rank, arrival, waiter)
+        self._waiters = []
+        self._arrivals = itertools.count()
+        self._admitted = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._rejected = {"queueFull": 0, "timedOut": 0, "shed": 0}
+        self._waits = collections.deque(maxlen=WAIT_SAMPLES)
+
+    def _reject(self, reason):
+        self._rejected[reason] += 1
+        return AdmissionRejected(self.kind, reason, self.retry_after)
+
+    def acquire(self, priority='normal'):
+        """Wait for a slot and return the seconds waited, or raise AdmissionRejected"""
+        rank = PRIORITY_CLASSES.index(priority)
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                self._admitted[priority] += 1
+                self._waits.append(0.0)
+                return 0.0
+            if len(self._waiters) >= self.max_queue:
+                # The least urgent, newest waiter is the one to shed
+                victim = max(self._waiters, key=lambda entry: entry[:2]) if self._waiters else None
+                if victim is None or victim[0] <= rank:
+                    raise self._reject('queueFull')
+                self._waiters.remove(victim)
+                heapq.heapify(self._waiters)
+                victim[2].outcome = 'shed'
+                victim[2].event.set()
+            waiter = _Waiter()
+            heapq.heappush(self._waiters, (rank, next(self._arrivals), waiter))
+
+        started = time.monotonic()
+        waiter.event.wait(self.max_wait)
+        waited = time.monotonic() - started
+        with self._lock:
+            # A slot may have been handed over just as the wait timed out
+            if waiter.outcome == 'admitted':
+                self._admitted[priority] += 1
+                self._waits.append(waited)
+                return waited
+            if waiter.outcome == 'shed':
+                raise self._reject('shed')
+            self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+            heapq.heapify(self._waiters)
+            raise self._reject('timedOut')
+
+    def release(self):
+        """Free a slot, handing it straight to the most urgent waiter"""
+        with self._lock:
+            if self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                waiter.outcome = 'admitted'
+                waiter.event.set()
+            else:
+                self._active -= 1
+
+    def metrics(self):
+        """Get the queue's settings, current depth, admission counts and recent wait times"""
+        with self._lock:
+            queued = dict.fromkeys(PRIORITY_CLASSES, 0)
+            for rank, _, _ in self._waiters:
+                queued[PRIORITY_CLASSES[rank]] += 1
+            waits = sorted(self._waits)
+            report = {
+                "limit": self.limit,
+                "maxQueue": self.max_queue,
+                "maxWaitMs": round(self.max_wait * 1000),
+                "active": self._active,
+                "queued": queued,
+                "depth": len(self._waiters),
+                "admitted": dict(self._admitted),
+                "rejected": dict(self._rejected),
+            }
+
+        report["waitMs"] = {
+            "p50": round(_percentile(waits, 0.5) * 1000, 1),
+            "p95": round(_percentile(waits, 0.95) * 1000, 1),
+            "p99": round(_percentile(waits, 0.99) * 1000, 1),
+            "max": round(waits[-1] * 1000, 1),
+        } if waits else None
+        return report
+
+
+class AdmissionController:
+    """
+    Separate admission queues for reads and writes, so a burst of writes
+    waiting on SQLite's single writer cannot starve read-only traffic, and
+    overload is answered with fast rejections instead of piled-up requests
+    timing out. Limits are per process.
+    """
+    def __init__(self, limits=None, retry_after=DEFAULT_RETRY_AFTER):
+        limits = limits or {}
+        self.queues = {
+            kind: AdmissionQueue(kind, retry_after=retry_after, **{**defaults, **limits.get(kind, {})})
+            for kind, defaults in DEFAULT_LIMITS.items()
+        }
+
+    def acquire(self, kind, priority='normal'):
+        """Wait for a slot for a 'read' or 'write' request, or raise AdmissionRejected"""
+        return self.queues[kind].acquire(priority)
+
+    def release(self, kind):
+        """Free the slot taken by acquire"""
+        self.queues[kind].release()
+
+    def metrics(self):
+        """Get the metrics of every queue"""
+        return {kind: queue.metrics() for kind, queue in self.queues.items()}
@@ -1,111 +1,1334 @@
 import sqlite3
 import os
+import functools
+import itertools
 import json
-from datetime import datetime
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
 
-class SQLiteStorage:
+import issue_similarity
+from storage_backend import DEFAULT_LEASE_SECONDS, DuplicateUsername, LeaseNotHeld, StorageBackend, extended_lease
+
+# Timestamps are stored as integer milliseconds since the Unix epoch (UTC)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Stored timestamp columns per table
+TIMESTAMP_COLUMNS = {
+    'issues': ('fixed_at', 'created_at', 'updated_at'),
+    'images': ('created_at',),
+    'comments': ('created_at',),
+    'status_history': ('created_at',),
+}
+
+# Result fields holding epoch milliseconds, rendered as ISO-8601 by the API
+TIMESTAMP_FIELDS = (
+    'created_at', 'updated_at', 'fixed_at', 'last_activity_at', 'lease_expires_at', 'lastFixDate', 'cutoff',
+    'run_at', 'finished_at',
+)
+
+# Analytics bucket sizes: SQL expression mapping a timestamp column to the
+# start date of its bucket (weeks start on Monday)
+BUCKET_EXPRESSIONS = {
+    'day': "date({column} / 1000, 'unixepoch')",
+    'week': "date({column} / 1000, 'unixepoch', '-6 days', 'weekday 1')",
+}
+
+# Columns that fix-time percentiles may be grouped by
+PERCENTILE_GROUP_COLUMNS = ('issue_type', 'location')
+
+# Issue columns that listings can project with a sparse fieldset
+ISSUE_COLUMNS = (
+    'id', 'title', 'description', 'location', 'status', 'priority', 'issue_type',
+    'latitude', 'longitude', 'pin_x', 'pin_y', 'is_interior_pin',
+    'reported_by_id', 'reported_by_name', 'estimated_cost', 'final_cost',
+    'fixed_by_id', 'fixed_by_name', 'fixed_at', 'time_to_fix',
+    'created_at', 'updated_at', 'version',
+    'comment_count', 'image_count', 'status_change_count', 'last_activity_at',
+    'claimed_by_id', 'claimed_by_name', 'lease_expires_at',
+)
+
+# Per-issue counters kept up to date by triggers: child table -> counter column.
+# last_activity_at is the newest child row, or the issue's creation.
+ACTIVITY_COUNTERS = {
+    'comments': 'comment_count',
+    'images': 'image_count',
+    'status_history': 'status_change_count',
+}
+ACTIVITY_COLUMNS = tuple(ACTIVITY_COUNTERS.values()) + ('last_activity_at',)
+
+# Storage events that can enqueue background jobs in the writing transaction
+JOB_EVENTS = ('issue_created', 'status_changed', 'comment_created', 'image_created')
+
+# Attempts a job gets before it is dead-lettered, unless enqueued with its own limit
+DEFAULT_JOB_ATTEMPTS = 5
+
+# Per-user issue feeds: role -> (user column, time column the feed is ordered by)
+USER_FEED_ROLES = {
+    'reporter': ('reported_by_id', 'created_at'),
+    'fixer': ('fixed_by_id', 'fixed_at'),
+}
+
+# Issue columns returned with duplicate candidates
+SIMILAR_ISSUE_FIELDS = (
+    'id', 'title', 'description', 'location', 'status', 'priority', 'issue_type',
+    'pin_x', 'pin_y', 'latitude', 'longitude', 'reported_by_name', 'created_at',
+    'comment_count', 'image_count',
+)
+
+# Issue fields update_issue accepts, mapped to their columns
+ISSUE_UPDATE_FIELDS = {
+    'title': 'title',
+    'description': 'description',
+    'location': 'location',
+    'status': 'status',
+    'priority': 'priority',
+    'issueType': 'issue_type',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'pinX': 'pin_x',
+    'pinY': 'pin_y',
+    'isInteriorPin': 'is_interior_pin',
+    'estimatedCost': 'estimated_cost',
+    'finalCost': 'final_cost',
+}
+
+# Fields computed from the images table: every image, or only the first one
+IMAGE_FIELDS = ('image_urls', 'thumbnail_url')
+
+# Image fields returned for each ?images= choice
+IMAGE_MODES = {
+    'all': ('image_urls',),
+    'first': ('thumbnail_url',),
+    'none': (),
+}
+
+# Predefined projections for listing endpoints
+ISSUE_VIEWS = {
+    'summary': (
+        'id', 'title', 'status', 'priority', 'location', 'thumbnail_url',
+        'comment_count', 'image_count', 'last_activity_at',
+    ),
+}
+
+# Filters accepted by query_issues: name -> (SQL condition, multi-valued).
+# Multi-valued filters take a list and match any of its values.
+QUERY_FILTERS = {
+    'status': ('i.status IN ({placeholders})', True),
+    'issue_type': ('i.issue_type IN ({placeholders})', True),
+    'priority': ('i.priority IN ({placeholders})', True),
+    'location': ('i.location = ?', False),
+    'reported_by_id': ('i.reported_by_id = ?', False),
+    'created_from': ('i.created_at >= ?', False),
+    'created_to': ('i.created_at < ?', False),
+    'fixed_from': ('i.fixed_at >= ?', False),
+    'fixed_to': ('i.fixed_at < ?', False),
+    'min_estimated_cost': ('i.estimated_cost >= ?', False),
+    'max_estimated_cost': ('i.estimated_cost <= ?', False),
+    'min_final_cost': ('i.final_cost >= ?', False),
+    'max_final_cost': ('i.final_cost <= ?', False),
+}
+
+# Priorities from least to most urgent
+PRIORITY_RANKS = {'low': 1, 'medium': 2, 'high': 3, 'urgent': 4}
+PRIORITY_CASES = ' '.join(f"WHEN '{priority}' THEN {rank}" for priority, rank in PRIORITY_RANKS.items())
+PRIORITY_RANK_SQL = f'CASE i.priority {PRIORITY_CASES} ELSE 0 END'
+# The same rank unqualified, as in the work queue indexes; queries must match it exactly
+QUEUE_RANK_SQL = f'CASE priority {PRIORITY_CASES} ELSE 0 END'
+
+# Sort keys accepted by query_issues (prefix with - for descending)
+QUERY_SORT_KEYS = {
+    'created_at': 'i.created_at',
+    'updated_at': 'i.updated_at',
+    'fixed_at': 'i.fixed_at',
+    'priority': PRIORITY_RANK_SQL,
+    'estimated_cost': 'i.estimated_cost',
+    'final_cost': 'i.final_cost',
+    'time_to_fix': 'i.time_to_fix',
+    'title': 'i.title',
+}
+
+# Filters compared against timestamp columns
+TIMESTAMP_FILTERS = ('created_from', 'created_to', 'fixed_from', 'fixed_to')
+
+# Ids per IN (...) list, well below SQLite's bound-parameter limit
+MAX_BATCH_IDS = 500
+
+# Child tables moved to the archive together with their issue
+ARCHIVED_CHILD_TABLES = ('images', 'comments', 'status_history')
+
+
+def _create_base_schema(cursor):
+    """Migration 1: tables and indexes of the original schema"""
+    # Users table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT UNIQUE,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL
+    )
+    ''')
+    
+    # Issues table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS issues (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        location TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        priority TEXT DEFAULT 'medium',
+        issue_type TEXT DEFAULT 'other',
+        latitude REAL,
+        longitude REAL,
+        pin_x REAL,
+        pin_y REAL,
+        is_interior_pin INTEGER,
+        reported_by_id INTEGER NOT NULL,
+        reported_by_name TEXT NOT NULL,
+        estimated_cost REAL DEFAULT 0,
+        final_cost REAL,
+        fixed_by_id INTEGER,
+        fixed_by_name TEXT,
+        fixed_at TEXT,
+        time_to_fix INTEGER,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (reported_by_id) REFERENCES users(id),
+        FOREIGN KEY (fixed_by_id) REFERENCES users(id)
+    )
+    ''')
+    
+    # Images table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        issue_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Comments table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_name TEXT NOT NULL,
+        issue_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Status history table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS status_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        issue_id INTEGER NOT NULL,
+        old_status TEXT NOT NULL,
+        new_status TEXT NOT NULL,
+        changed_by_id INTEGER,
+        changed_by_name TEXT,
+        notes TEXT,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE,
+        FOREIGN KEY (changed_by_id) REFERENCES users(id)
+    )
+    ''')
+    
+    # Child lookups (and archival) go through issue_id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_issue_id ON images(issue_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_issue_id ON comments(issue_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_history_issue_id ON status_history(issue_id)')
+    
+    # Indexes backing the analytics queries
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_created_at ON issues(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_fixed_at ON issues(fixed_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_type_time_to_fix ON issues(issue_type, time_to_fix)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_location_time_to_fix ON issues(location, time_to_fix)')
+
+
+# Tables whose changes invalidate cached API responses
+VERSIONED_TABLES = ('issues', 'images', 'comments', 'status_history')
+
+
+def _create_change_counter(cursor):
+    """Migration 2: a single-row counter bumped by triggers on every data change"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_counter (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        changed_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO change_counter (id, version, changed_at)
+    VALUES (1, 0, strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    ''')
+    
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change_counter
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE change_counter
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')
+                WHERE id = 1;
+            END
+            ''')
+
+
+def _create_summary_indexes(cursor):
+    """Migration 3: covering indexes for summary listings, newest first"""
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issues_summary
+    ON issues(created_at, title, status, priority, location)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issues_status_summary
+    ON issues(status, created_at, title, priority, location)
+    ''')
+
+
+def _create_filter_indexes(cursor):
+    """Migration 4: indexes for the composable issue query filters"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_type_created_at ON issues(issue_type, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_location_created_at ON issues(location, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_priority_created_at ON issues(priority, created_at)')
+
+
+def _add_issue_version(cursor):
+    """Migration 5: a per-issue version for optimistic concurrency control"""
+    cursor.execute('ALTER TABLE issues ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    # Our own updates bump the version explicitly; this catches other writers
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_issues_bump_version
+    AFTER UPDATE ON issues
+    WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE issues SET version = version + 1 WHERE id = NEW.id;
+    END
+    ''')
+
+
+def _activity_sql(schema='main'):
+    """SQL expressions recomputing each ACTIVITY_COLUMNS value of an issues row from its child rows"""
+    expressions = {
+        column: f'(SELECT COUNT(*) FROM {schema}.{table} WHERE issue_id = issues.id)'
+        for table, column in ACTIVITY_COUNTERS.items()
+    }
+    latest = ', '.join(
+        f'COALESCE((SELECT MAX(created_at) FROM {schema}.{table} WHERE issue_id = issues.id), issues.created_at)'
+        for table in ACTIVITY_COUNTERS
+    )
+    expressions['last_activity_at'] = f'MAX(issues.created_at, {latest})'
+    return expressions
+
+
+def _add_activity_counters(cursor):
+    """
+    Migration 7: comment, image and status change counts plus the time of
+    the latest activity on every issue, so listings need no child queries
+    """
+    for column in ACTIVITY_COUNTERS.values():
+        cursor.execute(f'ALTER TABLE issues ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE issues ADD COLUMN last_activity_at INTEGER')
+    
+    # Counter upkeep is not an edit, so only edits to other columns bump the version
+    edited_columns = [
+        row[1] for row in cursor.execute('PRAGMA table_info(issues)')
+        if row[1] not in ('id', 'version') + ACTIVITY_COLUMNS
+    ]
+    cursor.execute('DROP TRIGGER IF EXISTS trg_issues_bump_version')
+    cursor.execute(f'''
+    CREATE TRIGGER trg_issues_bump_version
+    AFTER UPDATE OF {', '.join(edited_columns)} ON issues
+    WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE issues SET version = version + 1 WHERE id = NEW.id;
+    END
+    ''')
+    
+    expressions = _activity_sql()
+    cursor.execute(f"UPDATE issues SET {', '.join(f'{column} = {sql}' for column, sql in expressions.items())}")
+    
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_issues_insert_last_activity
+    AFTER INSERT ON issues
+    WHEN NEW.last_activity_at IS NULL
+    BEGIN
+        UPDATE issues SET last_activity_at = NEW.created_at WHERE id = NEW.id;
+    END
+    ''')
+    for table, column in ACTIVITY_COUNTERS.items():
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_activity
+        AFTER INSERT ON {table}
+        BEGIN
+            UPDATE issues
+            SET {column} = {column} + 1,
+                last_activity_at = MAX(COALESCE(last_activity_at, NEW.created_at), NEW.created_at)
+            WHERE id = NEW.issue_id;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_activity
+        AFTER DELETE ON {table}
+        BEGIN
+            UPDATE issues
+            SET {column} = {column} - 1, last_activity_at = {expressions['last_activity_at']}
+            WHERE id = OLD.issue_id;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_update_activity
+        AFTER UPDATE OF issue_id, created_at ON {table}
+        BEGIN
+            UPDATE issues SET {column} = {column} - 1 WHERE id = OLD.issue_id;
+            UPDATE issues SET {column} = {column} + 1 WHERE id = NEW.issue_id;
+            UPDATE issues SET last_activity_at = {expressions['last_activity_at']}
+            WHERE id IN (OLD.issue_id, NEW.issue_id);
+        END
+        ''')
+
+
+def _create_work_queue(cursor):
+    """
+    Migration 8: claim columns for the technician work queue, an index
+    ordering pending issues by priority then age, and one finding expired leases
+    """
+    cursor.execute('ALTER TABLE issues ADD COLUMN claimed_by_id INTEGER')
+    cursor.execute('ALTER TABLE issues ADD COLUMN claimed_by_name TEXT')
+    cursor.execute('ALTER TABLE issues ADD COLUMN lease_expires_at INTEGER')
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS idx_issues_queue
+    ON issues({QUEUE_RANK_SQL} DESC, created_at)
+    WHERE status = 'pending'
+    ''')
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS idx_issues_queue_type_location
+    ON issues(issue_type, location, {QUEUE_RANK_SQL} DESC, created_at)
+    WHERE status = 'pending'
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issues_lease_expires_at
+    ON issues(lease_expires_at)
+    WHERE lease_expires_at IS NOT NULL
+    ''')
+
+
+def _create_jobs_table(cursor):
+    """
+    Migration 9: durable background jobs, with an index ordering queued jobs
+    by priority then due time and one finding expired leases
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}',
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 5,
+        run_at INTEGER NOT NULL,
+        locked_by TEXT,
+        lease_expires_at INTEGER,
+        last_error TEXT,
+        result TEXT,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        finished_at INTEGER
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_jobs_queue
+    ON jobs(priority DESC, run_at)
+    WHERE status = 'queued'
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_jobs_lease_expires_at
+    ON jobs(lease_expires_at)
+    WHERE status = 'running'
+    ''')
+
+
+def _create_similarity_table(cursor):
+    """Create the near-duplicate band key table of migration 10, shared with its online backfill"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS issue_similarity_bands (
+        band_key INTEGER NOT NULL,
+        issue_id INTEGER NOT NULL,
+        PRIMARY KEY (band_key, issue_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issue_similarity_bands_issue_id
+    ON issue_similarity_bands(issue_id)
+    ''')
+
+
+def index_similarity(cursor, issue_id, location, title, description):
+    """(Re)write an issue's near-duplicate band keys with an open write cursor"""
+    cursor.execute('DELETE FROM issue_similarity_bands WHERE issue_id = ?', (issue_id,))
+    cursor.executemany(
+        'INSERT OR IGNORE INTO issue_similarity_bands (band_key, issue_id) VALUES (?, ?)',
+        [(key, issue_id) for key in issue_similarity.band_keys(location, title, description)]
+    )
+
+
+def _index_issues_for_similarity(cursor, after_id=0, batch_size=None):
+    """
+    Index issues without band keys, in id order from after_id, at most
+    batch_size of them. Returns the last id seen, or None when done.
+    """
+    sql = '''
+    SELECT id, location, title, description FROM issues i
+    WHERE id > ? AND NOT EXISTS (SELECT 1 FROM issue_similarity_bands b WHERE b.issue_id = i.id)
+    ORDER BY id
+    '''
+    rows = cursor.execute(sql + (f' LIMIT {int(batch_size)}' if batch_size else ''), (after_id,)).fetchall()
+    for row in rows:
+        index_similarity(cursor, *row)
+    return rows[-1][0] if rows and batch_size else None
+
+
+def _backfill_similarity_index(conn, batch_size=500):
+    """
+    Online part of migration 10: compute band keys for existing issues in
+    short write transactions. Stops early if another process completes the
+    migration.
+    """
+    last_id = 0
+    while last_id is not None:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= 10:
+                conn.execute('ROLLBACK')
+                return
+            cursor = conn.cursor()
+            _create_similarity_table(cursor)
+            last_id = _index_issues_for_similarity(cursor, last_id, batch_size)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def _create_similarity_index(cursor):
+    """
+    Migration 10: MinHash LSH band keys per issue for near-duplicate lookups,
+    dropped with their issue by a trigger. Indexes whatever the backfill has
+    not, and drops keys of issues deleted meanwhile.
+    """
+    _create_similarity_table(cursor)
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_issues_delete_similarity
+    AFTER DELETE ON issues
+    BEGIN
+        DELETE FROM issue_similarity_bands WHERE issue_id = OLD.id;
+    END
+    ''')
+    cursor.execute('DELETE FROM issue_similarity_bands WHERE issue_id NOT IN (SELECT id FROM issues)')
+    _index_issues_for_similarity(cursor)
+
+
+def _create_user_feed_indexes(cursor):
+    """
+    Migration 11: indexes for the per-user issue feeds, in feed order, so a
+    feed page and a user's counts only read that user's index entries
+    """
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issues_reported_by_created_at
+    ON issues(reported_by_id, created_at)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_issues_fixed_by_fixed_at
+    ON issues(fixed_by_id, fixed_at)
+    WHERE fixed_by_id IS NOT NULL
+    ''')
+
+
+def _extend_summary_indexes(cursor):
+    """
+    Migration 12: add the activity counters of the summary view to its
+    covering indexes, so summary listings still read the index only
+    """
+    cursor.execute('DROP INDEX IF EXISTS idx_issues_summary')
+    cursor.execute('DROP INDEX IF EXISTS idx_issues_status_summary')
+    cursor.execute('''
+    CREATE INDEX idx_issues_summary
+    ON issues(created_at, title, status, priority, location, comment_count, image_count, last_activity_at)
+    ''')
+    cursor.execute('''
+    CREATE INDEX idx_issues_status_summary
+    ON issues(status, created_at, title, priority, location, comment_count, image_count, last_activity_at)
+    ''')
+
+
+def _add_status_to_feed_indexes(cursor):
+    """
+    Migration 13: carry the status in the per-user feed indexes, so a user's
+    counts per status and status-filtered feed pages read the index only
+    """
+    cursor.execute('DROP INDEX IF EXISTS idx_issues_reported_by_created_at')
+    cursor.execute('DROP INDEX IF EXISTS idx_issues_fixed_by_fixed_at')
+    cursor.execute('''
+    CREATE INDEX idx_issues_reported_by_created_at
+    ON issues(reported_by_id, created_at, status)
+    ''')
+    cursor.execute('''
+    CREATE INDEX idx_issues_fixed_by_fixed_at
+    ON issues(fixed_by_id, fixed_at, status)
+    WHERE fixed_by_id IS NOT NULL
+    ''')
+
+
+# Issue times whose change can alter closed analytics buckets, per trigger:
+# (event, columns the trigger watches, SELECTs of the affected times)
+ANALYTICS_TIME_CHANGES = (
+    ('INSERT', '', 'SELECT NEW.created_at AS t UNION ALL SELECT NEW.fixed_at'),
+    ('DELETE', '', 'SELECT OLD.created_at AS t UNION ALL SELECT OLD.fixed_at'),
+    ('UPDATE', ' OF created_at, fixed_at', '''
+        SELECT OLD.created_at AS t WHERE OLD.created_at IS NOT NEW.created_at
+        UNION ALL SELECT NEW.created_at WHERE OLD.created_at IS NOT NEW.created_at
+        UNION ALL SELECT OLD.fixed_at WHERE OLD.fixed_at IS NOT NEW.fixed_at
+        UNION ALL SELECT NEW.fixed_at WHERE OLD.fixed_at IS NOT NEW.fixed_at
+    '''),
+)
+
+
+def _create_analytics_changes(cursor):
+    """
+    Migration 14: record the earliest day each write reaches back to, when
+    that is before today, so cached analytics buckets are only dropped from
+    that day on. Writes of today, e.g. new or fixed issues, record nothing.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS analytics_changes (
+        day TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_analytics_changes_version
+    ON analytics_changes(version)
+    ''')
+    for event, columns, times in ANALYTICS_TIME_CHANGES:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_issues_{event.lower()}_analytics_changes
+        AFTER {event}{columns} ON issues
+        BEGIN
+            INSERT INTO analytics_changes (day, version)
+            SELECT date(since / 1000, 'unixepoch'),
+                   (SELECT COALESCE(MAX(version), 0) + 1 FROM analytics_changes)
+            FROM (SELECT MIN(t) AS since FROM ({times}))
+            WHERE since < strftime('%s', 'now', 'start of day') * 1000
+            ON CONFLICT(day) DO UPDATE SET version = excluded.version;
+        END
+        ''')
+
+
+def encode_feed_cursor(time, id):
+    """Encode the keyset position after an issue in a per-user feed"""
+    return f'{time}:{id}'
+
+
+def decode_feed_cursor(cursor):
+    """Decode a feed cursor into (time, id), raising ValueError if malformed"""
+    try:
+        time, id = cursor.split(':')
+        return int(time), int(id)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid cursor") from None
+
+
+def insert_job(cursor, kind, payload=None, priority=0, delay_seconds=0, max_attempts=DEFAULT_JOB_ATTEMPTS):
+    """
+    Enqueue a background job with an open write cursor, so the job commits
+    or rolls back together with the write it belongs to. Returns the job id.
+    """
+    now = now_ms()
+    cursor.execute('''
+    INSERT INTO jobs (kind, payload, priority, max_attempts, run_at, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (kind, json.dumps(payload or {}), priority, max_attempts, now + int(delay_seconds * 1000), now, now))
+    return cursor.lastrowid
+
+
+def to_epoch_ms(value):
+    """
+    Convert a datetime, date or ISO-8601 string to epoch milliseconds.
+    Naive values are taken as UTC; integers are returned unchanged.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_epoch_ms(value):
+    """Format epoch milliseconds as a naive UTC ISO-8601 string"""
+    if value is None:
+        return None
+    return (EPOCH + timedelta(milliseconds=value)).replace(tzinfo=None).isoformat(timespec='milliseconds')
+
+
+def now_ms():
+    """Get the current time in epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+
+def _iso_to_epoch_sql(column):
+    """SQL converting an ISO-8601 text value to epoch milliseconds, leaving other values alone"""
+    return (
+        f"CASE WHEN typeof({column}) = 'text' THEN "
+        f"CAST(strftime('%s', {column}) AS INTEGER) * 1000 "
+        f"+ CAST(substr(strftime('%f', {column}), 4) AS INTEGER) "
+        f"ELSE {column} END"
+    )
+
+
+def _converted_columns(cursor, table, prefix=''):
+    """List a table's columns with its timestamp columns converted to epoch milliseconds"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    return columns, [
+        _iso_to_epoch_sql(prefix + column) if column in TIMESTAMP_COLUMNS[table] else prefix + column
+        for column in columns
+    ]
+
+
+def _create_epoch_shadow(cursor, table):
+    """
+    Create {table}__epoch, a copy of the table with INTEGER timestamp
+    columns, and triggers mirroring every change to the table into it
+    """
+    sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+    sql = re.sub(r'^CREATE TABLE \S+', f'CREATE TABLE IF NOT EXISTS {table}__epoch', sql)
+    for column in TIMESTAMP_COLUMNS[table]:
+        sql = re.sub(rf'\b{column} TEXT\b', f'{column} INTEGER', sql)
+    cursor.execute(sql)
+    
+    columns, values = _converted_columns(cursor, table, 'NEW.')
+    for event in ('INSERT', 'UPDATE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_epoch_mirror
+        AFTER {event} ON {table}
+        BEGIN
+            INSERT OR REPLACE INTO {table}__epoch ({', '.join(columns)}) VALUES ({', '.join(values)});
+        END
+        ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_epoch_mirror
+    AFTER DELETE ON {table}
+    BEGIN
+        DELETE FROM {table}__epoch WHERE id = OLD.id;
+    END
+    ''')
+
+
+def _copy_to_epoch_shadow(cursor, table, after_id=0, batch_size=None):
+    """
+    Copy rows with ids above after_id (at most batch_size of them) into the
+    shadow table. Rows the mirror triggers already wrote are newer and kept.
+    Returns the last id copied, or None when there was nothing left.
+    """
+    if batch_size is None:
+        last_id = cursor.execute(f'SELECT MAX(id) FROM {table} WHERE id > ?', (after_id,)).fetchone()[0]
+    else:
+        last_id = cursor.execute(
+            f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)',
+            (after_id, batch_size)
+        ).fetchone()[0]
+    if last_id is None:
+        return None
+    
+    columns, values = _converted_columns(cursor, table)
+    cursor.execute(f'''
+    INSERT OR IGNORE INTO {table}__epoch ({', '.join(columns)})
+    SELECT {', '.join(values)} FROM {table} WHERE id > ? AND id <= ?
+    ''', (after_id, last_id))
+    return last_id
+
+
+def _backfill_epoch_timestamps(conn, batch_size=1000):
+    """
+    Online part of migration 6: set up the shadow tables, then copy rows in
+    short write transactions so other connections keep working meanwhile.
+    Stops early if another process completes the migration.
+    """
+    for table in TIMESTAMP_COLUMNS:
+        last_id = 0
+        while last_id is not None:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= 6:
+                    conn.execute('ROLLBACK')
+                    return
+                cursor = conn.cursor()
+                _create_epoch_shadow(cursor, table)
+                last_id = _copy_to_epoch_shadow(cursor, table, last_id, batch_size)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+
+def _convert_timestamps_to_epoch(cursor):
+    """
+    Migration 6: store timestamps as epoch milliseconds. Copies whatever the
+    backfill has not copied yet, then swaps each shadow table in, recreating
+    the table's indexes and triggers and keeping its AUTOINCREMENT sequence.
+    """
+    for table in TIMESTAMP_COLUMNS:
+        _create_epoch_shadow(cursor, table)
+        _copy_to_epoch_shadow(cursor, table)
+        
+        dependents = [row[0] for row in cursor.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+          AND name NOT LIKE '%epoch_mirror'
+        ''', (table,))]
+        sequence = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+        
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}__epoch RENAME TO {table}')
+        for sql in dependents:
+            cursor.execute(sql)
+        if sequence:
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence[0]))
+
+
+# Migrations with a batched, online data copy to run before their
+# (then short) schema transaction: version -> function(connection)
+BACKFILLS = {
+    6: _backfill_epoch_timestamps,
+    10: _backfill_similarity_index,
+}
+
+# Schema migrations as (user_version, function) pairs, applied in order to
+# databases whose PRAGMA user_version is below the target version
+MIGRATIONS = [
+    (1, _create_base_schema),
+    (2, _create_change_counter),
+    (3, _create_summary_indexes),
+    (4, _create_filter_indexes),
+    (5, _add_issue_version),
+    (6, _convert_timestamps_to_epoch),
+    (7, _add_activity_counters),
+    (8, _create_work_queue),
+    (9, _create_jobs_table),
+    (10, _create_similarity_index),
+    (11, _create_user_feed_indexes),
+    (12, _extend_summary_indexes),
+    (13, _add_status_to_feed_indexes),
+    (14, _create_analytics_changes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def issue_projection(fields):
+    """
+    Split requested fields into issue columns and image fields.
+    None means every column plus all image URLs.
+    """
+    if fields is None:
+        return list(ISSUE_COLUMNS), {'image_urls'}
+    
+    unknown = [field for field in fields if field not in ISSUE_COLUMNS + IMAGE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    columns = [field for field in ISSUE_COLUMNS if field in fields]
+    return columns, {field for field in IMAGE_FIELDS if field in fields}
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_listing(fields, where, order_by, paginated):
+    """
+    Build the SQL for an issue listing; cached per statement shape.
+    Image fields are loaded afterwards by load_images, so the id is selected
+    whenever they are requested.
+    """
+    columns, image_fields = issue_projection(fields)
+    if image_fields and 'id' not in columns:
+        columns = ['id'] + columns
+    
+    sql = f'''
+    SELECT {', '.join(f'i.{column}' for column in columns)}
+    FROM issues i
+    {where}
+    ORDER BY {order_by}
+    '''
+    
+    if paginated:
+        sql += 'LIMIT ? OFFSET ?'
+    return sql
+
+
+def load_images(cursor, issues, image_fields):
+    """
+    Fill in the requested image fields of issues (dicts with an id) using
+    one images query per MAX_BATCH_IDS issues, filenames in upload order.
+    With only thumbnail_url requested, just the first image of each issue
+    is read.
+    """
+    if not image_fields or not issues:
+        return issues
+    
+    ids = [issue['id'] for issue in issues]
+    filenames = {}
+    for start in range(0, len(ids), MAX_BATCH_IDS):
+        chunk = ids[start:start + MAX_BATCH_IDS]
+        placeholders = ', '.join('?' for _ in chunk)
+        if 'image_urls' in image_fields:
+            sql = f'''
+            SELECT issue_id, filename FROM images
+            WHERE issue_id IN ({placeholders})
+            ORDER BY issue_id, id
+            '''
+        else:
+            sql = f'''
+            SELECT issue_id, filename FROM images
+            WHERE id IN (SELECT MIN(id) FROM images WHERE issue_id IN ({placeholders}) GROUP BY issue_id)
+            '''
+        for issue_id, filename in cursor.execute(sql, chunk).fetchall():
+            filenames.setdefault(issue_id, []).append(filename)
+    
+    for issue in issues:
+        found = filenames.get(issue['id'], [])
+        if 'image_urls' in image_fields:
+            issue['image_urls'] = found
+        if 'thumbnail_url' in image_fields:
+            issue['thumbnail_url'] = found[0] if found else None
+    return issues
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_where(shape):
+    """Build a WHERE clause for a tuple of (filter name, value count) pairs"""
+    conditions = []
+    for name, count in shape:
+        condition, multi_valued = QUERY_FILTERS[name]
+        if multi_valued:
+            condition = condition.format(placeholders=', '.join('?' for _ in range(count)))
+        conditions.append(condition)
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+
+def _compile_filters(filters):
+    """Turn a filter dict into a parameterized WHERE clause and its parameters"""
+    unknown = [name for name in filters if name not in QUERY_FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+    
+    shape = []
+    params = []
+    for name in sorted(filters):
+        value = filters[name]
+        if value is None or value == []:
+            continue
+        if QUERY_FILTERS[name][1]:
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            shape.append((name, len(values)))
+            params.extend(values)
+        else:
+            shape.append((name, 1))
+            params.append(to_epoch_ms(value) if name in TIMESTAMP_FILTERS else value)
+    
+    return _compile_where(tuple(shape)), params
+
+
+def parse_issue_sort(sort):
+    """Split a sort key like '-created_at' into (key, descending)"""
+    descending = sort.startswith('-')
+    key = sort.lstrip('-+')
+    if key not in QUERY_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {key}")
+    return key, descending
+
+
+def _compile_sort(sort):
+    """Build an ORDER BY clause, breaking ties by id in the same direction"""
+    key, descending = parse_issue_sort(sort)
+    direction = 'DESC' if descending else 'ASC'
+    return f'{QUERY_SORT_KEYS[key]} {direction}, i.id {direction}'
+
+
+class IssueVersionConflict(Exception):
+    """A conditional update named an issue version that is no longer current"""
+    def __init__(self, id, current_version):
+        super().__init__(f"Issue {id} has been modified (current version {current_version})")
+        self.id = id
+        self.current_version = current_version
+
+
+class SQLiteStorage(StorageBackend):
     """
     SQLite implementation of storage for Twin Fix application.
     This provides a lightweight database alternative to PostgreSQL.
     """
-    def __init__(self, db_path='issues.db'):
-        self.db_path = db_path
-        self.initialize_db()
+    # Whether db_path and archive_path are SQLite URIs
+    uri = False
+    
+    def __init__(self, db_path=None, archive_path=None, busy_timeout=None, write_retries=None):
+        # No I/O here: the schema is checked lazily on first use
+        self.db_path = db_path or os.environ.get('SQLITE_DB_PATH', 'issues.db')
+        # Seconds a connection waits on a locked database before failing,
+        # and how often a locked write transaction is retried after that
+        self.busy_timeout = float(busy_timeout if busy_timeout is not None
+                                  else os.environ.get('SQLITE_BUSY_TIMEOUT', 5))
+        self.write_retries = int(write_retries if write_retries is not None
+                                 else os.environ.get('SQLITE_WRITE_RETRIES', 5))
+        self._write_metrics = {"transactions": 0, "retries": 0, "giveUps": 0}
+        self._write_metrics_lock = threading.Lock()
+        # Fixed issues are moved here by archive_fixed_issues
+        self.archive_path = archive_path or os.path.splitext(self.db_path)[0] + '_archive.db'
+        self._archive_schema_checked = False
+        # Closed analytics buckets, kept until a write reaches back into them
+        # (a delete, archiving, a reopen or a back-dated time); the version is
+        # the latest analytics_changes row applied to the cache
+        self._bucket_cache = {}
+        self._bucket_cache_version = 0
+        self._bucket_cache_lock = threading.Lock()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # Jobs enqueued by storage events: event -> [(kind, priority, max_attempts)]
+        self._job_subscriptions = {}
     
     def initialize_db(self):
-        """Create database tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Create or migrate the database schema, at most once per instance"""
+        if self._schema_ready:
+            return
         
-        # Users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            email TEXT UNIQUE,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None, uri=self.uri)
+            try:
+                # Only possible before a new database gets its first page;
+                # existing databases are converted by sqlite_maintenance
+                if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+                    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                # WAL lets readers proceed while a writer holds the lock
+                conn.execute('PRAGMA journal_mode=WAL')
+                
+                # Fast path: an up-to-date database needs a single PRAGMA read
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                while version < SCHEMA_VERSION:
+                    # A backfill only applies once the schema just before it is in place
+                    if version + 1 in BACKFILLS:
+                        BACKFILLS[version + 1](conn)
+                    # Stop short of the next backfilled migration, so its
+                    # backfill runs outside the write lock too
+                    target = min([stage - 1 for stage in BACKFILLS if stage - 1 > version] + [SCHEMA_VERSION])
+                    version = self._migrate(conn, target)
+            finally:
+                conn.close()
+            
+            self._schema_ready = True
+    
+    def _migrate(self, conn, target):
+        """Apply the migrations up to target in one write transaction and return the resulting version"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-read under the write lock in case another process migrated
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < target:
+                cursor = conn.cursor()
+                for stage, migrate in MIGRATIONS:
+                    if version < stage <= target:
+                        migrate(cursor)
+                conn.execute(f'PRAGMA user_version = {target}')
+                version = target
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+    
+    def _connect(self, **kwargs):
+        """Open a new connection, making sure the schema is in place first"""
+        self.initialize_db()
+        kwargs.setdefault('timeout', self.busy_timeout)
+        return sqlite3.connect(self.db_path, uri=self.uri, **kwargs)
+    
+    def _count_write(self, metric):
+        with self._write_metrics_lock:
+            self._write_metrics[metric] += 1
+    
+    def get_write_metrics(self):
+        """Get counts of write transactions, lock retries and give-ups"""
+        with self._write_metrics_lock:
+            return dict(self._write_metrics)
+    
+    def _run_write(self, work, attach_archive=False):
+        """
+        Run work(cursor) in a BEGIN IMMEDIATE transaction and return its result.
+        Taking the write lock up front means a locked database fails at BEGIN
+        (after busy_timeout) instead of mid-transaction; such failures are
+        retried with jittered exponential backoff up to write_retries times.
+        """
+        attempt = 0
+        while True:
+            conn = self._connect(isolation_level=None)
+            try:
+                if attach_archive:
+                    conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+                conn.execute('BEGIN IMMEDIATE')
+                result = work(conn.cursor())
+                conn.execute('COMMIT')
+                self._count_write('transactions')
+                return result
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                if attempt >= self.write_retries:
+                    self._count_write('giveUps')
+                    raise
+                attempt += 1
+                self._count_write('retries')
+                # Full jitter keeps competing processes from retrying in lockstep
+                time.sleep(random.uniform(0, min(1.0, 0.01 * 2 ** attempt)))
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
+    
+    # Background job operations
+    def supports_jobs(self):
+        """Jobs live in a jobs table of the database"""
+        return True
+    
+    def subscribe_job(self, event, kind, priority=0, max_attempts=DEFAULT_JOB_ATTEMPTS):
+        """
+        Enqueue a job of the given kind whenever a storage event (one of
+        JOB_EVENTS) happens, inside the transaction of the write causing it.
+        The job payload is the event payload, e.g. {"issueId": 1}.
+        """
+        if event not in JOB_EVENTS:
+            raise ValueError(f"Unknown job event: {event}")
+        self._job_subscriptions.setdefault(event, []).append((kind, priority, max_attempts))
+    
+    def _publish(self, cursor, event, payload):
+        """Enqueue the jobs subscribed to a storage event with the writing cursor"""
+        for kind, priority, max_attempts in self._job_subscriptions.get(event, ()):
+            insert_job(cursor, kind, payload, priority, max_attempts=max_attempts)
+    
+    def enqueue_job(self, kind, payload=None, priority=0, delay_seconds=0, max_attempts=DEFAULT_JOB_ATTEMPTS):
+        """Enqueue a background job in its own transaction and return its id"""
+        return self._run_write(
+            lambda cursor: insert_job(cursor, kind, payload, priority, delay_seconds, max_attempts)
         )
-        ''')
+    
+    def get_data_version(self):
+        """
+        Get a counter that increases on every change to issues or their
+        child rows, and the time of the latest change
+        """
+        conn = self._connect()
+        row = conn.execute('SELECT version, changed_at FROM change_counter WHERE id = 1').fetchone()
+        conn.close()
         
-        # Issues table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS issues (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
-            location TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            priority TEXT DEFAULT 'medium',
-            issue_type TEXT DEFAULT 'other',
-            latitude REAL,
-            longitude REAL,
-            pin_x REAL,
-            pin_y REAL,
-            is_interior_pin INTEGER,
-            reported_by_id INTEGER NOT NULL,
-            reported_by_name TEXT NOT NULL,
-            estimated_cost REAL DEFAULT 0,
-            final_cost REAL,
-            fixed_by_id INTEGER,
-            fixed_by_name TEXT,
-            fixed_at TEXT,
-            time_to_fix INTEGER,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            FOREIGN KEY (reported_by_id) REFERENCES users(id),
-            FOREIGN KEY (fixed_by_id) REFERENCES users(id)
-        )
-        ''')
+        return {"version": row[0], "changedAt": row[1]}
+    
+    # Archive operations
+    def _table_columns(self, conn, table, schema='main'):
+        """Get the column names of a table in declaration order"""
+        return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+    
+    def _ensure_archive_schema(self, conn):
+        """Create or extend the attached archive tables to mirror the live ones"""
+        added_columns = set()
+        for table in ('issues',) + ARCHIVED_CHILD_TABLES:
+            if not self._table_columns(conn, table, 'archive'):
+                conn.execute(f'CREATE TABLE archive.{table} AS SELECT * FROM main.{table} WHERE 0')
+            archived_columns = self._table_columns(conn, table, 'archive')
+            for column in self._table_columns(conn, table):
+                if column not in archived_columns:
+                    conn.execute(f'ALTER TABLE archive.{table} ADD COLUMN {column}')
+                    added_columns.add(column)
+            
+            # Archives written before migration 6 still hold ISO-8601 text
+            text_columns = [
+                row[1] for row in conn.execute(f'PRAGMA archive.table_info({table})')
+                if row[1] in TIMESTAMP_COLUMNS[table] and row[2] == 'TEXT'
+            ]
+            if text_columns:
+                self._convert_archive_timestamps(conn, table)
+        
+        # Issues archived before migration 7 get their counters computed once
+        if added_columns & set(ACTIVITY_COLUMNS):
+            expressions = _activity_sql('archive')
+            conn.execute(
+                f"UPDATE archive.issues SET {', '.join(f'{column} = {sql}' for column, sql in expressions.items())}"
+            )
+        
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_issues_id ON issues(id)')
+        for table in ARCHIVED_CHILD_TABLES:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_{table}_id ON {table}(id)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS archive.idx_archive_{table}_issue_id ON {table}(issue_id)')
+    
+    def _convert_archive_timestamps(self, conn, table):
+        """Rewrite an archive table with epoch-millisecond timestamps, atomically"""
+        columns = self._table_columns(conn, table, 'archive')
+        values = [
+            f"CAST({_iso_to_epoch_sql(column)} AS INTEGER) AS {column}"
+            if column in TIMESTAMP_COLUMNS[table] else column
+            for column in columns
+        ]
+        conn.execute('SAVEPOINT archive_epoch')
+        try:
+            conn.execute(f"CREATE TABLE archive.{table}__epoch AS SELECT {', '.join(values)} FROM archive.{table}")
+            conn.execute(f'DROP TABLE archive.{table}')
+            conn.execute(f'ALTER TABLE archive.{table}__epoch RENAME TO {table}')
+            conn.execute('RELEASE archive_epoch')
+        except BaseException:
+            conn.execute('ROLLBACK TO archive_epoch')
+            conn.execute('RELEASE archive_epoch')
+            raise
+    
+    def _archive_exists(self):
+        return os.path.exists(self.archive_path)
+    
+    def _connect_with_archive(self):
+        """
+        Open a connection with the archive attached as `archive` when one
+        exists. Returns the connection and whether the archive is attached.
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
         
-        # Images table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            issue_id INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
-        )
-        ''')
+        if not self._archive_exists():
+            return conn, False
         
-        # Comments table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            content TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            user_name TEXT NOT NULL,
-            issue_id INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        if not self._archive_schema_checked:
+            self._ensure_archive_schema(conn)
+            conn.commit()
+            self._archive_schema_checked = True
+        return conn, True
+    
+    def _union_archive(self, conn, table, where):
+        """Build a SELECT over the live and archived rows of a table"""
+        columns = ', '.join(self._table_columns(conn, table))
+        return (
+            f'SELECT {columns} FROM main.{table} WHERE {where} '
+            f'UNION ALL SELECT {columns} FROM archive.{table} WHERE {where}'
         )
-        ''')
+    
+    def prepare_archive(self):
+        """Create the archive database, or bring its tables up to the live schema"""
+        self._run_write(lambda cursor: self._ensure_archive_schema(cursor.connection), attach_archive=True)
+        self._archive_schema_checked = True
+    
+    def archive_fixed_issues(self, older_than_days=90, batch_size=500):
+        """
+        Move issues fixed more than older_than_days ago, with their images,
+        comments and status history, into the archive database.
+        Each batch is one transaction; rows are copied before they are
+        deleted, so an interrupted run can simply be repeated.
+        """
+        cutoff = now_ms() - older_than_days * 86400000
         
-        # Status history table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS status_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            issue_id INTEGER NOT NULL,
-            old_status TEXT NOT NULL,
-            new_status TEXT NOT NULL,
-            changed_by_id INTEGER,
-            changed_by_name TEXT,
-            notes TEXT,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE,
-            FOREIGN KEY (changed_by_id) REFERENCES users(id)
-        )
-        ''')
+        self.prepare_archive()
         
-        conn.commit()
-        conn.close()
+        def archive_batch(cursor):
+            ids = [row[0] for row in cursor.execute('''
+            SELECT id FROM main.issues
+            WHERE status = 'fixed' AND fixed_at < ?
+            ORDER BY fixed_at
+            LIMIT ?
+            ''', (cutoff, batch_size))]
+            
+            if ids:
+                placeholders = ', '.join('?' for _ in ids)
+                # Copy everything before deleting anything: deleting child
+                # rows first would zero the issues' activity counters
+                for table in ('issues',) + ARCHIVED_CHILD_TABLES:
+                    key = 'id' if table == 'issues' else 'issue_id'
+                    columns = ', '.join(self._table_columns(cursor.connection, table))
+                    cursor.execute(f'''
+                    INSERT OR REPLACE INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table} WHERE {key} IN ({placeholders})
+                    ''', ids)
+                for table in ARCHIVED_CHILD_TABLES + ('issues',):
+                    key = 'id' if table == 'issues' else 'issue_id'
+                    cursor.execute(f'DELETE FROM main.{table} WHERE {key} IN ({placeholders})', ids)
+            return len(ids)
+        
+        archived = 0
+        batches = 0
+        while True:
+            count = self._run_write(archive_batch, attach_archive=True)
+            if not count:
+                break
+            archived += count
+            batches += 1
+        
+        return {"archivedIssues": archived, "batches": batches, "cutoff": cutoff}
+    
+    # Activity counter operations
+    def verify_activity_counters(self, repair=False, limit=100):
+        """
+        Compare every issue's activity counters with its child rows, e.g.
+        after rows were written with triggers missing. Reports the number of
+        drifted issues and up to limit of their ids; with repair=True they
+        are recomputed in the same transaction.
+        """
+        expressions = _activity_sql()
+        drifted = ' OR '.join(f'{column} IS NOT {sql}' for column, sql in expressions.items())
+        
+        def check(cursor):
+            checked = cursor.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+            ids = [row[0] for row in cursor.execute(f'SELECT id FROM issues WHERE {drifted} ORDER BY id')]
+            if repair and ids:
+                cursor.execute(f"""
+                UPDATE issues SET {', '.join(f'{column} = {sql}' for column, sql in expressions.items())}
+                WHERE {drifted}
+                """)
+            return {
+                "checkedIssues": checked,
+                "driftedIssues": len(ids),
+                "issueIds": ids[:limit],
+                "repaired": bool(repair and ids),
+            }
+        
+        if repair:
+            return self._run_write(check)
+        
+        conn = self._connect()
+        try:
+            return check(conn.cursor())
+        finally:
+            conn.close()
     
     # User operations
     def get_user(self, id):
         """Get user by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -119,7 +1342,7 @@ class SQLiteStorage:
     
     def get_user_by_username(self, username):
         """Get user by username"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -132,205 +1355,361 @@ class SQLiteStorage:
         return None
     
     def create_user(self, user):
-        """Create a new user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Create a new user, raising DuplicateUsername if the username is taken"""
+        def write(cursor):
+            cursor.execute('SELECT 1 FROM users WHERE username = ?', (user['username'],))
+            if cursor.fetchone():
+                raise DuplicateUsername(user['username'])
+            cursor.execute('''
+            INSERT INTO users (username, email, password, role)
+            VALUES (?, ?, ?, ?)
+            ''', (user['username'], user.get('email'), user['password'], user['role']))
+            return cursor.lastrowid
         
-        cursor.execute('''
-        INSERT INTO users (username, email, password, role)
-        VALUES (?, ?, ?, ?)
-        ''', (user['username'], user.get('email'), user['password'], user['role']))
-        
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        user_id = self._run_write(write)
         
         return {**user, 'id': user_id}
     
     # Issue operations
-    def get_issues(self):
-        """Get all issues"""
-        conn = sqlite3.connect(self.db_path)
+    def _list_issues(self, where='', params=(), fields=None, order_by='i.created_at DESC', limit=None, offset=0):
+        """
+        Run an issue listing selecting only the requested fields.
+        Images are read afterwards for the listed issues only, so the cost
+        follows the page size rather than the number of images.
+        """
+        fields = tuple(fields) if fields is not None else None
+        sql = _compile_listing(fields, where, order_by, limit is not None)
+        if limit is not None:
+            params = tuple(params) + (limit, offset)
+        columns, image_fields = issue_projection(fields)
+        
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT i.*, 
-               GROUP_CONCAT(img.filename) as image_filenames
-        FROM issues i
-        LEFT JOIN images img ON i.id = img.issue_id
-        GROUP BY i.id
-        ORDER BY i.created_at DESC
-        ''')
+        cursor.execute(sql, params)
+        issues = load_images(cursor, [dict(row) for row in cursor.fetchall()], image_fields)
+        conn.close()
         
-        rows = cursor.fetchall()
-        issues = []
+        if image_fields and 'id' not in columns:
+            for issue in issues:
+                del issue['id']
+        return issues
+    
+    def query_issues(self, filters=None, sort='-created_at', page=1, page_size=50, fields=None):
+        """
+        Get one page of issues matching any combination of QUERY_FILTERS,
+        ordered by a whitelisted sort key, plus the total number of matches
+        """
+        where, params = _compile_filters(filters or {})
+        order_by = _compile_sort(sort)
         
-        for row in dict(row):
-            issue = dict(row)
-            # Convert image filenames to list or empty list
-            if issue['image_filenames']:
-                issue['image_urls'] = issue['image_filenames'].split(',')
-            else:
-                issue['image_urls'] = []
-            del issue['image_filenames']
-            issues.append(issue)
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM issues i {where}', params).fetchone()[0]
+        conn.close()
         
+        items = self._list_issues(where, params, fields, order_by, page_size, (page - 1) * page_size) if total else []
+        
+        return {"items": items, "total": total, "page": page, "pageSize": page_size}
+    
+    def get_issues(self, fields=None):
+        """Get all issues, optionally only the given fields"""
+        return self._list_issues(fields=fields)
+    
+    def get_user_issues(self, user_id, role='reporter', statuses=None, limit=50, cursor=None, fields=None):
+        """
+        Get one page of the issues a user reported (newest first) or fixed
+        (latest fix first), optionally of some statuses only, and the user's
+        issue counts per status. Pages are keyset-paginated: pass the
+        returned nextCursor to get the next page.
+        """
+        if role not in USER_FEED_ROLES:
+            raise ValueError(f"Unknown role: {role}")
+        user_column, time_column = USER_FEED_ROLES[role]
+        
+        conditions = [f'i.{user_column} = ?']
+        params = [user_id]
+        if statuses:
+            conditions.append(f"i.status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if cursor:
+            time, id = decode_feed_cursor(cursor)
+            conditions.append(f'i.{time_column} <= ? AND (i.{time_column} < ? OR i.id < ?)')
+            params.extend([time, time, id])
+        
+        # The cursor needs the time and id of the last issue
+        query_fields = fields
+        if fields is not None:
+            query_fields = list(fields) + [column for column in (time_column, 'id') if column not in fields]
+        
+        # One more than a page tells whether there is a next page
+        items = self._list_issues(
+            f"WHERE {' AND '.join(conditions)}", params, query_fields,
+            f'i.{time_column} DESC, i.id DESC', limit + 1
+        )
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_feed_cursor(items[-1][time_column], items[-1]['id'])
+        if query_fields is not fields:
+            for issue in items:
+                for column in set(query_fields) - set(fields):
+                    del issue[column]
+        
+        conn = self._connect()
+        counts = dict(conn.execute(
+            f'SELECT status, COUNT(*) FROM issues WHERE {user_column} = ? GROUP BY status', (user_id,)
+        ).fetchall())
         conn.close()
-        return issues
+        counts['total'] = sum(counts.values())
+        
+        return {"items": items, "nextCursor": next_cursor, "counts": counts}
     
-    def get_issue(self, id):
-        """Get issue by ID"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def get_issues_by_ids(self, ids, fields=None):
+        """
+        Get many issues, archived ones included, with one set-based query for
+        the issues and one for their images (per MAX_BATCH_IDS ids).
+        Returns the issues in request order without duplicates, and the
+        requested ids that do not exist.
+        """
+        ids = list(dict.fromkeys(int(id) for id in ids))
+        columns, image_fields = issue_projection(fields)
+        query_columns = columns if 'id' in columns else ['id'] + columns
+        
+        conn, archive_attached = self._connect_with_archive()
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT i.*, 
-               GROUP_CONCAT(img.filename) as image_filenames
-        FROM issues i
-        LEFT JOIN images img ON i.id = img.issue_id
-        WHERE i.id = ?
-        GROUP BY i.id
-        ''', (id,))
+        found = {}
+        images = {}
+        for start in range(0, len(ids), MAX_BATCH_IDS):
+            chunk = ids[start:start + MAX_BATCH_IDS]
+            where = f"{{column}} IN ({', '.join('?' for _ in chunk)})"
+            
+            if archive_attached:
+                issues_sql = self._union_archive(conn, 'issues', where.format(column='id'))
+                images_sql = self._union_archive(conn, 'images', where.format(column='issue_id'))
+                params = chunk * 2
+            else:
+                issues_sql = f"SELECT * FROM issues WHERE {where.format(column='id')}"
+                images_sql = f"SELECT * FROM images WHERE {where.format(column='issue_id')}"
+                params = chunk
+            
+            cursor.execute(f"SELECT {', '.join(query_columns)} FROM ({issues_sql})", params)
+            for row in cursor.fetchall():
+                found[row['id']] = dict(row)
+            
+            if image_fields:
+                cursor.execute(f"SELECT issue_id, filename FROM ({images_sql}) ORDER BY issue_id, id", params)
+                for row in cursor.fetchall():
+                    images.setdefault(row['issue_id'], []).append(row['filename'])
         
-        row = cursor.fetchone()
         conn.close()
         
+        issues = []
+        for id in ids:
+            if id not in found:
+                continue
+            issue = found[id]
+            filenames = images.get(id, [])
+            if 'image_urls' in image_fields:
+                issue['image_urls'] = filenames
+            if 'thumbnail_url' in image_fields:
+                issue['thumbnail_url'] = filenames[0] if filenames else None
+            if 'id' not in columns:
+                del issue['id']
+            issues.append(issue)
+        
+        return {"items": issues, "missing": [id for id in ids if id not in found]}
+    
+    def get_issue(self, id, include_archived=True):
+        """Get issue by ID, including archived issues unless told otherwise"""
+        if include_archived:
+            conn, archive_attached = self._connect_with_archive()
+        else:
+            conn, archive_attached = self._connect(), False
+            conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        if archive_attached:
+            issues_sql = self._union_archive(conn, 'issues', 'id = :id')
+            images_sql = self._union_archive(conn, 'images', 'issue_id = :id')
+        else:
+            issues_sql = 'SELECT * FROM issues WHERE id = :id'
+            images_sql = 'SELECT * FROM images WHERE issue_id = :id'
+        
+        row = cursor.execute(f'SELECT * FROM ({issues_sql})', {"id": id}).fetchone()
+        issue = None
         if row:
             issue = dict(row)
-            # Convert image filenames to list or empty list
-            if issue['image_filenames']:
-                issue['image_urls'] = issue['image_filenames'].split(',')
-            else:
-                issue['image_urls'] = []
-            del issue['image_filenames']
-            return issue
-        return None
+            cursor.execute(f'SELECT filename FROM ({images_sql}) ORDER BY id', {"id": id})
+            issue['image_urls'] = [filename for (filename,) in cursor.fetchall()]
+        
+        conn.close()
+        return issue
     
     def create_issue(self, issue):
         """Create a new issue"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.utcnow().isoformat()
+        def write(cursor):
+            now = now_ms()
+            
+            cursor.execute('''
+            INSERT INTO issues (
+                title, description, location, status, priority, issue_type,
+                latitude, longitude, pin_x, pin_y, is_interior_pin,
+                reported_by_id, reported_by_name, estimated_cost,
+                created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                issue['title'], issue['description'], issue['location'],
+                issue.get('status', 'pending'), issue.get('priority', 'medium'), issue.get('issueType', 'other'),
+                issue.get('latitude'), issue.get('longitude'), issue.get('pinX'), issue.get('pinY'), issue.get('isInteriorPin'),
+                issue['reportedById'], issue['reportedByName'], issue.get('estimatedCost', 0),
+                now, now
+            ))
+            
+            issue_id = cursor.lastrowid
+            
+            # Add images if provided
+            if 'imageUrls' in issue and issue['imageUrls']:
+                for url in issue['imageUrls']:
+                    cursor.execute('''
+                    INSERT INTO images (filename, issue_id, created_at)
+                    VALUES (?, ?, ?)
+                    ''', (url, issue_id, now))
+            
+            index_similarity(cursor, issue_id, issue['location'], issue['title'], issue['description'])
+            self._publish(cursor, 'issue_created', {"issueId": issue_id})
+            return issue_id
         
-        cursor.execute('''
-        INSERT INTO issues (
-            title, description, location, status, priority, issue_type,
-            latitude, longitude, pin_x, pin_y, is_interior_pin,
-            reported_by_id, reported_by_name, estimated_cost,
-            created_at, updated_at
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            issue['title'], issue['description'], issue['location'],
-            issue.get('status', 'pending'), issue.get('priority', 'medium'), issue.get('issueType', 'other'),
-            issue.get('latitude'), issue.get('longitude'), issue.get('pinX'), issue.get('pinY'), issue.get('isInteriorPin'),
-            issue['reportedById'], issue['reportedByName'], issue.get('estimatedCost', 0),
-            now, now
-        ))
-        
-        issue_id = cursor.lastrowid
-        
-        # Add images if provided
-        if 'imageUrls' in issue and issue['imageUrls']:
-            for url in issue['imageUrls']:
-                cursor.execute('''
-                INSERT INTO images (filename, issue_id, created_at)
-                VALUES (?, ?, ?)
-                ''', (url, issue_id, now))
-        
-        conn.commit()
-        conn.close()
+        issue_id = self._run_write(write)
         
         return self.get_issue(issue_id)
     
-    def update_issue(self, id, update_data):
-        """Update an existing issue"""
-        issue = self.get_issue(id)
-        if not issue:
-            return None
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def _returned_issue(self, cursor, row):
+        """Build an issue from a RETURNING * row, reading its images in the same transaction"""
+        issue = dict(zip([column[0] for column in cursor.description], row))
+        cursor.execute('SELECT filename FROM images WHERE issue_id = ? ORDER BY id', (issue['id'],))
+        issue['image_urls'] = [filename for (filename,) in cursor.fetchall()]
+        return issue
+    
+    def _check_version(self, cursor, id, expected_version):
+        """Raise IssueVersionConflict if a live issue exists at another version than expected"""
+        cursor.execute('SELECT version FROM issues WHERE id = ?', (id,))
+        row = cursor.fetchone()
+        if row and expected_version is not None and row[0] != expected_version:
+            raise IssueVersionConflict(id, row[0])
+        return row is not None
+    
+    def update_issue(self, id, update_data, expected_version=None):
+        """
+        Update an existing issue and return it, or None if it does not exist.
+        With expected_version the update only applies to that version of the
+        issue and raises IssueVersionConflict otherwise.
+        """
         # Build the SET part of the SQL statement dynamically
         set_parts = []
         params = []
         
         # Map frontend field names to database field names
-        field_mapping = {
-            'title': 'title',
-            'description': 'description',
-            'location': 'location',
-            'status': 'status',
-            'priority': 'priority',
-            'issueType': 'issue_type',
-            'latitude': 'latitude',
-            'longitude': 'longitude',
-            'pinX': 'pin_x',
-            'pinY': 'pin_y',
-            'isInteriorPin': 'is_interior_pin',
-            'estimatedCost': 'estimated_cost',
-            'finalCost': 'final_cost'
-        }
-        
         for key, value in update_data.items():
-            if key in field_mapping:
-                set_parts.append(f"{field_mapping[key]} = ?")
+            if key in ISSUE_UPDATE_FIELDS:
+                set_parts.append(f"{ISSUE_UPDATE_FIELDS[key]} = ?")
                 params.append(value)
         
-        # Always update the updated_at timestamp
+        # Always update the updated_at timestamp and the version
         set_parts.append("updated_at = ?")
-        params.append(datetime.utcnow().isoformat())
+        params.append(now_ms())
+        set_parts.append("version = version + 1")
         
-        # Add the issue ID to the parameters
+        # Add the issue ID (and the version the client last saw) to the parameters
+        where = "id = ?"
         params.append(id)
+        if expected_version is not None:
+            where += " AND version = ?"
+            params.append(expected_version)
+        
+        # A single conditional statement; no row means a stale version or no such (live) issue
+        sql = f"UPDATE issues SET {', '.join(set_parts)} WHERE {where} RETURNING *"
+        
+        reindex = any(ISSUE_UPDATE_FIELDS.get(key) in ('title', 'description', 'location') for key in update_data)
+        
+        def write(cursor):
+            row = cursor.execute(sql, params).fetchone()
+            if row:
+                issue = self._returned_issue(cursor, row)
+                if reindex:
+                    index_similarity(cursor, id, issue['location'], issue['title'], issue['description'])
+                return issue
+            self._check_version(cursor, id, expected_version)
+            return None
         
-        # Construct and execute the SQL statement
-        sql = f"UPDATE issues SET {', '.join(set_parts)} WHERE id = ?"
-        cursor.execute(sql, params)
-        
-        conn.commit()
-        conn.close()
-        
-        return self.get_issue(id)
+        return self._run_write(write)
     
     def delete_issue(self, id):
         """Delete an issue"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM issues WHERE id = ?', (id,))
-        deleted = cursor.rowcount > 0
+        deleted = self._run_write(
+            lambda cursor: cursor.execute('DELETE FROM issues WHERE id = ?', (id,)).rowcount > 0
+        )
         
-        conn.commit()
+        return deleted
+    
+    def find_similar_issues(self, issue, limit=issue_similarity.DEFAULT_SIMILAR_LIMIT,
+                            min_score=issue_similarity.DEFAULT_MIN_SIMILARITY):
+        """
+        Get open issues at the same location that likely duplicate an issue
+        (given as for create_issue), best first, each with a "similarity"
+        score. Candidates come from the MinHash band index, so the lookup
+        reads a few index entries rather than every issue.
+        """
+        keys = issue_similarity.band_keys(issue.get('location'), issue.get('title'), issue.get('description'))
+        if not keys:
+            return []
+        
+        # The newest issues of each matching band, most shared bands first
+        bands = ' UNION ALL '.join(
+            f'SELECT * FROM (SELECT issue_id FROM issue_similarity_bands WHERE band_key = ? '
+            f'ORDER BY issue_id DESC LIMIT {issue_similarity.BAND_SCAN_LIMIT})'
+            for _ in keys
+        )
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'''
+        SELECT {', '.join(f'i.{field}' for field in SIMILAR_ISSUE_FIELDS)}
+        FROM ({bands}) b
+        JOIN issues i ON i.id = b.issue_id
+        WHERE i.status != 'fixed'
+        GROUP BY i.id
+        ORDER BY COUNT(*) DESC, i.id DESC
+        LIMIT {issue_similarity.MAX_CANDIDATES}
+        ''', keys).fetchall()
         conn.close()
         
-        return deleted
+        return issue_similarity.rank_candidates(
+            issue_similarity.query_issue(issue), [dict(row) for row in rows], limit, min_score
+        )
+    
+    def rebuild_similarity_index(self):
+        """Compute near-duplicate band keys for issues that have none (e.g. after copying rows in)"""
+        self._run_write(_index_issues_for_similarity)
     
     def get_nearby_issues(self, lat, lng, radius):
         """
         Get issues near a geographical point
         This is a simple implementation using SQLite (limited geo capabilities)
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         # Simple distance calculation
         cursor.execute('''
-        SELECT i.*,
-               GROUP_CONCAT(img.filename) as image_filenames
+        SELECT i.*
         FROM issues i
-        LEFT JOIN images img ON i.id = img.issue_id
         WHERE i.latitude IS NOT NULL AND i.longitude IS NOT NULL
-        GROUP BY i.id
         ''')
         
         rows = cursor.fetchall()
-        conn.close()
         
         # Filter in Python (SQLite doesn't have geo functions)
         issues = []
@@ -344,28 +1723,42 @@ class SQLiteStorage:
                 distance_km = distance * 111  # 1 degree is roughly 111 km
                 
                 if distance_km <= float(radius):
-                    # Convert image filenames to list or empty list
-                    if issue['image_filenames']:
-                        issue['image_urls'] = issue['image_filenames'].split(',')
-                    else:
-                        issue['image_urls'] = []
-                    del issue['image_filenames']
                     issues.append(issue)
         
+        # Images only for the issues in range
+        load_images(cursor, issues, {'image_urls'})
+        conn.close()
         return issues
     
+    def get_heatmap_points(self):
+        """Get (latitude, longitude, priority rank) rows for open issues with coordinates"""
+        conn = self._connect()
+        rows = conn.execute(f'''
+        SELECT CAST(i.latitude AS REAL), CAST(i.longitude AS REAL), {PRIORITY_RANK_SQL}
+        FROM issues i
+        WHERE i.latitude IS NOT NULL AND i.longitude IS NOT NULL AND i.status != 'fixed'
+        ''').fetchall()
+        conn.close()
+        
+        return rows
+    
     # Comment operations
     def get_comments(self, issue_id):
-        """Get comments for an issue"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Get comments for an issue, including archived ones"""
+        conn, archive_attached = self._connect_with_archive()
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT * FROM comments
-        WHERE issue_id = ?
-        ORDER BY created_at ASC
-        ''', (issue_id,))
+        if archive_attached:
+            cursor.execute(f'''
+            {self._union_archive(conn, 'comments', 'issue_id = :issue_id')}
+            ORDER BY created_at ASC
+            ''', {"issue_id": issue_id})
+        else:
+            cursor.execute('''
+            SELECT * FROM comments
+            WHERE issue_id = ?
+            ORDER BY created_at ASC
+            ''', (issue_id,))
         
         rows = cursor.fetchall()
         conn.close()
@@ -374,25 +1767,24 @@ class SQLiteStorage:
     
     def create_comment(self, comment):
         """Create a new comment"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.utcnow().isoformat()
-        
-        cursor.execute('''
-        INSERT INTO comments (content, user_id, user_name, issue_id, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (
-            comment['content'], comment['userId'], comment['userName'],
-            comment['issueId'], now
-        ))
-        
-        comment_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def write(cursor):
+            now = now_ms()
+            
+            cursor.execute('''
+            INSERT INTO comments (content, user_id, user_name, issue_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (
+                comment['content'], comment['userId'], comment['userName'],
+                comment['issueId'], now
+            ))
+            comment_id = cursor.lastrowid
+            self._publish(cursor, 'comment_created', {"issueId": comment['issueId'], "commentId": comment_id})
+            return comment_id
+        
+        comment_id = self._run_write(write)
         
         # Get the created comment
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -405,7 +1797,7 @@ class SQLiteStorage:
     # Image operations
     def get_image(self, id):
         """Get image by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -416,12 +1808,14 @@ class SQLiteStorage:
         return dict(row) if row else None
     
     def get_images_by_issue_id(self, issue_id):
-        """Get all images for an issue"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Get all images for an issue, including archived ones"""
+        conn, archive_attached = self._connect_with_archive()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM images WHERE issue_id = ?', (issue_id,))
+        if archive_attached:
+            cursor.execute(self._union_archive(conn, 'images', 'issue_id = :issue_id'), {"issue_id": issue_id})
+        else:
+            cursor.execute('SELECT * FROM images WHERE issue_id = ?', (issue_id,))
         rows = cursor.fetchall()
         conn.close()
         
@@ -429,34 +1823,38 @@ class SQLiteStorage:
     
     def create_image(self, image):
         """Add an image to an issue"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.utcnow().isoformat()
-        
-        cursor.execute('''
-        INSERT INTO images (filename, issue_id, created_at)
-        VALUES (?, ?, ?)
-        ''', (image['filename'], image['issueId'], now))
+        def write(cursor):
+            now = now_ms()
+            
+            cursor.execute('''
+            INSERT INTO images (filename, issue_id, created_at)
+            VALUES (?, ?, ?)
+            ''', (image['filename'], image['issueId'], now))
+            image_id = cursor.lastrowid
+            self._publish(cursor, 'image_created', {"issueId": image['issueId'], "imageId": image_id})
+            return image_id
         
-        image_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        image_id = self._run_write(write)
         
         return self.get_image(image_id)
     
     # Status history operations
     def get_status_history(self, issue_id):
-        """Get status change history for an issue"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Get status change history for an issue, including archived changes"""
+        conn, archive_attached = self._connect_with_archive()
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT * FROM status_history
-        WHERE issue_id = ?
-        ORDER BY created_at DESC
-        ''', (issue_id,))
+        if archive_attached:
+            cursor.execute(f'''
+            {self._union_archive(conn, 'status_history', 'issue_id = :issue_id')}
+            ORDER BY created_at DESC
+            ''', {"issue_id": issue_id})
+        else:
+            cursor.execute('''
+            SELECT * FROM status_history
+            WHERE issue_id = ?
+            ORDER BY created_at DESC
+            ''', (issue_id,))
         
         rows = cursor.fetchall()
         conn.close()
@@ -465,29 +1863,26 @@ class SQLiteStorage:
     
     def create_status_history(self, history):
         """Record a status change in history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.utcnow().isoformat()
-        
-        cursor.execute('''
-        INSERT INTO status_history (
-            issue_id, old_status, new_status, 
-            changed_by_id, changed_by_name, notes, created_at
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            history['issueId'], history['oldStatus'], history['newStatus'],
-            history.get('changedById'), history.get('changedByName'),
-            history.get('notes'), now
-        ))
-        
-        history_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def write(cursor):
+            now = now_ms()
+            
+            cursor.execute('''
+            INSERT INTO status_history (
+                issue_id, old_status, new_status, 
+                changed_by_id, changed_by_name, notes, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                history['issueId'], history['oldStatus'], history['newStatus'],
+                history.get('changedById'), history.get('changedByName'),
+                history.get('notes'), now
+            ))
+            return cursor.lastrowid
+        
+        history_id = self._run_write(write)
         
         # Get the created history record
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -498,130 +1893,255 @@ class SQLiteStorage:
         return dict(row) if row else None
     
     # Status filtering operations
-    def get_issues_by_status(self, status):
+    def get_issues_by_status(self, status, fields=None):
         """Get issues filtered by status"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT i.*,
-               GROUP_CONCAT(img.filename) as image_filenames
-        FROM issues i
-        LEFT JOIN images img ON i.id = img.issue_id
-        WHERE i.status = ?
-        GROUP BY i.id
-        ORDER BY i.created_at DESC
-        ''', (status,))
-        
-        rows = cursor.fetchall()
-        issues = []
-        
-        for row in rows:
-            issue = dict(row)
-            # Convert image filenames to list or empty list
-            if issue['image_filenames']:
-                issue['image_urls'] = issue['image_filenames'].split(',')
-            else:
-                issue['image_urls'] = []
-            del issue['image_filenames']
-            issues.append(issue)
-        
-        conn.close()
-        return issues
+        return self._list_issues('WHERE i.status = ?', (status,), fields)
     
-    def get_issues_by_type(self, issue_type):
+    def get_issues_by_type(self, issue_type, fields=None):
         """Get issues filtered by type"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT i.*,
-               GROUP_CONCAT(img.filename) as image_filenames
-        FROM issues i
-        LEFT JOIN images img ON i.id = img.issue_id
-        WHERE i.issue_type = ?
-        GROUP BY i.id
-        ORDER BY i.created_at DESC
-        ''', (issue_type,))
-        
-        rows = cursor.fetchall()
-        issues = []
-        
-        for row in rows:
-            issue = dict(row)
-            # Convert image filenames to list or empty list
-            if issue['image_filenames']:
-                issue['image_urls'] = issue['image_filenames'].split(',')
-            else:
-                issue['image_urls'] = []
-            del issue['image_filenames']
-            issues.append(issue)
-        
-        conn.close()
-        return issues
+        return self._list_issues('WHERE i.issue_type = ?', (issue_type,), fields)
     
-    def update_issue_status(self, id, new_status, changed_by_id=None, changed_by_name=None, notes=None):
-        """Update an issue's status and record the change in history"""
-        issue = self.get_issue(id)
-        if not issue:
-            return None
+    def update_issue_status(self, id, new_status, changed_by_id=None, changed_by_name=None, notes=None,
+                            expected_version=None):
+        """
+        Update an issue's status, record the change in history and return the
+        issue. With expected_version the change only applies to that version
+        of the issue and raises IssueVersionConflict otherwise.
+        """
+        def write(cursor):
+            # Read the current status under the write lock so concurrent
+            # changes cannot both record the same old status
+            cursor.execute('''
+            SELECT status, created_at, version, claimed_by_id, lease_expires_at FROM issues WHERE id = ?
+            ''', (id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
             
-        old_status = issue['status']
-        
-        # If status hasn't changed, return the issue as is
-        if old_status == new_status:
-            return issue
+            old_status, created_at, version, claimed_by_id, lease_expires_at = row
+            if expected_version is not None and version != expected_version:
+                raise IssueVersionConflict(id, version)
             
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+            now = now_ms()
+            # The technician holding a work queue lease keeps it while working
+            renews_lease = (
+                lease_expires_at is not None and changed_by_id is not None and changed_by_id == claimed_by_id
+                and new_status not in ('fixed', 'pending')
+            )
+            
+            # If status hasn't changed, leave the issue as is
+            if old_status == new_status:
+                if renews_lease:
+                    lease_expires_at = extended_lease(lease_expires_at, now)
+                    cursor.execute('UPDATE issues SET lease_expires_at = ? WHERE id = ?', (lease_expires_at, id))
+                cursor.execute('SELECT * FROM issues WHERE id = ?', (id,))
+                return self._returned_issue(cursor, cursor.fetchone())
+            
+            # Record the status change in history first, so the returned
+            # issue includes the counters its trigger updates
+            cursor.execute('''
+            INSERT INTO status_history (
+                issue_id, old_status, new_status, 
+                changed_by_id, changed_by_name, notes, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (id, old_status, new_status, changed_by_id, changed_by_name, notes, now))
+            
+            # Anyone else's status change ends the work queue lease, and an
+            # issue back in the queue has no claimant
+            set_parts = ["status = ?", "updated_at = ?", "version = version + 1", "lease_expires_at = ?"]
+            params = [new_status, now, extended_lease(lease_expires_at, now) if renews_lease else None]
+            if new_status == 'pending':
+                set_parts.append("claimed_by_id = NULL, claimed_by_name = NULL")
+            
+            # If the issue is marked as fixed, update fixed_at and time_to_fix
+            if new_status == 'fixed':
+                fixed_at = now
+                
+                # Calculate time to fix (in minutes)
+                time_to_fix = (fixed_at - created_at) // 60000
+                
+                set_parts.append("fixed_at = ?, time_to_fix = ?, fixed_by_id = ?, fixed_by_name = ?")
+                params.extend([fixed_at, time_to_fix, changed_by_id, changed_by_name])
+            
+            # Update the issue in one statement
+            cursor.execute(f"UPDATE issues SET {', '.join(set_parts)} WHERE id = ? RETURNING *", params + [id])
+            issue = self._returned_issue(cursor, cursor.fetchone())
+            self._publish(cursor, 'status_changed', {
+                "issueId": id, "oldStatus": old_status, "newStatus": new_status, "changedById": changed_by_id,
+            })
+            return issue
         
-        now = datetime.utcnow().isoformat()
+        return self._run_write(write)
+    
+    def mark_issue_as_fixed(self, id, fixed_by_id, fixed_by_name, notes=None, expected_version=None):
+        """Mark an issue as fixed"""
+        return self.update_issue_status(id, 'fixed', fixed_by_id, fixed_by_name, notes, expected_version)
+    
+    # Work queue operations
+    def _queue_query(self, issue_types, location):
+        """
+        Build a SELECT of claimable issue ids in queue order, and its parameters.
+        The work queue index is forced so the scan stops at the first match,
+        whatever the statistics say.
+        """
+        index = 'idx_issues_queue'
+        if issue_types and len(issue_types) == 1 and location:
+            index = 'idx_issues_queue_type_location'
         
-        # Update the issue's status
-        cursor.execute('''
-        UPDATE issues
-        SET status = ?, updated_at = ?
-        WHERE id = ?
-        ''', (new_status, now, id))
+        conditions = ["status = 'pending'"]
+        params = []
+        if issue_types:
+            conditions.append(f"issue_type IN ({', '.join('?' for _ in issue_types)})")
+            params.extend(issue_types)
+        if location:
+            conditions.append("location = ?")
+            params.append(location)
+        
+        sql = f'''
+        SELECT id, priority, created_at FROM issues INDEXED BY {index}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {QUEUE_RANK_SQL} DESC, created_at, id
+        LIMIT 1
+        '''
+        return sql, params
+    
+    def _release_expired_leases(self, cursor, now):
+        """Put in-progress issues whose lease ran out back in the queue, recording the change"""
+        rows = cursor.execute('''
+        UPDATE issues INDEXED BY idx_issues_lease_expires_at
+        SET status = 'pending', claimed_by_id = NULL, claimed_by_name = NULL, lease_expires_at = NULL,
+            updated_at = ?, version = version + 1
+        WHERE lease_expires_at < ? AND status = 'in_progress'
+        RETURNING id
+        ''', (now, now)).fetchall()
+        cursor.executemany('''
+        INSERT INTO status_history (issue_id, old_status, new_status, notes, created_at)
+        VALUES (?, 'in_progress', 'pending', 'Lease expired', ?)
+        ''', [(id, now) for (id,) in rows])
+        for (id,) in rows:
+            self._publish(cursor, 'status_changed', {
+                "issueId": id, "oldStatus": 'in_progress', "newStatus": 'pending', "changedById": None,
+            })
+    
+    def peek_next_issue(self, issue_types=None, location=None):
+        """Get the id, priority and created_at of the issue claim_next_issue would pick, or None"""
+        sql, params = self._queue_query(issue_types, location)
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(sql, params).fetchone()
+        conn.close()
         
-        # Record the status change in history
-        cursor.execute('''
-        INSERT INTO status_history (
-            issue_id, old_status, new_status, 
-            changed_by_id, changed_by_name, notes, created_at
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (id, old_status, new_status, changed_by_id, changed_by_name, notes, now))
+        return dict(row) if row else None
+    
+    def claim_next_issue(self, claimed_by_id, claimed_by_name, issue_types=None, location=None,
+                         lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claim the most urgent, oldest pending issue of the given types and
+        location for a technician. A single UPDATE ... RETURNING moves it to
+        in_progress under a lease, so no two claims get the same issue.
+        Issues whose lease expired go back in the queue first. Returns the
+        claimed issue, or None if nothing matches.
+        """
+        queue_sql, params = self._queue_query(issue_types, location)
         
-        # If the issue is marked as fixed, update fixed_at and time_to_fix
-        if new_status == 'fixed':
-            fixed_at = now
+        def write(cursor):
+            now = now_ms()
+            self._release_expired_leases(cursor, now)
             
-            # Calculate time to fix (in minutes)
-            created_timestamp = datetime.fromisoformat(issue['created_at'])
-            fixed_timestamp = datetime.fromisoformat(fixed_at)
-            time_to_fix = int((fixed_timestamp - created_timestamp).total_seconds() / 60)
+            row = cursor.execute(f'''
+            UPDATE issues
+            SET status = 'in_progress', claimed_by_id = ?, claimed_by_name = ?, lease_expires_at = ?,
+                updated_at = ?, version = version + 1
+            WHERE id = (SELECT id FROM ({queue_sql}))
+            RETURNING id
+            ''', [claimed_by_id, claimed_by_name, now + lease_seconds * 1000, now] + params).fetchone()
+            if not row:
+                return None
             
             cursor.execute('''
-            UPDATE issues
-            SET fixed_at = ?, time_to_fix = ?, fixed_by_id = ?, fixed_by_name = ?
-            WHERE id = ?
-            ''', (fixed_at, time_to_fix, changed_by_id, changed_by_name, id))
+            INSERT INTO status_history (
+                issue_id, old_status, new_status,
+                changed_by_id, changed_by_name, notes, created_at
+            )
+            VALUES (?, 'pending', 'in_progress', ?, ?, 'Claimed from the work queue', ?)
+            ''', (row[0], claimed_by_id, claimed_by_name, now))
+            self._publish(cursor, 'status_changed', {
+                "issueId": row[0], "oldStatus": 'pending', "newStatus": 'in_progress', "changedById": claimed_by_id,
+            })
+            
+            # Read back after the history insert so the activity counters include it
+            cursor.execute('SELECT * FROM issues WHERE id = ?', (row[0],))
+            return self._returned_issue(cursor, cursor.fetchone())
         
-        conn.commit()
-        conn.close()
+        return self._run_write(write)
+    
+    def _hold_issue(self, cursor, id, claimed_by_id, changes, params):
+        """
+        Apply changes to an issue only while claimed_by_id holds its work
+        queue lease. Returns the issue's (status, claimed_by_id,
+        claimed_by_name, lease_expires_at) before the change, None if the
+        issue does not exist, or raises LeaseNotHeld.
+        """
+        row = cursor.execute(
+            'SELECT status, claimed_by_id, claimed_by_name, lease_expires_at FROM issues WHERE id = ?', (id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row[0] != 'in_progress' or row[1] != claimed_by_id or row[3] is None:
+            raise LeaseNotHeld(id, claimed_by_id)
         
-        return self.get_issue(id)
+        cursor.execute(
+            f'UPDATE issues SET {changes}, updated_at = ?, version = version + 1 WHERE id = ?',
+            list(params) + [now_ms(), id]
+        )
+        return row
     
-    def mark_issue_as_fixed(self, id, fixed_by_id, fixed_by_name, notes=None):
-        """Mark an issue as fixed"""
-        return self.update_issue_status(id, 'fixed', fixed_by_id, fixed_by_name, notes)
+    def renew_issue_lease(self, id, claimed_by_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extend a claimed issue's lease to lease_seconds from now and return the
+        issue, None if it does not exist, or raise LeaseNotHeld
+        """
+        def write(cursor):
+            lease_expires_at = now_ms() + lease_seconds * 1000
+            if self._hold_issue(cursor, id, claimed_by_id, 'lease_expires_at = ?', [lease_expires_at]) is None:
+                return None
+            cursor.execute('SELECT * FROM issues WHERE id = ?', (id,))
+            return self._returned_issue(cursor, cursor.fetchone())
+        
+        return self._run_write(write)
+    
+    def release_issue_lease(self, id, claimed_by_id, notes=None):
+        """
+        Hand a claimed issue back to the queue as pending and return it, None
+        if it does not exist, or raise LeaseNotHeld
+        """
+        def write(cursor):
+            changes = "status = 'pending', claimed_by_id = NULL, claimed_by_name = NULL, lease_expires_at = NULL"
+            held = self._hold_issue(cursor, id, claimed_by_id, changes, [])
+            if held is None:
+                return None
+            
+            cursor.execute('''
+            INSERT INTO status_history (
+                issue_id, old_status, new_status,
+                changed_by_id, changed_by_name, notes, created_at
+            )
+            VALUES (?, 'in_progress', 'pending', ?, ?, ?, ?)
+            ''', (id, claimed_by_id, held[2], notes or 'Released to the work queue', now_ms()))
+            self._publish(cursor, 'status_changed', {
+                "issueId": id, "oldStatus": 'in_progress', "newStatus": 'pending', "changedById": claimed_by_id,
+            })
+            
+            # Read back after the history insert so the activity counters include it
+            cursor.execute('SELECT * FROM issues WHERE id = ?', (id,))
+            return self._returned_issue(cursor, cursor.fetchone())
+        
+        return self._run_write(write)
     
     def get_issue_statistics(self, issue_type=None):
         """Get statistics about issues"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Base query parts
@@ -691,15 +2211,214 @@ class SQLiteStorage:
             "mostReportedLocation": most_reported_location,
             "lastFixDate": last_fix_date
         }
+    
+    # Analytics operations
+    def _bucket_starts(self, bucket, start, end):
+        """List the start dates of every bucket overlapping [start, end)"""
+        if bucket == 'week':
+            current = start - timedelta(days=start.weekday())
+            step = timedelta(days=7)
+        else:
+            current = start
+            step = timedelta(days=1)
+        
+        starts = []
+        while current < end:
+            starts.append(current)
+            current += step
+        return starts, step
+    
+    def get_issue_timeseries(self, bucket='day', start=None, end=None):
+        """
+        Get issues opened and fixed per bucket, plus the open backlog at the
+        end of each bucket. Buckets that closed before the current one are
+        cached until a write changes a time on or before their end.
+        """
+        if bucket not in BUCKET_EXPRESSIONS:
+            raise ValueError(f"Unsupported bucket: {bucket}")
+        
+        today = datetime.utcnow().date()
+        end = end or today + timedelta(days=1)
+        start = start or end - timedelta(days=30 if bucket == 'day' else 7 * 12)
+        
+        starts, step = self._bucket_starts(bucket, start, end)
+        if not starts:
+            return []
+        current_bucket_start = self._bucket_starts(bucket, today, today + timedelta(days=1))[0][0]
+        
+        # Drop the cached buckets that writes since the last call reached into
+        conn = self._connect()
+        changed_from, version = conn.execute(
+            'SELECT MIN(day), MAX(version) FROM analytics_changes WHERE version > ?', (self._bucket_cache_version,)
+        ).fetchone()
+        conn.close()
+        
+        # Only query from the first bucket that is missing or still open
+        with self._bucket_cache_lock:
+            if version is not None and version > self._bucket_cache_version:
+                changed_from = date.fromisoformat(changed_from)
+                self._bucket_cache = {
+                    key: point for key, point in self._bucket_cache.items()
+                    if key[1] + timedelta(days=7 if key[0] == 'week' else 1) <= changed_from
+                }
+                self._bucket_cache_version = version
+            version = self._bucket_cache_version
+            cached = {
+                bucket_start: self._bucket_cache[(bucket, bucket_start)]
+                for bucket_start in starts
+                if (bucket, bucket_start) in self._bucket_cache
+            }
+        pending = [bucket_start for bucket_start in starts if bucket_start not in cached]
+        
+        if pending:
+            computed = self._compute_timeseries(bucket, pending[0], starts[-1] + step)
+            with self._bucket_cache_lock:
+                for bucket_start, point in computed.items():
+                    if bucket_start + step <= current_bucket_start and self._bucket_cache_version == version:
+                        self._bucket_cache[(bucket, bucket_start)] = point
+            for bucket_start, point in computed.items():
+                cached.setdefault(bucket_start, point)
+        
+        return [
+            {"bucket": bucket_start.isoformat(), **cached[bucket_start]}
+            for bucket_start in starts
+        ]
+    
+    def _compute_timeseries(self, bucket, start, end):
+        """Aggregate opened/fixed counts and running backlog for [start, end)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        start_ts = to_epoch_ms(start)
+        end_ts = to_epoch_ms(end)
+        
+        # Backlog carried into the first bucket, counted from the time indexes
+        cursor.execute('''
+        SELECT (SELECT COUNT(*) FROM issues WHERE created_at < :start)
+             - (SELECT COUNT(*) FROM issues WHERE fixed_at < :start)
+        ''', {"start": start_ts})
+        base_backlog = cursor.fetchone()[0] or 0
+        
+        created_bucket = BUCKET_EXPRESSIONS[bucket].format(column='created_at')
+        fixed_bucket = BUCKET_EXPRESSIONS[bucket].format(column='fixed_at')
+        
+        cursor.execute(f'''
+        WITH events AS (
+            SELECT {created_bucket} AS bucket, 1 AS opened, 0 AS fixed
+            FROM issues
+            WHERE created_at >= :start AND created_at < :end
+            UNION ALL
+            SELECT {fixed_bucket} AS bucket, 0 AS opened, 1 AS fixed
+            FROM issues
+            WHERE fixed_at >= :start AND fixed_at < :end
+        ),
+        per_bucket AS (
+            SELECT bucket, SUM(opened) AS opened, SUM(fixed) AS fixed
+            FROM events
+            GROUP BY bucket
+        )
+        SELECT bucket, opened, fixed,
+               SUM(opened - fixed) OVER (
+                   ORDER BY bucket ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+               ) AS backlog_delta
+        FROM per_bucket
+        ORDER BY bucket
+        ''', {"start": start_ts, "end": end_ts})
+        rows = cursor.fetchall()
+        conn.close()
+        
+        by_bucket = {
+            date.fromisoformat(row[0]): row
+            for row in rows
+        }
+        
+        # Fill empty buckets so the backlog carries forward
+        points = {}
+        backlog = base_backlog
+        starts, _ = self._bucket_starts(bucket, start, end)
+        for bucket_start in starts:
+            row = by_bucket.get(bucket_start)
+            if row:
+                backlog = base_backlog + row[3]
+            points[bucket_start] = {
+                "opened": row[1] if row else 0,
+                "fixed": row[2] if row else 0,
+                "backlog": backlog,
+            }
+        return points
+    
+    def get_fix_time_percentiles(self, group_by='issue_type'):
+        """Get mean, median and p90 time to fix (in minutes) per group"""
+        if group_by not in PERCENTILE_GROUP_COLUMNS:
+            raise ValueError(f"Unsupported group: {group_by}")
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        # Nearest-rank percentiles over (group, time_to_fix) index order
+        cursor.execute(f'''
+        WITH ranked AS (
+            SELECT {group_by} AS grp, time_to_fix,
+                   ROW_NUMBER() OVER (PARTITION BY {group_by} ORDER BY time_to_fix) AS rn,
+                   COUNT(*) OVER (PARTITION BY {group_by}) AS cnt
+            FROM issues
+            WHERE status = 'fixed' AND time_to_fix IS NOT NULL
+        )
+        SELECT grp, cnt, AVG(time_to_fix),
+               MIN(CASE WHEN rn >= 0.5 * cnt THEN time_to_fix END),
+               MIN(CASE WHEN rn >= 0.9 * cnt THEN time_to_fix END)
+        FROM ranked
+        GROUP BY grp
+        ORDER BY grp
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {
+                "group": row[0],
+                "count": row[1],
+                "averageFixTime": row[2],
+                "medianFixTime": row[3],
+                "p90FixTime": row[4],
+            }
+            for row in rows
+        ]
 
 
-# Initialize SQLite storage with default database path
-sqlite_storage = SQLiteStorage()
+class SharedMemorySQLiteStorage(SQLiteStorage):
+    """
+    SQLiteStorage on a named, shared-cache in-memory database (and archive),
+    e.g. for tests and benchmarks. Both live as long as this object.
+    """
+    uri = True
+    _names = itertools.count()
+    
+    def __init__(self, name=None, **options):
+        name = name or f'issues-{os.getpid()}-{next(self._names)}'
+        super().__init__(
+            f'file:{name}?mode=memory&cache=shared',
+            f'file:{name}_archive?mode=memory&cache=shared',
+            **options
+        )
+        # An in-memory database is dropped when its last connection closes
+        self._anchors = [sqlite3.connect(path, uri=True) for path in (self.db_path, self.archive_path)]
+    
+    def _archive_exists(self):
+        return True
+    
+    def close(self):
+        """Close the anchoring connections, dropping the databases"""
+        for conn in self._anchors:
+            conn.close()
+        self._anchors = []
+
 
 # Example usage:
 if __name__ == "__main__":
-    # Test the SQLite storage
+    # Test the SQLite storage with the default database path
     print("Testing SQLite storage")
+    sqlite_storage = SQLiteStorage()
     
     # Create a test user
     test_user = {
@@ -0,0 +1,220 @@
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from sqlite_db import PRIORITY_RANKS
+
+logger = logging.getLogger(__name__)
+
+# Web Mercator tiles are TILE_SIZE pixels square
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+# Mercator is undefined at the poles; clamp like every slippy-map client does
+MAX_LATITUDE = 85.0511287798
+
+# Three box blur passes approximate a Gaussian kernel. Points this many pixels
+# outside a tile still contribute heat to it, so they are binned as a margin.
+BLUR_RADIUS = 6
+BLUR_PASSES = 3
+TILE_MARGIN = BLUR_RADIUS * BLUR_PASSES
+
+# Issues with an unknown priority count as medium
+DEFAULT_WEIGHT = PRIORITY_RANKS['medium']
+
+# Blurred weight at which a pixel reaches ~63% of full intensity. A fixed
+# scale keeps neighbouring tiles consistent, unlike per-tile normalization.
+HEAT_SATURATION = 0.05
+
+# Colour ramp from transparent through blue and yellow to red
+COLOR_STOPS = (
+    (0.0, (0, 0, 255, 0)),
+    (0.25, (0, 128, 255, 128)),
+    (0.5, (0, 255, 128, 170)),
+    (0.75, (255, 255, 0, 200)),
+    (1.0, (255, 0, 0, 230)),
+)
+
+# Rendered tiles kept per data version
+DEFAULT_TILE_CACHE_SIZE = 2048
+
+# After a write, the previous layer keeps being served while a new one is
+# loaded in the background, at most once per this many seconds
+DEFAULT_REFRESH_INTERVAL = 5.0
+
+
+def _build_palette():
+    """Build a 256 entry RGBA lookup table from COLOR_STOPS"""
+    positions = [stop for stop, _ in COLOR_STOPS]
+    levels = np.linspace(0.0, 1.0, 256)
+    channels = [
+        np.interp(levels, positions, [color[channel] for _, color in COLOR_STOPS])
+        for channel in range(4)
+    ]
+    return np.stack(channels, axis=1).round().astype(np.uint8)
+
+
+PALETTE = _build_palette()
+
+
+def project(latitudes, longitudes):
+    """Project coordinates to Web Mercator world coordinates in [0, 1)"""
+    latitudes = np.radians(np.clip(latitudes, -MAX_LATITUDE, MAX_LATITUDE))
+    xs = (np.asarray(longitudes) + 180.0) / 360.0
+    ys = (1.0 - np.log(np.tan(latitudes) + 1.0 / np.cos(latitudes)) / np.pi) / 2.0
+    return xs, ys
+
+
+def box_blur(grid, radius):
+    """Blur a 2D array with a (2 * radius + 1) box along both axes using running sums"""
+    width = 2 * radius + 1
+    for axis in (0, 1):
+        padding = [(0, 0), (0, 0)]
+        padding[axis] = (radius + 1, radius)
+        sums = np.cumsum(np.pad(grid, padding), axis=axis)
+        if axis == 0:
+            grid = (sums[width:] - sums[:-width]) / width
+        else:
+            grid = (sums[:, width:] - sums[:, :-width]) / width
+    return grid
+
+
+class HeatmapLayer:
+    """Projected, weighted issue points, sorted by x so a tile's columns are one slice"""
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        valid = np.isfinite(points[:, 0]) & np.isfinite(points[:, 1])
+        points = points[valid]
+        xs, ys = project(points[:, 0], points[:, 1])
+        order = np.argsort(xs, kind='stable')
+        self.xs = xs[order]
+        self.ys = ys[order]
+        weights = points[order, 2]
+        self.weights = np.where(weights > 0, weights, DEFAULT_WEIGHT)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def density(self, z, x, y):
+        """Get the blurred, weighted point density of one tile as a TILE_SIZE square array"""
+        size = TILE_SIZE + 2 * TILE_MARGIN
+        scale = float(TILE_SIZE << z)
+        left = x * TILE_SIZE - TILE_MARGIN
+        top = y * TILE_SIZE - TILE_MARGIN
+
+        # Points are sorted by x, so the tile's columns are found by bisection
+        start, stop = np.searchsorted(self.xs, [left / scale, (left + size) / scale])
+        columns = (self.xs[start:stop] * scale - left).astype(np.int64)
+        rows = (self.ys[start:stop] * scale - top).astype(np.int64)
+        inside = (columns >= 0) & (columns < size) & (rows >= 0) & (rows < size)
+        if not inside.any():
+            return None
+
+        grid = np.bincount(
+            rows[inside] * size + columns[inside],
+            weights=self.weights[start:stop][inside],
+            minlength=size * size,
+        ).reshape(size, size)
+        for _ in range(BLUR_PASSES):
+            grid = box_blur(grid, BLUR_RADIUS)
+        return grid[TILE_MARGIN:-TILE_MARGIN, TILE_MARGIN:-TILE_MARGIN]
+
+
+def render_png(density):
+    """Render a density array (or None for an empty tile) as an RGBA PNG"""
+    if density is None:
+        pixels = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    else:
+        intensity = -np.expm1(-density / HEAT_SATURATION)
+        pixels = PALETTE[(intensity * 255).astype(np.uint8)]
+
+    output = io.BytesIO()
+    Image.fromarray(pixels, 'RGBA').save(output, format='PNG')
+    return output.getvalue()
+
+
+class HeatmapRenderer:
+    """
+    Render heatmap tiles for open issues.
+    Points are loaded per data version and rendered tiles are kept in an LRU
+    cache. A write bumps the data version; the stale layer and its tiles are
+    still served while a new layer loads in a background thread, started at
+    most once per refresh_interval seconds, so a burst of writes costs one
+    reload instead of one per write. With refresh_interval=0 the request
+    that sees a new version reloads the layer itself.
+    """
+
+    def __init__(self, storage, cache_size=DEFAULT_TILE_CACHE_SIZE, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.storage = storage
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._layer = None
+        self._tiles = OrderedDict()
+        self._loaded_at = None
+        self._refreshing = False
+
+    def _load(self):
+        """Load the layer of the current data version and make it the served one"""
+        # Read the version first: a write landing meanwhile leaves the layer
+        # marked older than it is, so it is simply loaded again
+        version = self.storage.get_data_version()["version"]
+        layer = HeatmapLayer(self.storage.get_heatmap_points())
+        with self._lock:
+            self._version = version
+            self._layer = layer
+            self._tiles.clear()
+            self._loaded_at = time.monotonic()
+        return version, layer
+
+    def _refresh(self):
+        try:
+            self._load()
+        except Exception:
+            logger.exception("Could not reload the heatmap layer")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _current_layer(self):
+        """Get the layer to render from, starting a reload if it is stale"""
+        version = self.storage.get_data_version()["version"]
+        with self._lock:
+            if version == self._version:
+                return self._version, self._layer
+            if self._layer is not None and self.refresh_interval > 0:
+                if not self._refreshing and time.monotonic() - self._loaded_at >= self.refresh_interval:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh, name='heatmap-refresh', daemon=True).start()
+                return self._version, self._layer
+        return self._load()
+
+    def render_tile(self, z, x, y):
+        """Get the PNG bytes of tile z/x/y"""
+        if not 0 <= z <= MAX_ZOOM:
+            raise ValueError(f"Zoom must be between 0 and {MAX_ZOOM}")
+        if not (0 <= x < 1 << z and 0 <= y < 1 << z):
+            raise ValueError(f"Tile {x}/{y} is outside zoom level {z}")
+
+        version, layer = self._current_layer()
+        key = (z, x, y)
+        with self._lock:
+            if self._version == version and key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+
+        tile = render_png(layer.density(z, x, y))
+
+        with self._lock:
+            if self._version == version:
+                self._tiles[key] = tile
+                if len(self._tiles) > self.cache_size:
+                    self._tiles.popitem(last=False)
+        return tile
@@ -0,0 +1,445 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+from sqlite_db import DEFAULT_JOB_ATTEMPTS, SQLiteStorage, now_ms
+from sqlite_maintenance import database_storages, maintain_database, verify_counters
+from sqlite_sharding import ShardRouter, ShardedSQLiteStorage
+
+# Job lifecycle: queued -> running -> done, or back to queued after a failed
+# attempt, or dead once max_attempts failed
+JOB_STATUSES = ('queued', 'running', 'done', 'dead')
+
+# Values accepted for the worker pool mode
+WORKER_MODES = ('thread', 'process')
+
+# A running job is handed to another worker if its lease is not renewed in time
+DEFAULT_JOB_LEASE_SECONDS = 300
+
+# Retry delays double per failed attempt, from BASE up to MAX seconds
+BACKOFF_BASE_SECONDS = 5
+MAX_BACKOFF_SECONDS = 3600
+
+# Seconds an idle worker waits before polling the queues again
+DEFAULT_POLL = 1.0
+
+# Longest error message kept on a job
+MAX_ERROR_LENGTH = 2000
+
+
+def backoff_seconds(attempts):
+    """Seconds to wait before retrying a job after its attempts-th failure, with jitter"""
+    delay = min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter keeps jobs failing together from retrying in lockstep
+    return random.uniform(delay / 2, delay)
+
+
+def _job(cursor, row):
+    """Build a job dict from a jobs row, decoding its payload and result"""
+    if row is None:
+        return None
+    job = dict(zip([column[0] for column in cursor.description], row))
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+
+class JobQueue:
+    """
+    The jobs table of one database file. Claims are a single UPDATE ...
+    RETURNING under the storage's write lock, so no two workers get the
+    same job, and every state change is checked against the claiming
+    worker, so a worker that lost its lease cannot overwrite the new owner.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _expire_leases(self, cursor, now):
+        """Requeue running jobs whose worker stopped renewing the lease, or dead-letter them"""
+        cursor.execute('''
+        UPDATE jobs INDEXED BY idx_jobs_lease_expires_at
+        SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+            finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+            locked_by = NULL, lease_expires_at = NULL, last_error = 'Lease expired',
+            run_at = ?, updated_at = ?
+        WHERE status = 'running' AND lease_expires_at < ?
+        ''', (now, now, now, now))
+
+    def claim(self, worker_id, kinds=None, lease_seconds=DEFAULT_JOB_LEASE_SECONDS):
+        """
+        Claim the highest priority due job of the given kinds (any kind when
+        kinds is None, none when it is empty) for a worker, or get None
+        """
+        if kinds is not None and not kinds:
+            return None
+        conditions = ["status = 'queued'", "run_at <= :now"]
+        params = {"worker": worker_id}
+        if kinds is not None:
+            conditions.append(f"kind IN ({', '.join(f':kind{n}' for n in range(len(kinds)))})")
+            params.update({f'kind{n}': kind for n, kind in enumerate(kinds)})
+
+        def write(cursor):
+            now = now_ms()
+            self._expire_leases(cursor, now)
+            cursor.execute(f'''
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, locked_by = :worker,
+                lease_expires_at = :lease_expires_at, updated_at = :now
+            WHERE id = (
+                SELECT id FROM jobs INDEXED BY idx_jobs_queue
+                WHERE {' AND '.join(conditions)}
+                ORDER BY priority DESC, run_at, id
+                LIMIT 1
+            )
+            RETURNING *
+            ''', {**params, "now": now, "lease_expires_at": now + int(lease_seconds * 1000)})
+            return _job(cursor, cursor.fetchone())
+
+        return self.storage._run_write(write)
+
+    def renew(self, job, worker_id, lease_seconds=DEFAULT_JOB_LEASE_SECONDS):
+        """Extend a running job's lease; False if the worker no longer holds it"""
+        def write(cursor):
+            now = now_ms()
+            cursor.execute('''
+            UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'running' AND locked_by = ?
+            ''', (now + int(lease_seconds * 1000), now, job['id'], worker_id))
+            return cursor.rowcount > 0
+
+        return self.storage._run_write(write)
+
+    def complete(self, job, worker_id, result=None):
+        """Mark a claimed job done with its result; False if the worker lost the lease"""
+        def write(cursor):
+            now = now_ms()
+            cursor.execute('''
+            UPDATE jobs
+            SET status = 'done', result = ?, locked_by = NULL, lease_expires_at = NULL,
+                finished_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'running' AND locked_by = ?
+            ''', (json.dumps(result, default=str), now, now, job['id'], worker_id))
+            return cursor.rowcount > 0
+
+        return self.storage._run_write(write)
+
+    def fail(self, job, worker_id, error):
+        """
+        Record a failed attempt: the job is retried after an exponential
+        backoff, or dead-lettered once it used up max_attempts. Returns the
+        new status, or None if the worker lost the lease.
+        """
+        dead = job['attempts'] >= job['max_attempts']
+
+        def write(cursor):
+            now = now_ms()
+            cursor.execute('''
+            UPDATE jobs
+            SET status = ?, last_error = ?, run_at = ?, finished_at = ?,
+                locked_by = NULL, lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND status = 'running' AND locked_by = ?
+            ''', (
+                'dead' if dead else 'queued', str(error)[:MAX_ERROR_LENGTH],
+                now if dead else now + int(backoff_seconds(job['attempts']) * 1000),
+                now if dead else None, now, job['id'], worker_id,
+            ))
+            return cursor.rowcount > 0
+
+        if not self.storage._run_write(write):
+            return None
+        return 'dead' if dead else 'queued'
+
+    def retry_dead(self, job_ids=None):
+        """Give dead jobs (all, or the given ids) a fresh set of attempts; returns how many"""
+        condition = "status = 'dead'"
+        params = []
+        if job_ids:
+            condition += f" AND id IN ({', '.join('?' for _ in job_ids)})"
+            params.extend(job_ids)
+
+        def write(cursor):
+            now = now_ms()
+            cursor.execute(f'''
+            UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, finished_at = NULL, updated_at = ?
+            WHERE {condition}
+            ''', [now, now] + params)
+            return cursor.rowcount
+
+        return self.storage._run_write(write)
+
+    def purge_done(self, older_than_days=7):
+        """Delete jobs that finished successfully more than older_than_days ago; returns how many"""
+        cutoff = now_ms() - int(older_than_days * 86400000)
+
+        def write(cursor):
+            cursor.execute("DELETE FROM jobs WHERE status = 'done' AND finished_at < ?", (cutoff,))
+            return cursor.rowcount
+
+        return self.storage._run_write(write)
+
+    def get(self, job_id):
+        """Get a job by id, or None"""
+        conn = self.storage._connect()
+        try:
+            cursor = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            return _job(cursor, cursor.fetchone())
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Get job counts per status, how many queued jobs are due and the oldest due job's wait"""
+        now = now_ms()
+        conn = self.storage._connect()
+        try:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            due, oldest = conn.execute('''
+            SELECT COUNT(*), MIN(run_at) FROM jobs INDEXED BY idx_jobs_queue
+            WHERE status = 'queued' AND run_at <= ?
+            ''', (now,)).fetchone()
+        finally:
+            conn.close()
+
+        return {
+            **{status: counts.get(status, 0) for status in JOB_STATUSES},
+            "due": due,
+            "oldestDueWaitMs": now - oldest if oldest is not None else None,
+        }
+
+
+def job_queue(storage):
+    """Get the queue jobs enqueued through a storage go to (the home shard when sharded)"""
+    return JobQueue(getattr(storage, 'home', storage))
+
+
+def job_stats(storage):
+    """Get job counts for every database file of a storage, and their totals"""
+    databases = [
+        {"database": database.db_path, **JobQueue(database).stats()}
+        for database in database_storages(storage)
+    ]
+    waits = [database["oldestDueWaitMs"] for database in databases if database["oldestDueWaitMs"] is not None]
+    totals = {key: sum(database[key] for database in databases) for key in JOB_STATUSES + ('due',)}
+    return {"databases": databases, **totals, "oldestDueWaitMs": max(waits) if waits else None}
+
+
+# Built-in job handlers: kind -> function(storage, payload) returning a JSON-able result
+def archive_job(storage, payload):
+    """Archive old fixed issues"""
+    return storage.archive_fixed_issues(payload.get('olderThanDays', 90), payload.get('batchSize', 500))
+
+
+def verify_counters_job(storage, payload):
+    """Check, and optionally repair, the issue activity counters"""
+    return verify_counters(storage, payload.get('repair', False))
+
+
+def maintenance_job(storage, payload):
+    """Run a maintenance pass over every database file"""
+    return [maintain_database(database) for database in database_storages(storage)]
+
+
+BUILTIN_HANDLERS = {
+    'archive_fixed_issues': archive_job,
+    'verify_activity_counters': verify_counters_job,
+    'maintain_database': maintenance_job,
+}
+
+
+def run_job(storage, queue, job, handlers, worker_id, lease_seconds=DEFAULT_JOB_LEASE_SECONDS):
+    """
+    Run one claimed job, renewing its lease while the handler works, and
+    record the outcome. Returns the job's new status, or None if the lease
+    was lost to another worker.
+    """
+    finished = threading.Event()
+
+    def keep_leased():
+        while not finished.wait(lease_seconds / 3):
+            try:
+                if not queue.renew(job, worker_id, lease_seconds):
+                    return
+            except sqlite3.Error:
+                continue
+
+    keeper = threading.Thread(target=keep_leased, name=f'job-lease-{job["id"]}', daemon=True)
+    keeper.start()
+    error = None
+    try:
+        result = handlers[job['kind']](storage, job['payload'])
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        finished.set()
+        keeper.join()
+
+    if error is not None:
+        return queue.fail(job, worker_id, error)
+    return 'done' if queue.complete(job, worker_id, result) else None
+
+
+def work(storage, handlers, worker_id, stop, lease_seconds=DEFAULT_JOB_LEASE_SECONDS, poll=DEFAULT_POLL):
+    """
+    Claim and run jobs from every database file of a storage until stop is
+    set. Only kinds with a handler are claimed, so workers with different
+    handlers can share the queues.
+    """
+    queues = [JobQueue(database) for database in database_storages(storage)]
+    kinds = list(handlers)
+    while not stop.is_set():
+        ran = False
+        for queue in queues:
+            try:
+                job = queue.claim(worker_id, kinds, lease_seconds)
+                if job:
+                    run_job(storage, queue, job, handlers, worker_id, lease_seconds)
+                    ran = True
+            except sqlite3.Error:
+                # A locked or briefly unavailable database is retried on the next poll
+                continue
+        if not ran:
+            stop.wait(poll)
+
+
+def _work_in_process(storage_factory, handlers, worker_id, stop, lease_seconds, poll):
+    storage = storage_factory()
+    try:
+        work(storage, handlers, worker_id, stop, lease_seconds, poll)
+    finally:
+        storage.close()
+
+
+def storage_factory(storage):
+    """Get a picklable callable recreating a file-backed SQLite storage in a worker process"""
+    if getattr(storage, 'uri', False):
+        raise ValueError("Process workers need file-backed SQLite storage")
+    if isinstance(storage, ShardedSQLiteStorage):
+        return functools.partial(
+            ShardedSQLiteStorage, storage.router,
+            busy_timeout=storage.home.busy_timeout, write_retries=storage.home.write_retries,
+        )
+    if isinstance(storage, SQLiteStorage):
+        return functools.partial(
+            SQLiteStorage, storage.db_path, storage.archive_path, storage.busy_timeout, storage.write_retries
+        )
+    raise ValueError("Background jobs need SQLite storage")
+
+
+class JobWorkerPool:
+    """
+    A pool of job workers for a storage, as threads of this process or as
+    spawned processes (handlers must then be importable module-level
+    functions). Like the maintenance scheduler, the pool is started lazily
+    and restarted in forked workers.
+    """
+    def __init__(self, storage, handlers=None, workers=2, mode='thread',
+                 lease_seconds=DEFAULT_JOB_LEASE_SECONDS, poll=DEFAULT_POLL):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode: {mode}")
+        if workers < 1:
+            raise ValueError("A worker pool needs at least one worker")
+        self.storage = storage
+        self.handlers = dict(BUILTIN_HANDLERS if handlers is None else handlers)
+        self.workers = workers
+        self.mode = mode
+        self.lease_seconds = lease_seconds
+        self.poll = poll
+        self._workers = []
+        self._pid = None
+        self._stop = None
+        self._lock = threading.Lock()
+
+    def _worker_id(self, n):
+        return f'{socket.gethostname()}:{os.getpid()}:{self.mode}-{n}'
+
+    def start(self):
+        """Start the workers in this process if they are not running"""
+        with self._lock:
+            if self._workers and self._pid == os.getpid():
+                return
+            if self.mode == 'process':
+                context = multiprocessing.get_context('spawn')
+                self._stop = context.Event()
+                factory = storage_factory(self.storage)
+                self._workers = [
+                    context.Process(
+                        target=_work_in_process, name=f'job-worker-{n}', daemon=True,
+                        args=(factory, self.handlers, self._worker_id(n), self._stop, self.lease_seconds, self.poll),
+                    )
+                    for n in range(self.workers)
+                ]
+            else:
+                self._stop = threading.Event()
+                self._workers = [
+                    threading.Thread(
+                        target=work, name=f'job-worker-{n}', daemon=True,
+                        args=(self.storage, self.handlers, self._worker_id(n), self._stop, self.lease_seconds, self.poll),
+                    )
+                    for n in range(self.workers)
+                ]
+            self._pid = os.getpid()
+            for worker in self._workers:
+                worker.start()
+
+    def stop(self):
+        """Stop the workers, letting running jobs finish"""
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+            if self._pid == os.getpid():
+                for worker in self._workers:
+                    worker.join()
+            self._workers = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs queued in issue databases")
+    parser.add_argument('database', nargs='?', help="database path (default: $SQLITE_DB_PATH or issues.db)")
+    parser.add_argument('--shards', help="sharded storage, e.g. 1=data/shards/site-1.db,2=data/shards/site-2.db")
+    parser.add_argument('--shard-groups', default='', help='e.g. "Jana Bazynskiego 2=1;Airport=2"')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--mode', choices=WORKER_MODES, default='thread')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_JOB_LEASE_SECONDS)
+    parser.add_argument('--stats', action='store_true', help="print job counts instead of working")
+    parser.add_argument('--retry-dead', action='store_true', help="requeue dead-lettered jobs and exit")
+    parser.add_argument('--purge-days', type=float, help="delete jobs done more than this many days ago and exit")
+    args = parser.parse_args()
+
+    if args.shards:
+        storage = ShardedSQLiteStorage(ShardRouter.from_spec(
+            args.shards.split(','), [group for group in args.shard_groups.split(';') if group]
+        ))
+    else:
+        storage = SQLiteStorage(args.database or os.environ.get('SQLITE_DB_PATH', 'issues.db'))
+    storage.initialize_db()
+    queues = [JobQueue(database) for database in database_storages(storage)]
+
+    if args.stats:
+        print(json.dumps(job_stats(storage), indent=2))
+        return
+    if args.retry_dead or args.purge_days is not None:
+        print(json.dumps({
+            "requeued": sum(queue.retry_dead() for queue in queues) if args.retry_dead else 0,
+            "purged": sum(queue.purge_done(args.purge_days) for queue in queues)
+            if args.purge_days is not None else 0,
+        }, indent=2))
+        return
+
+    pool = JobWorkerPool(storage, workers=args.workers, mode=args.mode, lease_seconds=args.lease_seconds)
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlite_db import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum values by name
+AUTO_VACUUM_MODES = ('none', 'full', 'incremental')
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Incremental vacuum releases this many free pages per write transaction and
+# pauses in between, so writers never wait long for the lock
+VACUUM_STEP_PAGES = 256
+VACUUM_STEP_PAUSE = 0.05
+
+# Free pages released per pass at most; the rest is left for the next pass
+DEFAULT_MAX_VACUUM_PAGES = 16384
+
+# A WAL holding more frames than this after a passive checkpoint is truncated
+WAL_TRUNCATE_FRAMES = 1000
+
+# Rows sampled per index when PRAGMA optimize decides to re-analyze
+ANALYSIS_LIMIT = 1000
+
+# Scheduler defaults, in seconds
+DEFAULT_INTERVAL = 3600
+DEFAULT_QUIET_PERIOD = 60
+DEFAULT_POLL = 10
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def _is_busy(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def _vacuum_incrementally(conn, max_pages):
+    """Release up to max_pages free pages in small, paced steps"""
+    started = time.perf_counter()
+    free_before = _pragma(conn, 'freelist_count')
+    free = free_before
+    deferred = False
+    while free and free_before - free < max_pages:
+        step = min(VACUUM_STEP_PAGES, max_pages - (free_before - free))
+        try:
+            # executescript steps the pragma to completion; execute() would
+            # release a single page
+            conn.executescript(f'PRAGMA incremental_vacuum({step})')
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e):
+                raise
+            deferred = True
+            break
+        free = _pragma(conn, 'freelist_count')
+        time.sleep(VACUUM_STEP_PAUSE)
+
+    return {
+        "freePagesBefore": free_before,
+        "reclaimedPages": free_before - free,
+        "deferred": deferred,
+        "ms": _elapsed_ms(started),
+    }
+
+
+def _checkpoint(conn, truncate=False):
+    """Checkpoint the WAL passively, truncating it if asked to or if it stays large"""
+    started = time.perf_counter()
+    busy, frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    mode = 'PASSIVE'
+    if truncate or frames > WAL_TRUNCATE_FRAMES:
+        mode = 'TRUNCATE'
+        busy, frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+
+    return {
+        "mode": mode,
+        "busy": bool(busy),
+        "walFrames": frames,
+        "checkpointedFrames": checkpointed,
+        "ms": _elapsed_ms(started),
+    }
+
+
+def convert_auto_vacuum(storage):
+    """
+    Switch a database created before auto_vacuum=INCREMENTAL over to it.
+    This takes a full VACUUM, which rewrites the whole file and holds the
+    write lock until it is done, so it only runs when asked for on the
+    command line, never from maintenance passes.
+    """
+    started = time.perf_counter()
+    conn = storage._connect(isolation_level=None)
+    try:
+        converted = _pragma(conn, 'auto_vacuum') != AUTO_VACUUM_INCREMENTAL
+        if converted:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+        return {"database": storage.db_path, "converted": converted, "ms": _elapsed_ms(started)}
+    finally:
+        conn.close()
+
+
+def _file_bytes(storage):
+    """Size of a storage's database file, or None for in-memory (URI) databases"""
+    return None if getattr(storage, 'uri', False) else os.path.getsize(storage.db_path)
+
+
+def maintain_database(storage, max_vacuum_pages=DEFAULT_MAX_VACUUM_PAGES, truncate_wal=False):
+    """
+    Run one maintenance pass over a storage's database and report what it did:
+    PRAGMA optimize, a paced incremental vacuum (on databases with
+    auto_vacuum=INCREMENTAL, see convert_auto_vacuum) and a WAL checkpoint.
+    Meant for quiet periods; nothing here blocks readers.
+    """
+    started = time.perf_counter()
+    conn = storage._connect(isolation_level=None)
+    try:
+        report = {
+            "database": storage.db_path,
+            "startedAt": datetime.utcnow().isoformat(timespec='seconds'),
+            "autoVacuum": AUTO_VACUUM_MODES[_pragma(conn, 'auto_vacuum')],
+            "pagesBefore": _pragma(conn, 'page_count'),
+            "fileBytesBefore": _file_bytes(storage),
+        }
+        tasks = {}
+
+        # Refresh statistics only for tables whose plans could have changed
+        task_started = time.perf_counter()
+        conn.execute(f'PRAGMA analysis_limit={ANALYSIS_LIMIT}')
+        conn.execute('PRAGMA optimize')
+        tasks["optimize"] = {"ms": _elapsed_ms(task_started)}
+
+        if _pragma(conn, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+            tasks["incrementalVacuum"] = _vacuum_incrementally(conn, max_vacuum_pages)
+
+        tasks["checkpoint"] = _checkpoint(conn, truncate_wal)
+
+        report.update({
+            "tasks": tasks,
+            "pagesAfter": _pragma(conn, 'page_count'),
+            "fileBytesAfter": _file_bytes(storage),
+            "ms": _elapsed_ms(started),
+        })
+        return report
+    finally:
+        conn.close()
+
+
+def database_storages(storage):
+    """List the per-file storages behind a storage (one per shard when sharded)"""
+    shards = getattr(storage, 'shards', None)
+    return list(shards.values()) if shards else [storage]
+
+
+def verify_counters(storage, repair=False):
+    """Check, and optionally repair, the issue activity counters in every database file"""
+    return [
+        {"database": database.db_path, **database.verify_activity_counters(repair)}
+        for database in database_storages(storage)
+    ]
+
+
+class MaintenanceScheduler:
+    """
+    Run maintenance in a background thread once the data has not changed for
+    quiet_period seconds, at most once per interval. The thread is started
+    lazily and restarted in forked workers, like the shard executor.
+    """
+    def __init__(self, storage, interval=DEFAULT_INTERVAL, quiet_period=DEFAULT_QUIET_PERIOD,
+                 poll=DEFAULT_POLL, **options):
+        self.storage = storage
+        self.interval = interval
+        self.quiet_period = quiet_period
+        self.poll = poll
+        self.options = options
+        self.last_report = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        """Maintain every database file now and keep the report"""
+        started = time.perf_counter()
+        databases = [maintain_database(storage, **self.options) for storage in database_storages(self.storage)]
+        report = {
+            "databases": databases,
+            "reclaimedPages": sum(
+                database["tasks"].get("incrementalVacuum", {}).get("reclaimedPages", 0) for database in databases
+            ),
+            "ms": _elapsed_ms(started),
+        }
+        self.last_report = report
+        return report
+
+    def _run(self):
+        last_version = None
+        quiet_since = time.monotonic()
+        last_run = None
+        while not self._stop.wait(self.poll):
+            try:
+                version = self.storage.get_data_version()["version"]
+            except Exception:
+                logger.exception("Could not read the data version, retrying on the next poll")
+                continue
+            now = time.monotonic()
+            if version != last_version:
+                last_version = version
+                quiet_since = now
+                continue
+            if now - quiet_since < self.quiet_period:
+                continue
+            if last_run is not None and now - last_run < self.interval:
+                continue
+            # A failed pass is reported and retried after the interval; it
+            # never ends the scheduler thread
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("Database maintenance pass failed")
+                self.last_report = {"error": f'{type(e).__name__}: {e}'}
+            last_run = time.monotonic()
+
+    def start(self):
+        """Start the scheduler thread in this process if it is not running"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sqlite-maintenance', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize, vacuum and checkpoint issue databases")
+    parser.add_argument('databases', nargs='*', help="database paths (default: $SQLITE_DB_PATH or issues.db)")
+    parser.add_argument('--max-vacuum-pages', type=int, default=DEFAULT_MAX_VACUUM_PAGES)
+    parser.add_argument('--truncate-wal', action='store_true', help="truncate the WAL after checkpointing")
+    parser.add_argument('--convert-auto-vacuum', action='store_true',
+                        help="first VACUUM databases over to auto_vacuum=INCREMENTAL (blocks writers meanwhile)")
+    parser.add_argument('--verify-counters', action='store_true',
+                        help="check issue activity counters against their rows instead of maintaining")
+    parser.add_argument('--repair', action='store_true', help="with --verify-counters, fix drifted counters")
+    parser.add_argument('--loop', action='store_true',
+                        help="keep running, maintaining each database whenever it has been quiet")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument('--quiet-period', type=float, default=DEFAULT_QUIET_PERIOD)
+    args = parser.parse_args()
+
+    paths = args.databases or [os.environ.get('SQLITE_DB_PATH', 'issues.db')]
+    options = {
+        "max_vacuum_pages": args.max_vacuum_pages,
+        "truncate_wal": args.truncate_wal,
+    }
+
+    if args.verify_counters:
+        for path in paths:
+            print(json.dumps(verify_counters(SQLiteStorage(path), args.repair), indent=2))
+        return
+
+    if args.convert_auto_vacuum:
+        for path in paths:
+            print(json.dumps(convert_auto_vacuum(SQLiteStorage(path)), indent=2))
+
+    if not args.loop:
+        for path in paths:
+            print(json.dumps(maintain_database(SQLiteStorage(path), **options), indent=2))
+        return
+
+    schedulers = [
+        MaintenanceScheduler(SQLiteStorage(path), args.interval, args.quiet_period, **options)
+        for path in paths
+    ]
+    for scheduler in schedulers:
+        scheduler.start()
+    printed = {}
+    try:
+        while True:
+            time.sleep(DEFAULT_POLL)
+            for scheduler in schedulers:
+                if scheduler.last_report and printed.get(id(scheduler)) is not scheduler.last_report:
+                    printed[id(scheduler)] = scheduler.last_report
+                    print(json.dumps(scheduler.last_report, indent=2))
+    except KeyboardInterrupt:
+        for scheduler in schedulers:
+            scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,290 @@
-from flask import Blueprint, jsonify, request
-from sqlite_db import sqlite_storage
+from flask import Blueprint, current_app, g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from sqlite_db import (
+    IMAGE_FIELDS, IMAGE_MODES, ISSUE_COLUMNS, ISSUE_VIEWS, MAX_BATCH_IDS, TIMESTAMP_FIELDS, IssueVersionConflict,
+    SharedMemorySQLiteStorage, SQLiteStorage, from_epoch_ms,
+)
+from memory_storage import InMemoryStorage
+from sqlite_admission import DEFAULT_RETRY_AFTER, AdmissionController, AdmissionRejected
+from sqlite_heatmap import DEFAULT_REFRESH_INTERVAL, HeatmapRenderer
+from sqlite_jobs import JobWorkerPool, job_queue, job_stats
+from sqlite_maintenance import DEFAULT_QUIET_PERIOD, MaintenanceScheduler
+from sqlite_sharding import ShardRouter, ShardedSQLiteStorage
+from storage_backend import (
+    DEFAULT_LEASE_SECONDS, MAX_LEASE_SECONDS, DuplicateUsername, LeaseNotHeld, UnsupportedOperation,
+)
+from functools import wraps
+import gzip
 import os
-from datetime import datetime
+import zlib
+from datetime import datetime, date, timedelta
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 # Create a Blueprint for SQLite routes
 sqlite_bp = Blueprint('sqlite', __name__)
 
+# Responses smaller than this many bytes are sent uncompressed
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+
+# Values accepted by the STORAGE_BACKEND setting
+STORAGE_BACKENDS = ('sqlite', 'sqlite-memory', 'memory')
+
+# Admission priority per endpoint; anything else is 'normal'
+ENDPOINT_PRIORITIES = {
+    # Technicians working issues
+    'update_issue_status': 'high',
+    'mark_issue_as_fixed': 'high',
+    'claim_next_issue': 'high',
+    'renew_issue_lease': 'high',
+    'release_issue_lease': 'high',
+    # Bulk and reporting calls
+    'batch_get_issues': 'low',
+    'get_heatmap_tile': 'low',
+    'get_statistics': 'low',
+    'archive_fixed_issues': 'low',
+    'get_issue_timeseries': 'low',
+    'get_backlog': 'low',
+    'get_fix_time_percentiles': 'low',
+}
+
+# POST endpoints that only read, admitted with the reads
+READ_ONLY_POST_ENDPOINTS = ('batch_get_issues', 'find_similar_issues')
+
+# Most duplicate candidates a similarity lookup may ask for
+MAX_SIMILAR_LIMIT = 50
+
+# Endpoints answered without admission, so overload stays observable
+ADMISSION_EXEMPT_ENDPOINTS = (
+    'get_storage_metrics', 'get_maintenance_report', 'get_job_metrics', 'get_admission_metrics',
+)
+
+# Issue fields holding free text, which duplicate detection tokenizes
+ISSUE_TEXT_FIELDS = ('title', 'description', 'location')
+
+# Caller-defined JSON echoed back as stored, never reformatted
+OPAQUE_FIELDS = ('payload',)
+
+def iso_timestamps(value):
+    """Copy a JSON-able value, formatting epoch-millisecond timestamp fields as ISO-8601"""
+    if isinstance(value, dict):
+        return {
+            key: item if key in OPAQUE_FIELDS
+            else from_epoch_ms(item) if key in TIMESTAMP_FIELDS and type(item) is int
+            else iso_timestamps(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [iso_timestamps(item) for item in value]
+    return value
+
+class APIJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider sending stored epoch-millisecond timestamps as ISO-8601
+    strings in responses of this blueprint; other routes are left alone
+    """
+    def dumps(self, obj, **kwargs):
+        if has_request_context() and request.blueprint == sqlite_bp.name:
+            obj = iso_timestamps(obj)
+        return super().dumps(obj, **kwargs)
+
+def create_storage(config):
+    """
+    Build the storage described by an app config.
+    STORAGE injects a ready StorageBackend; otherwise STORAGE_BACKEND picks
+    "sqlite" (default), "sqlite-memory" or "memory". SQLITE_SHARDS splits
+    SQLite storage per location group, e.g.
+    "1=data/shards/site-1.db,2=data/shards/site-2.db" with
+    SQLITE_SHARD_GROUPS="Jana Bazynskiego 2=1;Airport=2".
+    """
+    if config.get('STORAGE') is not None:
+        return config['STORAGE']
+    
+    backend = config.get('STORAGE_BACKEND') or 'sqlite'
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if backend == 'memory':
+        return InMemoryStorage()
+    
+    options = {
+        "busy_timeout": config.get('SQLITE_BUSY_TIMEOUT'),
+        "write_retries": config.get('SQLITE_WRITE_RETRIES'),
+    }
+    
+    shards = config.get('SQLITE_SHARDS')
+    if shards:
+        groups = config.get('SQLITE_SHARD_GROUPS') or ''
+        return ShardedSQLiteStorage(ShardRouter.from_spec(
+            shards.split(',') if isinstance(shards, str) else shards,
+            [group for group in groups.split(';') if group] if isinstance(groups, str) else groups
+        ), **options)
+    
+    if backend == 'sqlite-memory':
+        return SharedMemorySQLiteStorage(**options)
+    
+    return SQLiteStorage(config.get('SQLITE_DB_PATH'), config.get('SQLITE_ARCHIVE_PATH'), **options)
+
+def get_storage():
+    """Get the storage attached to the current app"""
+    return current_app.extensions['sqlite_storage']
+
+def get_heatmap_renderer():
+    """Get the heatmap tile renderer attached to the current app"""
+    return current_app.extensions['sqlite_heatmap']
+
+class IssueLoader:
+    """
+    Request-scoped issue loader: ids asked for together are fetched with a
+    single get_issues_by_ids call, and ids already loaded during the
+    request are answered from memory instead of hitting the database again.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self._loaded = {}
+    
+    def load_many(self, ids):
+        """Get issues (None for missing ids) in the order requested"""
+        ids = [int(id) for id in ids]
+        pending = [id for id in dict.fromkeys(ids) if id not in self._loaded]
+        if pending:
+            result = self.storage.get_issues_by_ids(pending)
+            for issue in result['items']:
+                self._loaded[issue['id']] = issue
+            for id in result['missing']:
+                self._loaded[id] = None
+        return [self._loaded[id] for id in ids]
+    
+    def load(self, id):
+        """Get one issue, or None if it does not exist"""
+        return self.load_many([id])[0]
+
+def get_issue_loader():
+    """Get the issue loader for the current request"""
+    if 'issue_loader' not in g:
+        g.issue_loader = IssueLoader(get_storage())
+    return g.issue_loader
+
+def round_up_to_second(timestamp):
+    """Parse an ISO-8601 timestamp, rounded up to whole seconds for HTTP dates"""
+    value = datetime.fromisoformat(timestamp)
+    if value.microsecond:
+        value = value.replace(microsecond=0) + timedelta(seconds=1)
+    return value
+
+def conditional(view):
+    """
+    Answer unchanged polls with 304 Not Modified before running the view.
+    The ETag combines the storage change counter with the request path and
+    query, plus the UTC date because date-relative defaults roll over daily.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        now = datetime.utcnow()
+        data_version = get_storage().get_data_version()
+        request_key = zlib.crc32(request.full_path.encode('utf-8'))
+        etag = f"{data_version['version']}-{request_key:08x}-{now:%Y%m%d}"
+        # HTTP dates have whole seconds but changes are stored in milliseconds:
+        # compare against the change time rounded up, and never announce the
+        # current second, which may still see more writes
+        changed_at = round_up_to_second(data_version['changedAt'])
+        last_modified = min(changed_at, now.replace(microsecond=0) - timedelta(seconds=1))
+        
+        # If-None-Match takes precedence over If-Modified-Since
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and changed_at <= since.replace(tzinfo=None)
+        
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    return wrapper
+
+# Request hooks
+@sqlite_bp.before_request
+def admit_request():
+    """
+    Hold the request until the admission controller has a read or write
+    slot for it, or answer 503 with Retry-After when it is overloaded
+    """
+    controller = current_app.extensions.get('sqlite_admission')
+    endpoint = (request.endpoint or '').rpartition('.')[2]
+    if not controller or endpoint in ADMISSION_EXEMPT_ENDPOINTS:
+        return None
+    
+    read_only = request.method in ('GET', 'HEAD', 'OPTIONS') or endpoint in READ_ONLY_POST_ENDPOINTS
+    kind = 'read' if read_only else 'write'
+    try:
+        controller.acquire(kind, ENDPOINT_PRIORITIES.get(endpoint, 'normal'))
+    except AdmissionRejected as e:
+        return jsonify({"error": "Server is overloaded, please retry later", "reason": e.reason}), 503, {
+            "Retry-After": str(e.retry_after),
+        }
+    g.admission_kind = kind
+    return None
+
+@sqlite_bp.teardown_request
+def release_admission(error=None):
+    """Free the request's admission slot, whatever the outcome of the view"""
+    kind = g.pop('admission_kind', None)
+    if kind:
+        current_app.extensions['sqlite_admission'].release(kind)
+
+@sqlite_bp.before_request
+def start_maintenance():
+    """Start the maintenance scheduler and job workers in this worker on its first API request"""
+    scheduler = current_app.extensions.get('sqlite_maintenance')
+    if scheduler:
+        scheduler.start()
+    pool = current_app.extensions.get('sqlite_jobs')
+    if pool:
+        pool.start()
+
+@sqlite_bp.after_request
+def compress_response(response):
+    """Gzip- or brotli-compress large JSON responses the client accepts compressed"""
+    response.vary.add('Accept-Encoding')
+    
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    min_size = current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_COMPRESS_MIN_SIZE)
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+    
+    offers = ['br', 'gzip'] if brotli else ['gzip']
+    encoding = request.accept_encodings.best_match(offers)
+    if not encoding:
+        return response
+    
+    data = response.get_data()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
 # User routes
 @sqlite_bp.route('/users/<int:id>', methods=['GET'])
 def get_user(id):
     """Get user by ID"""
-    user = sqlite_storage.get_user(id)
+    user = get_storage().get_user(id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify(user)
@@ -18,7 +292,7 @@ def get_user(id):
 @sqlite_bp.route('/users/by-username/<username>', methods=['GET'])
 def get_user_by_username(username):
     """Get user by username"""
-    user = sqlite_storage.get_user_by_username(username)
+    user = get_storage().get_user_by_username(username)
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify(user)
@@ -36,29 +310,217 @@ def create_user():
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
     
-    # Check if username already exists
-    existing_user = sqlite_storage.get_user_by_username(data['username'])
-    if existing_user:
+    # Create the user; the storage checks the username in the same transaction
+    try:
+        user = get_storage().create_user(data)
+    except DuplicateUsername:
         return jsonify({"error": "Username already exists"}), 409
-    
-    # Create the user
-    user = sqlite_storage.create_user(data)
     return jsonify(user), 201
 
 # Issue routes
+def _requested_fields():
+    """
+    Get the sparse fieldset from ?fields=a,b or a predefined ?view=,
+    or None for full issues. ?images=all|first|none replaces the image
+    fields of either with every image URL, the first one only, or none.
+    """
+    fields = None
+    view = request.args.get('view')
+    if view:
+        if view not in ISSUE_VIEWS:
+            raise ValueError(f"Unknown view: {view}")
+        fields = list(ISSUE_VIEWS[view])
+    elif request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    
+    images = request.args.get('images')
+    if images:
+        if images not in IMAGE_MODES:
+            raise ValueError(f"Unknown images option: {images}")
+        columns = fields if fields is not None else ISSUE_COLUMNS
+        fields = [field for field in columns if field not in IMAGE_FIELDS] + list(IMAGE_MODES[images])
+    return fields
+
+def _batch_get(ids):
+    """Load many issues by id, reporting the ids that do not exist"""
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} ids can be requested at once")
+    
+    fields = _requested_fields()
+    if fields is not None:
+        return get_storage().get_issues_by_ids(ids, fields)
+    
+    # Full issues go through the request loader so repeated ids are coalesced
+    unique_ids = list(dict.fromkeys(ids))
+    issues = get_issue_loader().load_many(unique_ids)
+    return {
+        "items": [issue for issue in issues if issue is not None],
+        "missing": [id for id, issue in zip(unique_ids, issues) if issue is None],
+    }
+
 @sqlite_bp.route('/issues', methods=['GET'])
+@conditional
 def get_issues():
-    """Get all issues"""
-    issues = sqlite_storage.get_issues()
+    """Get all issues, or only those listed in ?ids=1,2,3"""
+    try:
+        if 'ids' in request.args:
+            ids = request.args['ids'].split(',')
+            if not all(id.strip().isdigit() for id in ids if id.strip()):
+                return jsonify({"error": "ids must be a comma-separated list of issue ids"}), 400
+            return jsonify(_batch_get([int(id) for id in ids if id.strip()]))
+        issues = get_storage().get_issues(_requested_fields())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(issues)
 
+@sqlite_bp.route('/issues/batch-get', methods=['POST'])
+def batch_get_issues():
+    """Get many issues by id in one request"""
+    data = request.json
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({"error": "Missing ids list"}), 400
+    
+    try:
+        result = _batch_get([int(id) for id in data['ids']])
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+# Query string arguments of /issues/query -> (storage filter, value parser).
+# list arguments may repeat or hold comma-separated values.
+QUERY_ARGUMENTS = {
+    'status': ('status', list),
+    'type': ('issue_type', list),
+    'priority': ('priority', list),
+    'location': ('location', str),
+    'reportedBy': ('reported_by_id', int),
+    'createdFrom': ('created_from', str),
+    'createdTo': ('created_to', str),
+    'fixedFrom': ('fixed_from', str),
+    'fixedTo': ('fixed_to', str),
+    'minEstimatedCost': ('min_estimated_cost', float),
+    'maxEstimatedCost': ('max_estimated_cost', float),
+    'minFinalCost': ('min_final_cost', float),
+    'maxFinalCost': ('max_final_cost', float),
+}
+
+# Query string arguments of /issues/query that are not filters
+QUERY_OPTIONS = ('sort', 'page', 'pageSize', 'fields', 'view', 'images')
+
+MAX_PAGE_SIZE = 200
+
+@sqlite_bp.route('/issues/query', methods=['GET'])
+@conditional
+def query_issues():
+    """Get a page of issues matching combined filters, sorted server-side"""
+    filters = {}
+    try:
+        unknown = [
+            argument for argument in request.args if argument not in QUERY_ARGUMENTS and argument not in QUERY_OPTIONS
+        ]
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+        
+        for argument, (name, parse) in QUERY_ARGUMENTS.items():
+            if argument not in request.args:
+                continue
+            if parse is list:
+                filters[name] = [
+                    value.strip()
+                    for values in request.args.getlist(argument)
+                    for value in values.split(',') if value.strip()
+                ]
+            else:
+                try:
+                    filters[name] = parse(request.args[argument])
+                except ValueError:
+                    raise ValueError(f"Invalid {argument}: {request.args[argument]}") from None
+        
+        try:
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('pageSize', 50))
+        except ValueError:
+            page = page_size = 0
+        if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"page must be >= 1 and pageSize between 1 and {MAX_PAGE_SIZE}")
+        
+        result = get_storage().query_issues(
+            filters, request.args.get('sort', '-created_at'), page, page_size, _requested_fields()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(result)
+
+@sqlite_bp.route('/users/<int:id>/issues', methods=['GET'])
+@conditional
+def get_user_issues(id):
+    """Get a page of the issues a user reported (?role=reporter) or fixed (?role=fixer)"""
+    try:
+        statuses = [
+            value.strip()
+            for values in request.args.getlist('status')
+            for value in values.split(',') if value.strip()
+        ]
+        limit = int(request.args.get('limit', 50))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    
+        result = get_storage().get_user_issues(
+            id, request.args.get('role', 'reporter'), statuses or None, limit,
+            request.args.get('cursor'), _requested_fields()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(result)
+
+def _issue_response(issue, status=200):
+    """Answer with an issue; its version doubles as a strong ETag for If-Match"""
+    response = jsonify(issue)
+    response.status_code = status
+    if issue.get('version') is not None:
+        response.set_etag(str(issue['version']))
+    return response
+
+def _expected_version(data):
+    """
+    Get the issue version a write is conditional on, and the status to answer
+    with if it is stale: 412 for If-Match, 409 for a version in the body
+    """
+    if request.if_match and not request.if_match.star_tag:
+        versions = [tag for tag in request.if_match.as_set() if tag.isdigit()]
+        if len(versions) != 1:
+            raise ValueError("If-Match must name exactly one issue version")
+        return int(versions[0]), 412
+    
+    if data.get('version') is not None:
+        if not isinstance(data['version'], int):
+            raise ValueError("version must be an integer")
+        return data['version'], 409
+    
+    return None, None
+
+def _check_text_fields(data):
+    """Raise ValueError unless the issue text fields given are strings (the description may be null)"""
+    for field in ISSUE_TEXT_FIELDS:
+        if field in data and not isinstance(data[field], str) and not (field == 'description' and data[field] is None):
+            raise ValueError(f"{field} must be a string")
+
+def _version_conflict(error, status):
+    """Answer a write made against a stale issue version"""
+    response = jsonify({"error": str(error), "currentVersion": error.current_version})
+    response.status_code = status
+    response.set_etag(str(error.current_version))
+    return response
+
 @sqlite_bp.route('/issues/<int:id>', methods=['GET'])
 def get_issue(id):
     """Get issue by ID"""
-    issue = sqlite_storage.get_issue(id)
+    issue = get_storage().get_issue(id)
     if not issue:
         return jsonify({"error": "Issue not found"}), 404
-    return jsonify(issue)
+    return _issue_response(issue)
 
 @sqlite_bp.route('/issues', methods=['POST'])
 def create_issue():
@@ -72,10 +534,45 @@ def create_issue():
     for field in required_fields:
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
+    try:
+        _check_text_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Look for likely duplicates first if asked, so the new issue is not among them
+    storage = get_storage()
+    duplicates = storage.find_similar_issues(data) if data.get('checkDuplicates') else None
     
     # Create the issue
-    issue = sqlite_storage.create_issue(data)
-    return jsonify(issue), 201
+    issue = storage.create_issue(data)
+    if duplicates is not None:
+        issue['possibleDuplicates'] = duplicates
+    return _issue_response(issue, 201)
+
+@sqlite_bp.route('/issues/similar', methods=['POST'])
+def find_similar_issues():
+    """Get open issues at the same location that a new report likely duplicates, best first"""
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid request data"}), 400
+    for field in ('title', 'location'):
+        if not data.get(field):
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+    try:
+        _check_text_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        limit = int(data.get('limit', 5))
+        min_score = float(data.get('minScore', 0.3))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer and minScore a number"}), 400
+    if not 1 <= limit <= MAX_SIMILAR_LIMIT or not 0 <= min_score <= 1:
+        return jsonify({"error": f"limit must be 1-{MAX_SIMILAR_LIMIT} and minScore 0-1"}), 400
+    
+    items = get_storage().find_similar_issues(data, limit=limit, min_score=min_score)
+    return jsonify({"items": items})
 
 @sqlite_bp.route('/issues/<int:id>', methods=['PATCH'])
 def update_issue(id):
@@ -84,23 +581,31 @@ def update_issue(id):
     if not data:
         return jsonify({"error": "Invalid request data"}), 400
     
-    # Update the issue
-    issue = sqlite_storage.update_issue(id, data)
+    # Update the issue, only if it is still at the version the client saw
+    try:
+        _check_text_fields(data)
+        expected_version, conflict_status = _expected_version(data)
+        issue = get_storage().update_issue(id, data, expected_version)
+    except IssueVersionConflict as e:
+        return _version_conflict(e, conflict_status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not issue:
         return jsonify({"error": "Issue not found"}), 404
     
-    return jsonify(issue)
+    return _issue_response(issue)
 
 @sqlite_bp.route('/issues/<int:id>', methods=['DELETE'])
 def delete_issue(id):
     """Delete an issue"""
-    success = sqlite_storage.delete_issue(id)
+    success = get_storage().delete_issue(id)
     if not success:
         return jsonify({"error": "Issue not found"}), 404
     
     return jsonify({"message": f"Issue {id} deleted successfully"})
 
 @sqlite_bp.route('/issues/nearby', methods=['GET'])
+@conditional
 def get_nearby_issues():
     """Get issues near a geographical point"""
     lat = request.args.get('lat')
@@ -110,14 +615,25 @@ def get_nearby_issues():
     if not lat or not lng:
         return jsonify({"error": "Missing latitude or longitude parameters"}), 400
     
-    issues = sqlite_storage.get_nearby_issues(float(lat), float(lng), float(radius))
+    issues = get_storage().get_nearby_issues(float(lat), float(lng), float(radius))
     return jsonify(issues)
 
+@sqlite_bp.route('/heatmap/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+@conditional
+def get_heatmap_tile(z, x, y):
+    """Get a density heatmap tile of open issues, weighted by priority"""
+    try:
+        tile = get_heatmap_renderer().render_tile(z, x, y)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return current_app.response_class(tile, mimetype='image/png')
+
 # Comments routes
 @sqlite_bp.route('/issues/<int:issue_id>/comments', methods=['GET'])
 def get_comments(issue_id):
     """Get comments for an issue"""
-    comments = sqlite_storage.get_comments(issue_id)
+    comments = get_storage().get_comments(issue_id)
     return jsonify(comments)
 
 @sqlite_bp.route('/issues/<int:issue_id>/comments', methods=['POST'])
@@ -137,21 +653,21 @@ def create_comment(issue_id):
     data['issueId'] = issue_id
     
     # Create the comment
-    comment = sqlite_storage.create_comment(data)
+    comment = get_storage().create_comment(data)
     return jsonify(comment), 201
 
 # Images routes
 @sqlite_bp.route('/issues/<int:issue_id>/images', methods=['GET'])
 def get_images(issue_id):
     """Get images for an issue"""
-    images = sqlite_storage.get_images_by_issue_id(issue_id)
+    images = get_storage().get_images_by_issue_id(issue_id)
     return jsonify(images)
 
 # Status history routes
 @sqlite_bp.route('/issues/<int:issue_id>/status-history', methods=['GET'])
 def get_status_history(issue_id):
     """Get status change history for an issue"""
-    history = sqlite_storage.get_status_history(issue_id)
+    history = get_storage().get_status_history(issue_id)
     return jsonify(history)
 
 # Status update routes
@@ -167,11 +683,19 @@ def update_issue_status(id):
     changed_by_name = data.get('changedByName')
     notes = data.get('notes')
     
-    issue = sqlite_storage.update_issue_status(id, new_status, changed_by_id, changed_by_name, notes)
+    try:
+        expected_version, conflict_status = _expected_version(data)
+        issue = get_storage().update_issue_status(
+            id, new_status, changed_by_id, changed_by_name, notes, expected_version
+        )
+    except IssueVersionConflict as e:
+        return _version_conflict(e, conflict_status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not issue:
         return jsonify({"error": "Issue not found"}), 404
     
-    return jsonify(issue)
+    return _issue_response(issue)
 
 @sqlite_bp.route('/issues/<int:id>/fix', methods=['POST'])
 def mark_issue_as_fixed(id):
@@ -187,31 +711,133 @@ def mark_issue_as_fixed(id):
     if not fixed_by_id or not fixed_by_name:
         return jsonify({"error": "Missing required fields for marking issue as fixed"}), 400
     
-    issue = sqlite_storage.mark_issue_as_fixed(id, fixed_by_id, fixed_by_name, notes)
+    try:
+        expected_version, conflict_status = _expected_version(data)
+        issue = get_storage().mark_issue_as_fixed(id, fixed_by_id, fixed_by_name, notes, expected_version)
+    except IssueVersionConflict as e:
+        return _version_conflict(e, conflict_status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not issue:
         return jsonify({"error": "Issue not found"}), 404
     
-    return jsonify(issue)
+    return _issue_response(issue)
 
 # Filtered issue routes
 @sqlite_bp.route('/issues/by-status/<status>', methods=['GET'])
+@conditional
 def get_issues_by_status(status):
     """Get issues filtered by status"""
-    issues = sqlite_storage.get_issues_by_status(status)
+    try:
+        issues = get_storage().get_issues_by_status(status, _requested_fields())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(issues)
 
 @sqlite_bp.route('/issues/by-type/<issue_type>', methods=['GET'])
+@conditional
 def get_issues_by_type(issue_type):
     """Get issues filtered by type"""
-    issues = sqlite_storage.get_issues_by_type(issue_type)
+    try:
+        issues = get_storage().get_issues_by_type(issue_type, _requested_fields())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(issues)
 
+# Work queue routes
+@sqlite_bp.route('/queue/claim', methods=['POST'])
+def claim_next_issue():
+    """
+    Claim the most urgent, oldest pending issue matching a technician's
+    issue types and location. Answers 204 when nothing is claimable.
+    """
+    data = request.json
+    if not data:
+        return jsonify({"error": "Invalid request data"}), 400
+    
+    technician_id = data.get('technicianId')
+    technician_name = data.get('technicianName')
+    if not technician_id or not technician_name:
+        return jsonify({"error": "Missing technicianId or technicianName"}), 400
+    
+    issue_types = data.get('issueTypes', data.get('issueType'))
+    if isinstance(issue_types, str):
+        issue_types = [issue_types]
+    if issue_types is not None and not (
+        isinstance(issue_types, list) and all(isinstance(issue_type, str) for issue_type in issue_types)
+    ):
+        return jsonify({"error": "issueTypes must be a list of issue types"}), 400
+    
+    lease_seconds = _lease_seconds(data)
+    if lease_seconds is None:
+        return jsonify({"error": f"leaseSeconds must be between 1 and {MAX_LEASE_SECONDS}"}), 400
+    
+    issue = get_storage().claim_next_issue(
+        technician_id, technician_name, issue_types, data.get('location'), lease_seconds
+    )
+    if not issue:
+        return '', 204
+    
+    return _issue_response(issue)
+
+@sqlite_bp.route('/queue/<int:id>/renew', methods=['POST'])
+def renew_issue_lease(id):
+    """Extend the lease on an issue the technician claimed from the queue"""
+    data = request.json
+    if not data:
+        return jsonify({"error": "Invalid request data"}), 400
+    
+    technician_id = data.get('technicianId')
+    if not technician_id:
+        return jsonify({"error": "Missing technicianId"}), 400
+    
+    lease_seconds = _lease_seconds(data)
+    if lease_seconds is None:
+        return jsonify({"error": f"leaseSeconds must be between 1 and {MAX_LEASE_SECONDS}"}), 400
+    
+    try:
+        issue = get_storage().renew_issue_lease(id, technician_id, lease_seconds)
+    except LeaseNotHeld as e:
+        return jsonify({"error": str(e)}), 409
+    if not issue:
+        return jsonify({"error": "Issue not found"}), 404
+    
+    return _issue_response(issue)
+
+@sqlite_bp.route('/queue/<int:id>/release', methods=['POST'])
+def release_issue_lease(id):
+    """Hand an issue the technician claimed back to the queue"""
+    data = request.json
+    if not data:
+        return jsonify({"error": "Invalid request data"}), 400
+    
+    technician_id = data.get('technicianId')
+    if not technician_id:
+        return jsonify({"error": "Missing technicianId"}), 400
+    
+    try:
+        issue = get_storage().release_issue_lease(id, technician_id, data.get('notes'))
+    except LeaseNotHeld as e:
+        return jsonify({"error": str(e)}), 409
+    if not issue:
+        return jsonify({"error": "Issue not found"}), 404
+    
+    return _issue_response(issue)
+
+def _lease_seconds(data):
+    """Get the requested lease length, or None if it is out of range"""
+    lease_seconds = data.get('leaseSeconds', DEFAULT_LEASE_SECONDS)
+    if not isinstance(lease_seconds, int) or not 0 < lease_seconds <= MAX_LEASE_SECONDS:
+        return None
+    return lease_seconds
+
 # Statistics routes
 @sqlite_bp.route('/statistics', methods=['GET'])
+@conditional
 def get_statistics():
     """Get statistics about issues"""
     issue_type = request.args.get('type')
-    stats = sqlite_storage.get_issue_statistics(issue_type)
+    stats = get_storage().get_issue_statistics(issue_type)
     
     # For UI compatibility, add community members count (this would come from a proper users table)
     stats["communityMembers"] = 156
@@ -225,6 +851,187 @@ def get_statistics():
     
     return jsonify(stats)
 
+# Storage metrics routes
+@sqlite_bp.route('/metrics/storage', methods=['GET'])
+def get_storage_metrics():
+    """Get write transaction, lock retry and give-up counts for this process"""
+    return jsonify({"writes": get_storage().get_write_metrics()})
+
+# Admission routes
+@sqlite_bp.route('/metrics/admission', methods=['GET'])
+def get_admission_metrics():
+    """Get read and write admission queue depth, rejections and wait times for this process"""
+    controller = current_app.extensions.get('sqlite_admission')
+    if not controller:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **controller.metrics()})
+
+# Maintenance routes
+@sqlite_bp.route('/metrics/maintenance', methods=['GET'])
+def get_maintenance_report():
+    """Get the latest background maintenance report"""
+    scheduler = current_app.extensions.get('sqlite_maintenance')
+    if not scheduler:
+        return jsonify({"enabled": False, "lastReport": None})
+    return jsonify({"enabled": True, "lastReport": scheduler.last_report})
+
+# Archive routes
+@sqlite_bp.route('/archive', methods=['POST'])
+def archive_fixed_issues():
+    """Move issues fixed long ago into the archive database"""
+    data = request.json or {}
+    
+    try:
+        older_than_days = int(data.get('olderThanDays', 90))
+        batch_size = int(data.get('batchSize', 500))
+    except (TypeError, ValueError):
+        return jsonify({"error": "olderThanDays and batchSize must be integers"}), 400
+    
+    if older_than_days < 0 or batch_size < 1:
+        return jsonify({"error": "olderThanDays must be >= 0 and batchSize >= 1"}), 400
+    
+    storage = get_storage()
+    # In the background the archive runs as a job; poll /api/jobs/<jobId> for the result
+    if data.get('background'):
+        try:
+            job_id = storage.enqueue_job(
+                'archive_fixed_issues', {"olderThanDays": older_than_days, "batchSize": batch_size}
+            )
+        except UnsupportedOperation:
+            return jsonify({"error": "This storage backend has no job queue"}), 400
+        return jsonify({"jobId": job_id, "status": "queued"}), 202
+    
+    result = storage.archive_fixed_issues(older_than_days, batch_size)
+    return jsonify(result)
+
+# Background job routes
+@sqlite_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a background job enqueued through the API, with its status and result"""
+    storage = get_storage()
+    if not storage.supports_jobs():
+        return jsonify({"error": "This storage backend has no job queue"}), 400
+    
+    job = job_queue(storage).get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@sqlite_bp.route('/metrics/jobs', methods=['GET'])
+def get_job_metrics():
+    """Get background job counts per status and the in-process worker pool settings"""
+    storage = get_storage()
+    if not storage.supports_jobs():
+        return jsonify({"enabled": False})
+    
+    pool = current_app.extensions.get('sqlite_jobs')
+    return jsonify({
+        "enabled": True,
+        "workers": pool.workers if pool else 0,
+        "mode": pool.mode if pool else None,
+        **job_stats(storage),
+    })
+
+# Analytics routes
+def _parse_date_arg(name):
+    """Parse an optional YYYY-MM-DD query argument"""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+@sqlite_bp.route('/analytics/timeseries', methods=['GET'])
+@conditional
+def get_issue_timeseries():
+    """Get issues opened/fixed and open backlog per day or week"""
+    bucket = request.args.get('bucket', 'day')
+    try:
+        start = _parse_date_arg('start')
+        end = _parse_date_arg('end')
+        series = get_storage().get_issue_timeseries(bucket, start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(series)
+
+@sqlite_bp.route('/analytics/backlog', methods=['GET'])
+@conditional
+def get_backlog():
+    """Get the open issue backlog at the end of each day or week"""
+    bucket = request.args.get('bucket', 'week')
+    try:
+        start = _parse_date_arg('start')
+        end = _parse_date_arg('end')
+        series = get_storage().get_issue_timeseries(bucket, start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify([{"bucket": point["bucket"], "backlog": point["backlog"]} for point in series])
+
+@sqlite_bp.route('/analytics/fix-time', methods=['GET'])
+@conditional
+def get_fix_time_percentiles():
+    """Get median/p90 time to fix per issue type or location"""
+    group_by = request.args.get('groupBy', 'issue_type')
+    try:
+        percentiles = get_storage().get_fix_time_percentiles(group_by)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(percentiles)
+
 # Function to register the blueprint with a Flask app
 def register_sqlite_routes(app):
+    # Storage is created once per app; no database connection is opened here
+    if 'sqlite_storage' not in app.extensions:
+        app.extensions['sqlite_storage'] = create_storage(app.config)
+    # Timestamps are stored as integers but the API keeps speaking ISO-8601
+    app.json = APIJSONProvider(app)
+    # Background maintenance runs only when an interval is configured, and
+    # only has work to do on database files
+    storage = app.extensions['sqlite_storage']
+    file_backed = isinstance(storage, (SQLiteStorage, ShardedSQLiteStorage)) and not getattr(storage, 'uri', False)
+    interval = app.config.get('SQLITE_MAINTENANCE_INTERVAL')
+    if interval and file_backed and 'sqlite_maintenance' not in app.extensions:
+        app.extensions['sqlite_maintenance'] = MaintenanceScheduler(
+            app.extensions['sqlite_storage'],
+            interval=float(interval),
+            quiet_period=float(app.config.get('SQLITE_MAINTENANCE_QUIET') or DEFAULT_QUIET_PERIOD),
+        )
+    # Jobs are enqueued with the writes of subscribed storage events, e.g.
+    # JOB_SUBSCRIPTIONS=[("issue_created", "notify_reporter")], and run by
+    # JOB_WORKERS in-process workers if configured (or by python sqlite_jobs.py)
+    if storage.supports_jobs() and 'sqlite_jobs' not in app.extensions:
+        for subscription in app.config.get('JOB_SUBSCRIPTIONS') or ():
+            storage.subscribe_job(*subscription)
+        workers = int(app.config.get('JOB_WORKERS') or 0)
+        if workers:
+            app.extensions['sqlite_jobs'] = JobWorkerPool(
+                storage,
+                handlers=app.config.get('JOB_HANDLERS'),
+                workers=workers,
+                mode=app.config.get('JOB_WORKER_MODE') or 'thread',
+            )
+    # Admission control is off unless ADMISSION_CONTROL is true; limits are per process
+    admission = app.config.get('ADMISSION_CONTROL')
+    if str(admission).lower() in ('1', 'true', 'yes', 'on') and 'sqlite_admission' not in app.extensions:
+        limits = {}
+        for kind in ('read', 'write'):
+            prefix = f'ADMISSION_{kind.upper()}_'
+            settings = {
+                "limit": app.config.get(prefix + 'LIMIT'),
+                "max_queue": app.config.get(prefix + 'QUEUE'),
+                "max_wait": app.config.get(prefix + 'MAX_WAIT'),
+            }
+            limits[kind] = {
+                name: (float if name == 'max_wait' else int)(value)
+                for name, value in settings.items() if value not in (None, '')
+            }
+        app.extensions['sqlite_admission'] = AdmissionController(
+            limits, retry_after=int(app.config.get('ADMISSION_RETRY_AFTER') or DEFAULT_RETRY_AFTER)
+        )
+    if 'sqlite_heatmap' not in app.extensions:
+        refresh_interval = app.config.get('HEATMAP_REFRESH_INTERVAL')
+        app.extensions['sqlite_heatmap'] = HeatmapRenderer(
+            app.extensions['sqlite_storage'],
+            refresh_interval=float(DEFAULT_REFRESH_INTERVAL if refresh_interval is None else refresh_interval),
+        )
     app.register_blueprint(sqlite_bp, url_prefix='/api')
\ No newline at end of file
@@ -0,0 +1,707 @@
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlite_db import (
+    ACTIVITY_COUNTERS, PERCENTILE_GROUP_COLUMNS, PRIORITY_RANKS, USER_FEED_ROLES, SQLiteStorage, encode_feed_cursor,
+    parse_issue_sort,
+)
+from storage_backend import DEFAULT_LEASE_SECONDS, StorageBackend
+
+# Every shard owns the id range [shard * SHARD_ID_SPAN, (shard + 1) * SHARD_ID_SPAN)
+# for issues and their child rows, so an id alone identifies its shard.
+# Ids stay well below 2**53 and therefore remain exact in JavaScript clients.
+SHARD_ID_SPAN = 10 ** 12
+
+# Tables whose AUTOINCREMENT sequence is seeded into the shard's id range
+SHARDED_TABLES = ('issues', 'images', 'comments', 'status_history')
+
+# Job payload keys holding ids of SHARDED_TABLES rows, rewritten by split_database
+JOB_PAYLOAD_IDS = ('issueId', 'imageId', 'commentId')
+
+
+class ShardRouter:
+    """
+    Maps locations and ids to shard numbers.
+    Locations listed in location_groups go to their configured shard; any
+    other location is hashed onto a stable shard.
+    """
+    def __init__(self, shard_paths, location_groups=None):
+        if not shard_paths:
+            raise ValueError("At least one shard is required")
+        for shard in shard_paths:
+            if not isinstance(shard, int) or shard < 1:
+                raise ValueError(f"Shard numbers must be positive integers, got {shard!r}")
+
+        self.shard_paths = dict(shard_paths)
+        self.shard_numbers = sorted(self.shard_paths)
+        self.location_groups = dict(location_groups or {})
+
+        for location, shard in self.location_groups.items():
+            if shard not in self.shard_paths:
+                raise ValueError(f"Location {location!r} is mapped to unknown shard {shard}")
+
+    @classmethod
+    def from_spec(cls, shards, groups=()):
+        """
+        Build a router from "N=PATH" shard entries and "LOCATION=N" group
+        entries, as given on the command line or in the environment
+        """
+        shard_paths = {}
+        for value in shards:
+            number, path = value.split('=', 1)
+            shard_paths[int(number)] = path.strip()
+        location_groups = {}
+        for value in groups:
+            location, number = value.rsplit('=', 1)
+            location_groups[location.strip()] = int(number)
+        return cls(shard_paths, location_groups)
+
+    def shard_for_location(self, location):
+        """Get the shard number that stores issues for a location"""
+        if location in self.location_groups:
+            return self.location_groups[location]
+        index = zlib.crc32(location.encode('utf-8')) % len(self.shard_numbers)
+        return self.shard_numbers[index]
+
+    def shard_for_id(self, id):
+        """Get the shard number that owns an issue (or child row) id"""
+        shard = int(id) // SHARD_ID_SPAN
+        if shard not in self.shard_paths:
+            return None
+        return shard
+
+
+class ShardStorage(SQLiteStorage):
+    """SQLiteStorage whose new ids are allocated inside its shard's id range"""
+    def __init__(self, db_path, shard, **options):
+        super().__init__(db_path, **options)
+        self.shard = shard
+        self._seeded = False
+        self._seed_lock = threading.Lock()
+
+    def initialize_db(self):
+        """Create or migrate the schema, then seed the shard's id sequences"""
+        if self._seeded:
+            return
+
+        with self._seed_lock:
+            if self._seeded:
+                return
+            super().initialize_db()
+            seed_shard_sequences(self.db_path, self.shard)
+            self._seeded = True
+
+
+class ShardedSQLiteStorage(StorageBackend):
+    """
+    SQLite storage split into one database file per location group.
+    Single-issue operations are routed to the owning shard; listings and
+    statistics fan out to every shard in parallel and merge the results.
+    Users live in the home shard (the lowest shard number).
+    """
+    def __init__(self, router, **options):
+        self.router = router
+        self.shards = {
+            shard: ShardStorage(path, shard, **options)
+            for shard, path in router.shard_paths.items()
+        }
+        self.home = self.shards[router.shard_numbers[0]]
+        # Created on first use in each process, so preloading before fork is safe
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    def _shard_for_issue(self, issue_id):
+        """Get the storage owning an issue id, or None for foreign ids"""
+        shard = self.router.shard_for_id(issue_id)
+        return self.shards[shard] if shard is not None else None
+
+    def _get_executor(self):
+        """Get this process's fan-out thread pool"""
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=len(self.shards),
+                    thread_name_prefix='sqlite-shard'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _fan_out(self, fn):
+        """Run fn(storage) against every shard in parallel"""
+        return list(self._get_executor().map(fn, self.shards.values()))
+
+    def _query_all(self, sql, params=()):
+        """Run a read-only query on every shard and return all rows"""
+        def query(storage):
+            conn = storage._connect()
+            rows = conn.execute(sql, params).fetchall()
+            conn.close()
+            return rows
+
+        return [row for rows in self._fan_out(query) for row in rows]
+
+    def _list_all(self, list_shard, fields=None):
+        """
+        Fan a listing out to every shard and merge the per-shard lists, each
+        sorted newest first. created_at is fetched for merging if not requested.
+        """
+        shard_fields = fields
+        if fields is not None and 'created_at' not in fields:
+            shard_fields = list(fields) + ['created_at']
+
+        results = self._fan_out(lambda storage: list_shard(storage, shard_fields))
+        issues = list(heapq.merge(*results, key=lambda issue: issue['created_at'], reverse=True))
+
+        if shard_fields is not fields:
+            for issue in issues:
+                del issue['created_at']
+        return issues
+
+    # Background job operations
+    def supports_jobs(self):
+        """Jobs live in each shard's jobs table"""
+        return True
+
+    def subscribe_job(self, event, kind, priority=0, **options):
+        """Enqueue a job on every storage event, in the shard where the write happens"""
+        for storage in self.shards.values():
+            storage.subscribe_job(event, kind, priority, **options)
+
+    def enqueue_job(self, kind, payload=None, priority=0, **options):
+        """Enqueue a job that is not tied to one issue in the home shard"""
+        return self.home.enqueue_job(kind, payload, priority, **options)
+
+    # User operations
+    def get_user(self, id):
+        """Get user by ID"""
+        return self.home.get_user(id)
+
+    def get_user_by_username(self, username):
+        """Get user by username"""
+        return self.home.get_user_by_username(username)
+
+    def create_user(self, user):
+        """Create a new user"""
+        return self.home.create_user(user)
+
+    # Issue operations
+    def get_issues(self, fields=None):
+        """Get all issues from every shard"""
+        return self._list_all(lambda storage, shard_fields: storage.get_issues(shard_fields), fields)
+
+    def get_issue(self, id, include_archived=True):
+        """Get issue by ID"""
+        storage = self._shard_for_issue(id)
+        return storage.get_issue(id, include_archived) if storage else None
+
+    def get_user_issues(self, user_id, role='reporter', statuses=None, limit=50, cursor=None, fields=None):
+        """
+        Get a page of the issues a user reported or fixed across all shards:
+        each shard returns its next page after the cursor and the pages are
+        merged, with the counts summed
+        """
+        if role not in USER_FEED_ROLES:
+            raise ValueError(f"Unknown role: {role}")
+        time_column = USER_FEED_ROLES[role][1]
+        shard_fields = fields
+        if fields is not None:
+            shard_fields = list(fields) + [column for column in (time_column, 'id') if column not in fields]
+
+        results = self._fan_out(
+            lambda storage: storage.get_user_issues(user_id, role, statuses, limit, cursor, shard_fields)
+        )
+
+        def position(issue):
+            return (issue[time_column] or 0, issue['id'])
+
+        merged = list(heapq.merge(*(result['items'] for result in results), key=position, reverse=True))
+        items = merged[:limit]
+        has_more = len(merged) > limit or any(result['nextCursor'] for result in results)
+        next_cursor = encode_feed_cursor(*position(items[-1])) if has_more and items else None
+
+        if shard_fields is not fields:
+            for issue in items:
+                for column in set(shard_fields) - set(fields):
+                    del issue[column]
+
+        counts = {}
+        for result in results:
+            for status, count in result['counts'].items():
+                counts[status] = counts.get(status, 0) + count
+        return {"items": items, "nextCursor": next_cursor, "counts": counts}
+
+    def get_issues_by_ids(self, ids, fields=None):
+        """Get many issues, batching the lookups per owning shard"""
+        ids = list(dict.fromkeys(int(id) for id in ids))
+        shard_fields = fields if fields is None or 'id' in fields else list(fields) + ['id']
+
+        by_shard = {}
+        for id in ids:
+            storage = self._shard_for_issue(id)
+            if storage:
+                by_shard.setdefault(storage, []).append(id)
+
+        found = {}
+        results = self._get_executor().map(
+            lambda item: item[0].get_issues_by_ids(item[1], shard_fields), by_shard.items()
+        )
+        for result in results:
+            for issue in result['items']:
+                found[issue['id']] = issue
+
+        issues = [found[id] for id in ids if id in found]
+        if shard_fields is not fields:
+            for issue in issues:
+                del issue['id']
+        return {"items": issues, "missing": [id for id in ids if id not in found]}
+
+    def create_issue(self, issue):
+        """Create a new issue in the shard for its location"""
+        shard = self.router.shard_for_location(issue['location'])
+        return self.shards[shard].create_issue(issue)
+
+    def update_issue(self, id, update_data, expected_version=None):
+        """Update an existing issue"""
+        storage = self._shard_for_issue(id)
+        if not storage:
+            return None
+
+        # Moving an issue between location groups would change its id
+        if 'location' in update_data:
+            target = self.router.shard_for_location(update_data['location'])
+            if self.shards[target] is not storage:
+                raise ValueError("Cannot move an issue to a location stored in another shard")
+
+        return storage.update_issue(id, update_data, expected_version)
+
+    def delete_issue(self, id):
+        """Delete an issue"""
+        storage = self._shard_for_issue(id)
+        return storage.delete_issue(id) if storage else False
+
+    def query_issues(self, filters=None, sort='-created_at', page=1, page_size=50, fields=None):
+        """
+        Get one page of matching issues across all shards: each shard returns
+        its first page * page_size matches and the merged list is sliced
+        """
+        key, descending = parse_issue_sort(sort)
+        shard_fields = fields
+        if fields is not None:
+            shard_fields = list(fields) + [column for column in (key, 'id') if column not in fields]
+
+        results = self._fan_out(
+            lambda storage: storage.query_issues(filters, sort, 1, page * page_size, shard_fields)
+        )
+
+        def sort_value(issue):
+            value = PRIORITY_RANKS.get(issue[key], 0) if key == 'priority' else issue[key]
+            # SQLite orders NULLs first ascending, last descending
+            return (value is not None, value if value is not None else 0, issue['id'])
+
+        merged = heapq.merge(*(result['items'] for result in results), key=sort_value, reverse=descending)
+        items = list(merged)[(page - 1) * page_size:page * page_size]
+
+        if shard_fields is not fields:
+            for issue in items:
+                for column in set(shard_fields) - set(fields):
+                    del issue[column]
+
+        return {
+            "items": items,
+            "total": sum(result['total'] for result in results),
+            "page": page,
+            "pageSize": page_size,
+        }
+
+    def find_similar_issues(self, issue, **options):
+        """Find likely duplicates in the shard for the issue's location, which holds all its candidates"""
+        shard = self.router.shard_for_location(issue['location'])
+        return self.shards[shard].find_similar_issues(issue, **options)
+
+    def get_nearby_issues(self, lat, lng, radius):
+        """Get issues near a geographical point from every shard"""
+        results = self._fan_out(lambda storage: storage.get_nearby_issues(lat, lng, radius))
+        return [issue for issues in results for issue in issues]
+
+    def get_heatmap_points(self):
+        """Get heatmap points from every shard"""
+        results = self._fan_out(lambda storage: storage.get_heatmap_points())
+        return [point for points in results for point in points]
+
+    # Comment operations
+    def get_comments(self, issue_id):
+        """Get comments for an issue"""
+        storage = self._shard_for_issue(issue_id)
+        return storage.get_comments(issue_id) if storage else []
+
+    def create_comment(self, comment):
+        """Create a new comment"""
+        storage = self._shard_for_issue(comment['issueId'])
+        return storage.create_comment(comment) if storage else None
+
+    # Image operations
+    def get_image(self, id):
+        """Get image by ID"""
+        storage = self._shard_for_issue(id)
+        return storage.get_image(id) if storage else None
+
+    def get_images_by_issue_id(self, issue_id):
+        """Get all images for an issue"""
+        storage = self._shard_for_issue(issue_id)
+        return storage.get_images_by_issue_id(issue_id) if storage else []
+
+    def create_image(self, image):
+        """Add an image to an issue"""
+        storage = self._shard_for_issue(image['issueId'])
+        return storage.create_image(image) if storage else None
+
+    # Status history operations
+    def get_status_history(self, issue_id):
+        """Get status change history for an issue"""
+        storage = self._shard_for_issue(issue_id)
+        return storage.get_status_history(issue_id) if storage else []
+
+    def create_status_history(self, history):
+        """Record a status change in history"""
+        storage = self._shard_for_issue(history['issueId'])
+        return storage.create_status_history(history) if storage else None
+
+    # Status filtering operations
+    def get_issues_by_status(self, status, fields=None):
+        """Get issues filtered by status from every shard"""
+        return self._list_all(lambda storage, shard_fields: storage.get_issues_by_status(status, shard_fields), fields)
+
+    def get_issues_by_type(self, issue_type, fields=None):
+        """Get issues filtered by type from every shard"""
+        return self._list_all(lambda storage, shard_fields: storage.get_issues_by_type(issue_type, shard_fields), fields)
+
+    def update_issue_status(self, id, new_status, changed_by_id=None, changed_by_name=None, notes=None,
+                            expected_version=None):
+        """Update an issue's status and record the change in history"""
+        storage = self._shard_for_issue(id)
+        if not storage:
+            return None
+        return storage.update_issue_status(id, new_status, changed_by_id, changed_by_name, notes, expected_version)
+
+    def mark_issue_as_fixed(self, id, fixed_by_id, fixed_by_name, notes=None, expected_version=None):
+        """Mark an issue as fixed"""
+        return self.update_issue_status(id, 'fixed', fixed_by_id, fixed_by_name, notes, expected_version)
+
+    # Work queue operations
+    def claim_next_issue(self, claimed_by_id, claimed_by_name, issue_types=None, location=None,
+                         lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claim from the location's shard, or else from the shard whose queue
+        head is most urgent. Each claim is atomic within its shard; if the
+        head was taken meanwhile, that shard's next issue is claimed, and
+        shards with an empty queue are tried last.
+        """
+        if location:
+            storage = self.shards[self.router.shard_for_location(location)]
+            return storage.claim_next_issue(claimed_by_id, claimed_by_name, issue_types, location, lease_seconds)
+
+        heads = self._fan_out(lambda storage: storage.peek_next_issue(issue_types))
+        order = sorted(
+            zip(self.shards.values(), heads),
+            key=lambda item: (
+                item[1] is None,
+                -PRIORITY_RANKS.get(item[1]['priority'], 0) if item[1] else 0,
+                item[1]['created_at'] if item[1] else 0,
+            )
+        )
+        for storage, _ in order:
+            issue = storage.claim_next_issue(claimed_by_id, claimed_by_name, issue_types, None, lease_seconds)
+            if issue:
+                return issue
+        return None
+
+    def renew_issue_lease(self, id, claimed_by_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a claimed issue's lease in its shard"""
+        storage = self._shard_for_issue(id)
+        return storage.renew_issue_lease(id, claimed_by_id, lease_seconds) if storage else None
+
+    def release_issue_lease(self, id, claimed_by_id, notes=None):
+        """Hand a claimed issue back to its shard's queue"""
+        storage = self._shard_for_issue(id)
+        return storage.release_issue_lease(id, claimed_by_id, notes) if storage else None
+
+    def get_issue_statistics(self, issue_type=None):
+        """Get statistics about issues across all shards"""
+        where = "WHERE issue_type = ?" if issue_type else ""
+        params = (issue_type,) if issue_type else ()
+
+        # Counts and fix-time sums merge exactly, unlike per-shard averages
+        rows = self._query_all(f'''
+        SELECT COUNT(*),
+               SUM(status != 'fixed'),
+               SUM(status = 'fixed'),
+               SUM(CASE WHEN status = 'fixed' THEN time_to_fix END),
+               COUNT(CASE WHEN status = 'fixed' THEN time_to_fix END),
+               MAX(CASE WHEN status = 'fixed' THEN fixed_at END)
+        FROM issues {where}
+        ''', params)
+
+        total_fix_time = sum(row[3] or 0 for row in rows)
+        fix_time_count = sum(row[4] for row in rows)
+        fix_dates = [row[5] for row in rows if row[5]]
+
+        location_counts = {}
+        for location, count in self._query_all(f"SELECT location, COUNT(*) FROM issues {where} GROUP BY location", params):
+            location_counts[location] = location_counts.get(location, 0) + count
+
+        return {
+            "totalIssues": sum(row[0] for row in rows),
+            "openIssues": sum(row[1] or 0 for row in rows),
+            "fixedIssues": sum(row[2] or 0 for row in rows),
+            "averageFixTime": total_fix_time / fix_time_count if fix_time_count else None,
+            "mostReportedLocation": max(location_counts, key=location_counts.get) if location_counts else None,
+            "lastFixDate": max(fix_dates) if fix_dates else None
+        }
+
+    # Analytics operations
+    def get_issue_timeseries(self, bucket='day', start=None, end=None):
+        """Get per-bucket opened/fixed/backlog summed over all shards"""
+        results = self._fan_out(lambda storage: storage.get_issue_timeseries(bucket, start, end))
+
+        merged = [dict(point) for point in results[0]]
+        for series in results[1:]:
+            for total, point in zip(merged, series):
+                for key in ('opened', 'fixed', 'backlog'):
+                    total[key] += point[key]
+        return merged
+
+    def get_fix_time_percentiles(self, group_by='issue_type'):
+        """Get mean, median and p90 time to fix per group across all shards"""
+        if group_by not in PERCENTILE_GROUP_COLUMNS:
+            raise ValueError(f"Unsupported group: {group_by}")
+
+        # A location always routes to a single shard, so its rows are exact
+        if group_by == 'location':
+            results = self._fan_out(lambda storage: storage.get_fix_time_percentiles(group_by))
+            return sorted((row for rows in results for row in rows), key=lambda row: row['group'])
+
+        # Issue types span shards, so percentiles need the merged samples
+        samples = {}
+        for group, time_to_fix in self._query_all('''
+        SELECT issue_type, time_to_fix FROM issues
+        WHERE status = 'fixed' AND time_to_fix IS NOT NULL
+        '''):
+            samples.setdefault(group, []).append(time_to_fix)
+
+        percentiles = []
+        for group in sorted(samples):
+            values = sorted(samples[group])
+            count = len(values)
+            percentiles.append({
+                "group": group,
+                "count": count,
+                "averageFixTime": sum(values) / count,
+                "medianFixTime": values[-(-count // 2) - 1],
+                "p90FixTime": values[-(-count * 9 // 10) - 1],
+            })
+        return percentiles
+
+    def get_data_version(self):
+        """Get a change counter covering all shards (the sum of shard counters)"""
+        versions = self._fan_out(lambda storage: storage.get_data_version())
+        return {
+            "version": sum(version["version"] for version in versions),
+            "changedAt": max(version["changedAt"] for version in versions),
+        }
+
+    def get_write_metrics(self):
+        """Get write transaction, retry and give-up counts summed over shards"""
+        totals = {}
+        for storage in self.shards.values():
+            for metric, count in storage.get_write_metrics().items():
+                totals[metric] = totals.get(metric, 0) + count
+        return totals
+
+    # Archive operations
+    def archive_fixed_issues(self, older_than_days=90, batch_size=500):
+        """Archive old fixed issues in every shard"""
+        results = self._fan_out(lambda storage: storage.archive_fixed_issues(older_than_days, batch_size))
+        return {
+            "archivedIssues": sum(result["archivedIssues"] for result in results),
+            "batches": sum(result["batches"] for result in results),
+            "cutoff": results[0]["cutoff"],
+        }
+
+    def close(self):
+        """Stop the fan-out worker threads"""
+        with self._executor_lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def seed_shard_sequences(db_path, shard):
+    """Start each sharded table's AUTOINCREMENT sequence inside the shard's id range"""
+    floor = shard * SHARD_ID_SPAN
+    conn = sqlite3.connect(db_path)
+    for table in SHARDED_TABLES:
+        conn.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?', (floor, table, floor))
+        conn.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        ''', (table, floor, table))
+    conn.commit()
+    conn.close()
+
+
+def split_database(source_path, router, batch_size=1000):
+    """
+    Split an unsharded database, and its archive, into the router's shards.
+    Issue and child ids are rewritten to shard * SHARD_ID_SPAN + old id;
+    users and background jobs are copied to the home shard, with the issue
+    ids in job payloads rewritten too. Returns the number of live issues
+    written to each shard.
+    """
+    # Bring the source up to the current schema (e.g. epoch timestamps) first
+    source_storage = SQLiteStorage(source_path)
+    source_storage.initialize_db()
+    has_archive = os.path.exists(source_storage.archive_path)
+    storage = ShardedSQLiteStorage(router)
+    for shard_storage in storage.shards.values():
+        shard_storage.initialize_db()
+        if has_archive:
+            shard_storage.prepare_archive()
+    if has_archive:
+        source_storage.prepare_archive()
+
+    def connect(path, archive_path):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        if has_archive:
+            conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        return conn
+
+    source = connect(source_path, source_storage.archive_path)
+    targets = {
+        shard: connect(shard_storage.db_path, shard_storage.archive_path)
+        for shard, shard_storage in storage.shards.items()
+    }
+    home = targets[router.shard_numbers[0]]
+
+    def copy_rows(conn, table, rows):
+        if not rows:
+            return
+        columns = list(rows[0].keys())
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(row[column] for column in columns) for row in rows]
+        )
+
+    copy_rows(home, 'users', [dict(row) for row in source.execute('SELECT * FROM users')])
+    home.commit()
+
+    shard_of_issue = {}
+
+    def copy_issues(schema):
+        """Copy the issues of one database (main or archive) with their child rows; get the count per shard"""
+        counts = {shard: 0 for shard in targets}
+        last_id = 0
+        while True:
+            issues = source.execute(
+                f'SELECT * FROM {schema}.issues WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+            ).fetchall()
+            if not issues:
+                break
+            last_id = issues[-1]['id']
+
+            batches = {shard: {table: [] for table in SHARDED_TABLES} for shard in targets}
+            for row in issues:
+                shard = router.shard_for_location(row['location'])
+                shard_of_issue[row['id']] = shard
+                issue = {**dict(row), 'id': shard * SHARD_ID_SPAN + row['id']}
+                if schema == 'main':
+                    # Counters start at zero; the shard's triggers count the copied child rows
+                    issue.update({column: 0 for column in ACTIVITY_COUNTERS.values()})
+                batches[shard]['issues'].append(issue)
+
+            ids = [row['id'] for row in issues]
+            placeholders = ', '.join('?' for _ in ids)
+            for table in SHARDED_TABLES[1:]:
+                for row in source.execute(f'SELECT * FROM {schema}.{table} WHERE issue_id IN ({placeholders})', ids):
+                    shard = shard_of_issue[row['issue_id']]
+                    batches[shard][table].append({
+                        **dict(row),
+                        'id': shard * SHARD_ID_SPAN + row['id'],
+                        'issue_id': shard * SHARD_ID_SPAN + row['issue_id'],
+                    })
+
+            # One transaction per shard per batch keeps each shard consistent
+            for shard, tables in batches.items():
+                conn = targets[shard]
+                for table in SHARDED_TABLES:
+                    copy_rows(conn, f'{schema}.{table}', tables[table])
+                conn.commit()
+                counts[shard] += len(tables['issues'])
+        return counts
+
+    counts = copy_issues('main')
+    if has_archive:
+        copy_issues('archive')
+
+    # Archived ids are not in the live tables, so carry the source's
+    # sequences over for new rows never to reuse them
+    for table, seq in source.execute('SELECT name, seq FROM sqlite_sequence').fetchall():
+        if table in SHARDED_TABLES:
+            for shard, conn in targets.items():
+                conn.execute(
+                    'UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (shard * SHARD_ID_SPAN + seq, table)
+                )
+                conn.commit()
+
+    # Jobs are claimed from the home shard
+    jobs = []
+    for row in source.execute('SELECT * FROM jobs ORDER BY id'):
+        job = dict(row)
+        payload = json.loads(job['payload'])
+        if payload.get('issueId') in shard_of_issue:
+            # Child rows live in their issue's shard
+            shard = shard_of_issue[payload['issueId']]
+            for key in JOB_PAYLOAD_IDS:
+                if isinstance(payload.get(key), int):
+                    payload[key] += shard * SHARD_ID_SPAN
+            job['payload'] = json.dumps(payload)
+        jobs.append(job)
+    copy_rows(home, 'jobs', jobs)
+    home.commit()
+
+    source.close()
+    for conn in targets.values():
+        conn.close()
+    # Near-duplicate keys are derived from the copied issues rather than copied
+    for shard_storage in storage.shards.values():
+        shard_storage.rebuild_similarity_index()
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split an issues database into per-location shards")
+    parser.add_argument('source', help="path of the existing unsharded database")
+    parser.add_argument('--shard', action='append', required=True, metavar='N=PATH',
+                        help="shard number and database path, e.g. 1=data/shards/site-1.db")
+    parser.add_argument('--group', action='append', default=[], metavar='LOCATION=N',
+                        help="pin a location to a shard; other locations are hashed")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    router = ShardRouter.from_spec(args.shard, args.group)
+    counts = split_database(args.source, router, args.batch_size)
+    for shard, count in sorted(counts.items()):
+        print(f"Shard {shard} ({router.shard_paths[shard]}): {count} issues")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+from abc import ABC, abstractmethod
+
+from issue_similarity import DEFAULT_MIN_SIMILARITY, DEFAULT_SIMILAR_LIMIT
+
+# Work queue claims hold an issue for this many seconds by default, and at most MAX
+DEFAULT_LEASE_SECONDS = 1800
+MAX_LEASE_SECONDS = 8 * 3600
+
+
+class DuplicateUsername(ValueError):
+    """create_user was given a username that another user already has"""
+    def __init__(self, username):
+        super().__init__(f"Username already exists: {username}")
+        self.username = username
+
+
+class LeaseNotHeld(Exception):
+    """A technician renewed or released a work queue lease they do not hold"""
+    def __init__(self, id, claimed_by_id):
+        super().__init__(f"Issue {id} is not claimed by technician {claimed_by_id}")
+        self.id = id
+        self.claimed_by_id = claimed_by_id
+
+
+class UnsupportedOperation(NotImplementedError):
+    """A storage backend was asked for an optional operation it does not have"""
+    def __init__(self, operation):
+        super().__init__(f"This storage backend does not support {operation}")
+        self.operation = operation
+
+
+def extended_lease(lease_expires_at, now):
+    """
+    Lease end after the claimant updates the issue's status: at least
+    DEFAULT_LEASE_SECONDS from now, and never earlier than it was
+    """
+    return max(lease_expires_at, now + DEFAULT_LEASE_SECONDS * 1000)
+
+
+class StorageBackend(ABC):
+    """
+    Interface every issue storage implements: SQLiteStorage, the sharded
+    SQLite storage and the in-memory storage. Routes only talk to this
+    interface, so backends can be swapped through the app config.
+
+    Timestamps are epoch milliseconds, issues are dicts keyed by
+    ISSUE_COLUMNS plus image_urls (or the requested sparse fields), and
+    writes to issues, images, comments or status history bump the data
+    version.
+
+    Background jobs and database upkeep are optional: their defaults raise
+    UnsupportedOperation, and supports_jobs() tells whether a backend has a
+    job queue.
+    """
+
+    def initialize_db(self):
+        """Create or migrate whatever the backend persists to"""
+
+    def close(self):
+        """Release background resources held by the backend"""
+
+    # Write transactions
+    @abstractmethod
+    def get_write_metrics(self):
+        """Get counts of write transactions, lock retries and give-ups"""
+
+    @abstractmethod
+    def get_data_version(self):
+        """Get {"version", "changedAt"} for the latest change to issue data"""
+
+    # Archive operations
+    @abstractmethod
+    def archive_fixed_issues(self, older_than_days=90, batch_size=500):
+        """Move issues fixed more than older_than_days ago out of the hot set"""
+
+    def prepare_archive(self):
+        """Create the archive, or bring it up to the live schema, before archiving into it"""
+        raise UnsupportedOperation('prepare_archive')
+
+    # User operations
+    @abstractmethod
+    def get_user(self, id):
+        """Get user by ID"""
+
+    @abstractmethod
+    def get_user_by_username(self, username):
+        """Get user by username"""
+
+    @abstractmethod
+    def create_user(self, user):
+        """Create a new user, raising DuplicateUsername if the username is taken"""
+
+    # Issue operations
+    @abstractmethod
+    def query_issues(self, filters=None, sort='-created_at', page=1, page_size=50, fields=None):
+        """Get {"items", "total", "page", "pageSize"} for issues matching QUERY_FILTERS"""
+
+    @abstractmethod
+    def get_issues(self, fields=None):
+        """Get all issues, newest first, optionally only the given fields"""
+
+    @abstractmethod
+    def get_user_issues(self, user_id, role='reporter', statuses=None, limit=50, cursor=None, fields=None):
+        """Get {"items", "nextCursor", "counts"} for a page of the issues a user reported or fixed"""
+
+    @abstractmethod
+    def get_issues_by_ids(self, ids, fields=None):
+        """Get {"items", "missing"} for many issues, archived ones included"""
+
+    @abstractmethod
+    def get_issue(self, id, include_archived=True):
+        """Get issue by ID, or None"""
+
+    @abstractmethod
+    def create_issue(self, issue):
+        """Create a new issue"""
+
+    @abstractmethod
+    def update_issue(self, id, update_data, expected_version=None):
+        """Update an issue, raising IssueVersionConflict on a stale expected_version"""
+
+    @abstractmethod
+    def delete_issue(self, id):
+        """Delete an issue"""
+
+    @abstractmethod
+    def find_similar_issues(self, issue, limit=DEFAULT_SIMILAR_LIMIT, min_score=DEFAULT_MIN_SIMILARITY):
+        """Get open issues at the same location likely duplicating an issue, best first, with scores"""
+
+    @abstractmethod
+    def get_nearby_issues(self, lat, lng, radius):
+        """Get issues within radius kilometres of a point"""
+
+    @abstractmethod
+    def get_heatmap_points(self):
+        """Get (latitude, longitude, priority rank) for open issues with coordinates"""
+
+    # Comment operations
+    @abstractmethod
+    def get_comments(self, issue_id):
+        """Get comments for an issue, oldest first"""
+
+    @abstractmethod
+    def create_comment(self, comment):
+        """Create a new comment"""
+
+    # Image operations
+    @abstractmethod
+    def get_image(self, id):
+        """Get image by ID"""
+
+    @abstractmethod
+    def get_images_by_issue_id(self, issue_id):
+        """Get all images for an issue"""
+
+    @abstractmethod
+    def create_image(self, image):
+        """Add an image to an issue"""
+
+    # Status history operations
+    @abstractmethod
+    def get_status_history(self, issue_id):
+        """Get status change history for an issue, newest first"""
+
+    @abstractmethod
+    def create_status_history(self, history):
+        """Record a status change in history"""
+
+    # Status operations
+    @abstractmethod
+    def get_issues_by_status(self, status, fields=None):
+        """Get issues filtered by status"""
+
+    @abstractmethod
+    def get_issues_by_type(self, issue_type, fields=None):
+        """Get issues filtered by type"""
+
+    @abstractmethod
+    def update_issue_status(self, id, new_status, changed_by_id=None, changed_by_name=None, notes=None,
+                            expected_version=None):
+        """
+        Update an issue's status, record the change in history and return the
+        issue. Updates by the technician holding a work queue lease extend it
+        (see extended_lease) unless the issue is fixed or back to pending;
+        anyone else's change ends the lease.
+        """
+
+    @abstractmethod
+    def mark_issue_as_fixed(self, id, fixed_by_id, fixed_by_name, notes=None, expected_version=None):
+        """Mark an issue as fixed"""
+
+    # Work queue operations
+    @abstractmethod
+    def claim_next_issue(self, claimed_by_id, claimed_by_name, issue_types=None, location=None,
+                         lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Atomically claim the most urgent, oldest pending issue matching the filters, or get None"""
+
+    @abstractmethod
+    def renew_issue_lease(self, id, claimed_by_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extend a claimed issue's lease to lease_seconds from now and return the
+        issue, None if it does not exist, or raise LeaseNotHeld
+        """
+
+    @abstractmethod
+    def release_issue_lease(self, id, claimed_by_id, notes=None):
+        """
+        Hand a claimed issue back to the queue as pending and return it, None
+        if it does not exist, or raise LeaseNotHeld
+        """
+
+    def peek_next_issue(self, issue_types=None, location=None):
+        """Get the id, priority and created_at of the issue claim_next_issue would pick, or None"""
+        raise UnsupportedOperation('peek_next_issue')
+
+    # Background job operations
+    def supports_jobs(self):
+        """Whether enqueue_job and subscribe_job are available"""
+        return False
+
+    def subscribe_job(self, event, kind, priority=0, **options):
+        """Enqueue a job of the given kind with the write causing each storage event"""
+        raise UnsupportedOperation('background jobs')
+
+    def enqueue_job(self, kind, payload=None, priority=0, **options):
+        """Enqueue a background job and return its id"""
+        raise UnsupportedOperation('background jobs')
+
+    # Maintenance operations
+    def verify_activity_counters(self, repair=False, limit=100):
+        """Compare, and with repair=True fix, every issue's activity counters with its child rows"""
+        raise UnsupportedOperation('verify_activity_counters')
+
+    def rebuild_similarity_index(self):
+        """Index issues for similarity lookups that were written without it"""
+        raise UnsupportedOperation('rebuild_similarity_index')
+
+    # Analytics operations
+    @abstractmethod
+    def get_issue_statistics(self, issue_type=None):
+        """Get statistics about issues"""
+
+    @abstractmethod
+    def get_issue_timeseries(self, bucket='day', start=None, end=None):
+        """Get issues opened and fixed per day or week, with the backlog after each"""
+
+    @abstractmethod
+    def get_fix_time_percentiles(self, group_by='issue_type'):
+        """Get mean, median and p90 time to fix (in minutes) per group"""
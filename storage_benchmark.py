@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from memory_storage import InMemoryStorage
+from sqlite_db import SharedMemorySQLiteStorage, SQLiteStorage
+
+STATUSES = ('pending', 'in_progress', 'fixed')
+LOCATIONS = ('Airport', 'Mall', 'Jana Bazynskiego 2')
+
+
+def _timed(operation, repeat):
+    """Run an operation repeat times and return the mean milliseconds per call"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    return round((time.perf_counter() - started) * 1000 / repeat, 3)
+
+
+def benchmark(storage, issues=500, repeat=20):
+    """Time a fixed read/write workload against one storage"""
+    storage.initialize_db()
+    results = {}
+
+    started = time.perf_counter()
+    ids = []
+    for n in range(issues):
+        issue = storage.create_issue({
+            "title": f"Issue {n}",
+            "description": "Benchmark issue",
+            "location": LOCATIONS[n % len(LOCATIONS)],
+            "latitude": str(54.35 + n % 100 / 1000),
+            "longitude": str(18.60 + n % 70 / 1000),
+            "reportedById": 1,
+            "reportedByName": "benchmark",
+            "imageUrls": [f"{n}.jpg"],
+        })
+        ids.append(issue['id'])
+    results["createIssue"] = round((time.perf_counter() - started) * 1000 / issues, 3)
+
+    started = time.perf_counter()
+    for n, id in enumerate(ids):
+        storage.update_issue_status(id, STATUSES[n % len(STATUSES)], 2, "fixer")
+    results["updateStatus"] = round((time.perf_counter() - started) * 1000 / issues, 3)
+
+    results["getIssue"] = _timed(lambda: storage.get_issue(ids[len(ids) // 2]), repeat)
+    results["getIssuesSummary"] = _timed(
+        lambda: storage.get_issues(fields=('id', 'title', 'status', 'thumbnail_url')), repeat
+    )
+    results["queryIssues"] = _timed(
+        lambda: storage.query_issues({"status": ['pending', 'in_progress']}, sort='-priority', page_size=50), repeat
+    )
+    results["getIssuesByIds"] = _timed(lambda: storage.get_issues_by_ids(ids[::5]), repeat)
+    results["nearbyIssues"] = _timed(lambda: storage.get_nearby_issues(54.40, 18.63, 5), repeat)
+    results["statistics"] = _timed(storage.get_issue_statistics, repeat)
+    storage.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare storage backends on the same workload")
+    parser.add_argument('--issues', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--backends', default='sqlite,sqlite-memory,memory')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        factories = {
+            'sqlite': lambda: SQLiteStorage(
+                os.path.join(directory, 'issues.db'), os.path.join(directory, 'archive.db')
+            ),
+            'sqlite-memory': SharedMemorySQLiteStorage,
+            'memory': InMemoryStorage,
+        }
+        report = {
+            backend: benchmark(factories[backend](), args.issues, args.repeat)
+            for backend in args.backends.split(',')
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
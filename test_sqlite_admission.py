@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from app_sqlite import create_app
+from sqlite_admission import AdmissionController, AdmissionQueue, AdmissionRejected
+
+
+def queue_up(queue, priority, order):
+    """Start a thread that waits for a slot, records its turn and releases at once"""
+    def run():
+        try:
+            queue.acquire(priority)
+        except AdmissionRejected as e:
+            order.append((priority, e.reason))
+            return
+        order.append(priority)
+        queue.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_depth(queue, depth):
+    deadline = time.monotonic() + 5
+    while queue.metrics()["depth"] != depth:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_waiters_are_admitted_by_priority_then_age():
+    queue = AdmissionQueue('write', limit=1, max_queue=10, max_wait=5)
+    queue.acquire()
+    order = []
+    threads = []
+    for priority in ('low', 'normal', 'high', 'normal'):
+        threads.append(queue_up(queue, priority, order))
+        wait_for_depth(queue, len(threads))
+
+    queue.release()
+    for thread in threads:
+        thread.join()
+    assert order == ['high', 'normal', 'normal', 'low']
+    metrics = queue.metrics()
+    assert metrics["active"] == 0 and metrics["depth"] == 0
+    assert metrics["admitted"] == {"high": 1, "normal": 3, "low": 1}
+
+
+def test_full_queue_sheds_less_urgent_waiters():
+    queue = AdmissionQueue('write', limit=1, max_queue=1, max_wait=5, retry_after=3)
+    queue.acquire()
+    order = []
+    low = queue_up(queue, 'low', order)
+    wait_for_depth(queue, 1)
+
+    # A normal request takes the low one's place; another normal one is turned away
+    normal = queue_up(queue, 'normal', order)
+    low.join()
+    wait_for_depth(queue, 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        queue.acquire('normal')
+    assert rejected.value.reason == 'queueFull' and rejected.value.retry_after == 3
+
+    queue.release()
+    normal.join()
+    assert order == [('low', 'shed'), 'normal']
+    assert queue.metrics()["rejected"] == {"queueFull": 1, "timedOut": 0, "shed": 1}
+
+
+def test_queued_requests_time_out():
+    queue = AdmissionQueue('read', limit=1, max_queue=5, max_wait=0.05)
+    queue.acquire()
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        queue.acquire()
+    assert rejected.value.reason == 'timedOut'
+    assert time.monotonic() - started < 1
+    assert queue.metrics()["depth"] == 0
+
+    queue.release()
+    assert queue.acquire() == 0.0
+
+
+def test_overloaded_writes_get_503_while_reads_go_through(tmp_path):
+    app = create_app({
+        "SQLITE_DB_PATH": str(tmp_path / 'issues.db'),
+        "ADMISSION_CONTROL": 'true',
+        "ADMISSION_WRITE_LIMIT": 1,
+        "ADMISSION_WRITE_QUEUE": 0,
+    })
+    client = app.test_client()
+    controller = app.extensions['sqlite_admission']
+    assert isinstance(controller, AdmissionController)
+
+    # Occupy the only write slot, as a long write transaction would
+    controller.acquire('write')
+    response = client.post('/api/issues', json={"title": "Leak"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert client.get('/api/issues').status_code == 200
+    controller.release('write')
+
+    response = client.post('/api/users', json={"username": "tech", "password": "x"})
+    assert response.status_code != 503
+    metrics = client.get('/api/metrics/admission').get_json()
+    assert metrics["write"]["rejected"]["queueFull"] == 1
+    assert metrics["write"]["active"] == 0 and metrics["read"]["active"] == 0
+    assert metrics["read"]["admitted"]["normal"] == 1
+
+
+@pytest.mark.parametrize('config', [{}, {"ADMISSION_CONTROL": 'false'}])
+def test_admission_control_is_off_unless_enabled(tmp_path, config):
+    app = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db'), **config})
+    assert 'sqlite_admission' not in app.extensions
+    assert app.test_client().get('/api/metrics/admission').get_json() == {"enabled": False}
@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from app_sqlite import create_app
+from sqlite_db import SQLiteStorage, to_epoch_ms
+
+
+def create_issue(storage, days_ago):
+    """Create an issue, backdated the way an import of older data would be"""
+    issue = storage.create_issue({
+        "title": "Broken lamp",
+        "description": "Lamp in the corridor is broken",
+        "location": "Airport",
+        "reportedById": 1,
+        "reportedByName": "reporter",
+    })
+    created_at = to_epoch_ms(datetime.utcnow() - timedelta(days=days_ago))
+    conn = sqlite3.connect(storage.db_path)
+    conn.execute('UPDATE issues SET created_at = ? WHERE id = ?', (created_at, issue['id']))
+    conn.commit()
+    conn.close()
+    return issue
+
+
+def opened(storage, days_ago):
+    """Issues opened on a past day, read from a range of closed (cacheable) buckets"""
+    today = datetime.utcnow().date()
+    points = storage.get_issue_timeseries(start=today - timedelta(days=5), end=today)
+    bucket = (today - timedelta(days=days_ago)).isoformat()
+    return next(point['opened'] for point in points if point['bucket'] == bucket)
+
+
+def test_cached_past_buckets_follow_later_writes(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    first = create_issue(storage, days_ago=3)
+    create_issue(storage, days_ago=3)
+    assert opened(storage, 3) == 2
+
+    # Past buckets change when their issues are deleted, and every
+    # process sees the same numbers
+    storage.delete_issue(first['id'])
+    assert opened(storage, 3) == 1
+    assert opened(SQLiteStorage(storage.db_path), 3) == 1
+
+    # Unchanged data is answered from the cache
+    storage._compute_timeseries = None
+    assert opened(storage, 3) == 1
+
+
+def test_writes_only_drop_the_buckets_they_reach(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    old = create_issue(storage, days_ago=4)
+    create_issue(storage, days_ago=2)
+    today = datetime.utcnow().date()
+
+    # Record where each recomputation starts
+    starts = []
+    compute = storage._compute_timeseries
+    def spy(bucket, start, end):
+        starts.append(start)
+        return compute(bucket, start, end)
+    storage._compute_timeseries = spy
+
+    def series():
+        return storage.get_issue_timeseries(start=today - timedelta(days=5))
+
+    first = series()
+    assert starts == [today - timedelta(days=5)]
+
+    # Today's writes only reach the open bucket
+    issue = storage.create_issue({
+        "title": "Leak", "description": "Water on the floor", "location": "Mall",
+        "reportedById": 1, "reportedByName": "reporter",
+    })
+    storage.create_comment({"content": "On it", "userId": 1, "userName": "tech", "issueId": issue['id']})
+    storage.mark_issue_as_fixed(issue['id'], 1, 'tech')
+    assert series()[:-1] == first[:-1]
+    assert starts[1:] == [today]
+
+    # A fix back-dated to three days ago is recomputed from that day on
+    storage.mark_issue_as_fixed(old['id'], 1, 'tech')
+    conn = sqlite3.connect(storage.db_path)
+    fixed_at = to_epoch_ms(datetime.utcnow() - timedelta(days=3))
+    conn.execute('UPDATE issues SET fixed_at = ? WHERE id = ?', (fixed_at, old['id']))
+    conn.commit()
+    conn.close()
+    points = series()
+    assert starts[2:] == [today - timedelta(days=3)]
+    assert points[:2] == first[:2]
+    assert [point['fixed'] for point in points[2:4]] == [1, 0]
+    assert [point['backlog'] for point in points[1:5]] == [1, 0, 1, 1]
+
+
+def test_timeseries_routes(tmp_path):
+    app = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')})
+    client = app.test_client()
+    create_issue(app.extensions['sqlite_storage'], days_ago=1)
+    today = datetime.utcnow().date()
+
+    response = client.get(f'/api/analytics/timeseries?start={today - timedelta(days=1)}&end={today}')
+    assert response.status_code == 200
+    assert response.get_json() == [{"bucket": (today - timedelta(days=1)).isoformat(), "opened": 1, "fixed": 0, "backlog": 1}]
+
+    backlog = client.get(f'/api/analytics/backlog?bucket=day&start={today - timedelta(days=1)}').get_json()
+    assert [point['backlog'] for point in backlog] == [1, 1]
+
+    assert client.get('/api/analytics/timeseries?bucket=year').status_code == 400
+    assert client.get('/api/analytics/timeseries?start=yesterday').status_code == 400
@@ -0,0 +1,71 @@
+import os
+
+from app_sqlite import create_app
+
+ISSUE = {
+    "title": "Broken lamp",
+    "description": "Lamp in the corridor is broken",
+    "location": "Airport",
+    "reportedById": 1,
+    "reportedByName": "reporter",
+}
+
+
+def test_apps_built_from_config_do_not_share_storage(tmp_path):
+    first = create_app({"SQLITE_DB_PATH": str(tmp_path / 'first.db')})
+    second = create_app({"SQLITE_DB_PATH": str(tmp_path / 'second.db')})
+    assert first.extensions['sqlite_storage'] is not second.extensions['sqlite_storage']
+    # Nothing is opened until the first request
+    assert not os.listdir(tmp_path)
+
+    issue = first.test_client().post('/api/issues', json=ISSUE).get_json()
+    assert os.path.exists(tmp_path / 'first.db') and not os.path.exists(tmp_path / 'second.db')
+    assert second.test_client().get('/api/issues').get_json() == []
+    assert second.test_client().get(f"/api/issues/{issue['id']}").status_code == 404
+    assert [item['id'] for item in first.test_client().get('/api/issues').get_json()] == [issue['id']]
+
+    # A second app on the same file sees the same data
+    again = create_app({"SQLITE_DB_PATH": str(tmp_path / 'first.db')})
+    assert again.test_client().get(f"/api/issues/{issue['id']}").get_json()['title'] == 'Broken lamp'
+
+
+def test_memory_apps_are_independent():
+    first = create_app({"STORAGE_BACKEND": 'memory'})
+    second = create_app({"STORAGE_BACKEND": 'memory'})
+
+    assert first.test_client().post('/api/issues', json=ISSUE).status_code == 201
+    assert len(first.test_client().get('/api/issues').get_json()) == 1
+    assert second.test_client().get('/api/issues').get_json() == []
+
+
+def test_duplicate_usernames_are_conflicts(tmp_path):
+    client = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')}).test_client()
+    user = {"username": "tech", "password": "x", "role": "technician"}
+
+    assert client.post('/api/users', json=user).status_code == 201
+    response = client.post('/api/users', json=user)
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "Username already exists"}
+
+
+def test_queue_lease_routes(tmp_path):
+    client = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')}).test_client()
+    issue = client.post('/api/issues', json=ISSUE).get_json()
+    claimed = client.post('/api/queue/claim', json={"technicianId": 7, "technicianName": "tech"}).get_json()
+    assert claimed['id'] == issue['id']
+
+    renewed = client.post(f"/api/queue/{issue['id']}/renew", json={"technicianId": 7, "leaseSeconds": 3600})
+    assert renewed.status_code == 200
+    assert renewed.get_json()['version'] == claimed['version'] + 1
+
+    assert client.post(f"/api/queue/{issue['id']}/renew", json={"technicianId": 7, "leaseSeconds": 0}).status_code == 400
+    assert client.post(f"/api/queue/{issue['id']}/renew", json={"leaseSeconds": 60}).status_code == 400
+    assert client.post(f"/api/queue/{issue['id'] + 1}/renew", json={"technicianId": 7}).status_code == 404
+    taken = client.post(f"/api/queue/{issue['id']}/release", json={"technicianId": 8})
+    assert taken.status_code == 409
+    assert taken.get_json() == {"error": f"Issue {issue['id']} is not claimed by technician 8"}
+
+    released = client.post(f"/api/queue/{issue['id']}/release", json={"technicianId": 7, "notes": "Needs a ladder"})
+    assert released.status_code == 200
+    assert released.get_json()['status'] == 'pending' and released.get_json()['claimed_by_id'] is None
+    assert client.post(f"/api/queue/{issue['id']}/renew", json={"technicianId": 7}).status_code == 409
@@ -0,0 +1,122 @@
+import multiprocessing
+import sqlite3
+
+from sqlite_db import SQLiteStorage
+
+WORKERS = 8
+ISSUES_PER_WORKER = 25
+
+
+def hammer_writes(db_path, worker, busy_timeout, results):
+    """Create issues and move each through two status changes"""
+    storage = SQLiteStorage(db_path, busy_timeout=busy_timeout, write_retries=50)
+    for n in range(ISSUES_PER_WORKER):
+        issue = storage.create_issue({
+            "title": f"Worker {worker} issue {n}",
+            "description": "Concurrent write stress test",
+            "location": f"Site {worker % 3}",
+            "reportedById": worker,
+            "reportedByName": f"worker-{worker}",
+        })
+        storage.update_issue_status(issue['id'], 'in_progress', worker, f"worker-{worker}")
+        storage.update_issue_status(issue['id'], 'fixed', worker, f"worker-{worker}")
+    results.put(storage.get_write_metrics())
+
+
+def run_workers(db_path, busy_timeout):
+    """Run the writers in separate processes and return their write metrics"""
+    # Create the schema up front so workers only contend on data writes
+    SQLiteStorage(db_path).initialize_db()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(target=hammer_writes, args=(db_path, worker, busy_timeout, results))
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    metrics = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+    return metrics
+
+
+def assert_no_lost_writes(db_path):
+    conn = sqlite3.connect(db_path)
+    expected = WORKERS * ISSUES_PER_WORKER
+    assert conn.execute("SELECT COUNT(*) FROM issues").fetchone()[0] == expected
+    assert conn.execute("SELECT COUNT(*) FROM issues WHERE status = 'fixed'").fetchone()[0] == expected
+    assert conn.execute("SELECT COUNT(*) FROM status_history").fetchone()[0] == 2 * expected
+    # Every transition was recorded from the status it actually left
+    assert conn.execute('''
+    SELECT COUNT(*) FROM status_history
+    WHERE NOT (old_status = 'pending' AND new_status = 'in_progress')
+      AND NOT (old_status = 'in_progress' AND new_status = 'fixed')
+    ''').fetchone()[0] == 0
+    conn.close()
+
+
+def test_concurrent_writers_lose_no_writes(tmp_path):
+    db_path = str(tmp_path / 'stress.db')
+    metrics = run_workers(db_path, busy_timeout=5)
+
+    assert_no_lost_writes(db_path)
+    assert sum(m["giveUps"] for m in metrics) == 0
+
+
+def test_lock_contention_is_retried_with_backoff(tmp_path):
+    # A near-zero busy timeout turns contention into retries instead of waits
+    db_path = str(tmp_path / 'stress.db')
+    metrics = run_workers(db_path, busy_timeout=0.001)
+
+    assert_no_lost_writes(db_path)
+    assert sum(m["retries"] for m in metrics) > 0
+    assert sum(m["giveUps"] for m in metrics) == 0
+
+
+def claim_until_empty(db_path, worker, results):
+    """Claim issues from the work queue until it is empty"""
+    storage = SQLiteStorage(db_path, busy_timeout=5, write_retries=50)
+    claimed = []
+    while True:
+        issue = storage.claim_next_issue(worker, f"worker-{worker}")
+        if issue is None:
+            break
+        claimed.append(issue['id'])
+    results.put(claimed)
+
+
+def test_concurrent_claims_never_share_an_issue(tmp_path):
+    db_path = str(tmp_path / 'queue.db')
+    storage = SQLiteStorage(db_path)
+    expected = WORKERS * ISSUES_PER_WORKER
+    for n in range(expected):
+        storage.create_issue({
+            "title": f"Queued issue {n}",
+            "description": "Work queue stress test",
+            "location": f"Site {n % 3}",
+            "priority": ('low', 'medium', 'high', 'urgent')[n % 4],
+            "reportedById": 1,
+            "reportedByName": "reporter",
+        })
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(target=claim_until_empty, args=(db_path, worker, results))
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    claimed = [id for _ in processes for id in results.get(timeout=120)]
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    assert len(claimed) == expected
+    assert len(set(claimed)) == expected
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM status_history").fetchone()[0] == expected
+    conn.close()
@@ -0,0 +1,154 @@
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app_sqlite import create_app
+from sqlite_db import PRIORITY_RANKS, SQLiteStorage
+from sqlite_heatmap import (
+    DEFAULT_WEIGHT, MAX_ZOOM, TILE_SIZE, HeatmapLayer, HeatmapRenderer, box_blur, project, render_png,
+)
+
+# A point in the middle of tile 10/565/330
+LATITUDE, LONGITUDE = 54.35, 18.65
+
+
+def tile_of(z, latitude, longitude):
+    xs, ys = project(latitude, longitude)
+    return int(xs * (1 << z)), int(ys * (1 << z))
+
+
+def pixels(tile):
+    return np.asarray(Image.open(io.BytesIO(tile)))
+
+
+def create_issue(storage, priority='medium', latitude=LATITUDE, longitude=LONGITUDE):
+    return storage.create_issue({
+        "title": "Broken lamp",
+        "description": "Lamp in the corridor is broken",
+        "location": "Airport",
+        "reportedById": 1,
+        "reportedByName": "reporter",
+        "priority": priority,
+        "latitude": latitude,
+        "longitude": longitude,
+    })
+
+
+def test_projection_and_blur():
+    assert project(0.0, 0.0) == (0.5, 0.5)
+    # The poles are clamped to the edges of the world instead of going infinite
+    xs, ys = project(np.array([90.0, -90.0]), np.array([-180.0, 180.0]))
+    assert list(xs) == [0.0, 1.0]
+    assert ys[0] == pytest.approx(0.0, abs=1e-9) and ys[1] == pytest.approx(1.0, abs=1e-9)
+
+    grid = np.zeros((41, 41))
+    grid[20, 20] = 1.0
+    blurred = box_blur(grid, 3)
+    assert blurred.shape == grid.shape
+    assert blurred.sum() == pytest.approx(1.0)
+    assert blurred[20, 20] == pytest.approx(1 / 49)
+    assert blurred[20, 24] == 0.0
+
+
+def test_density_is_weighted_by_priority():
+    z = 10
+    x, y = tile_of(z, LATITUDE, LONGITUDE)
+    low = HeatmapLayer([(LATITUDE, LONGITUDE, PRIORITY_RANKS['low'])]).density(z, x, y)
+    urgent = HeatmapLayer([(LATITUDE, LONGITUDE, PRIORITY_RANKS['urgent'])]).density(z, x, y)
+    assert low.shape == (TILE_SIZE, TILE_SIZE)
+    np.testing.assert_allclose(urgent, low * 4)
+
+    # Unknown priorities count as medium, and points without coordinates are skipped
+    layer = HeatmapLayer([(LATITUDE, LONGITUDE, 0), (float('nan'), LONGITUDE, 4)])
+    assert len(layer) == 1
+    np.testing.assert_allclose(layer.density(z, x, y), low * DEFAULT_WEIGHT)
+
+
+def test_heat_crosses_tile_edges():
+    z = 10
+    x, y = tile_of(z, LATITUDE, LONGITUDE)
+    # Two pixels left of the tile's left edge
+    longitude = (x - 2 / TILE_SIZE) / (1 << z) * 360.0 - 180.0
+    layer = HeatmapLayer([(LATITUDE, longitude, 1)])
+
+    density = layer.density(z, x, y)
+    assert density is not None
+    assert density[:, 0].sum() > 0 and density[:, -1].sum() == 0
+    # Far away tiles have no points at all
+    assert layer.density(z, x + 2, y) is None
+
+
+def test_empty_tile_is_transparent():
+    image = pixels(render_png(None))
+    assert image.shape == (TILE_SIZE, TILE_SIZE, 4)
+    assert not image.any()
+
+    assert HeatmapLayer([]).density(0, 0, 0) is None
+
+
+def test_renderer_validates_and_follows_writes(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    renderer = HeatmapRenderer(storage, refresh_interval=0)
+    for z, x, y in ((-1, 0, 0), (MAX_ZOOM + 1, 0, 0), (1, 2, 0), (1, 0, -1)):
+        with pytest.raises(ValueError):
+            renderer.render_tile(z, x, y)
+
+    z = 12
+    x, y = tile_of(z, LATITUDE, LONGITUDE)
+    assert not pixels(renderer.render_tile(z, x, y)).any()
+
+    issue = create_issue(storage, priority='urgent')
+    tile = renderer.render_tile(z, x, y)
+    assert pixels(tile)[..., 3].max() > 0
+    assert renderer.render_tile(z, x, y) is tile
+
+    # Fixed issues drop out of the heatmap
+    storage.mark_issue_as_fixed(issue['id'], 1, 'tech')
+    assert not pixels(renderer.render_tile(z, x, y)).any()
+
+
+def test_renderer_reloads_in_the_background_at_most_once_per_interval(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    loads = []
+    get_heatmap_points = storage.get_heatmap_points
+
+    def counted():
+        loads.append(time.monotonic())
+        return get_heatmap_points()
+
+    monkeypatch.setattr(storage, 'get_heatmap_points', counted)
+    renderer = HeatmapRenderer(storage, refresh_interval=0.2)
+    z = 12
+    x, y = tile_of(z, LATITUDE, LONGITUDE)
+    empty = renderer.render_tile(z, x, y)
+
+    # A burst of writes keeps serving the previous layer and its tiles
+    for _ in range(5):
+        create_issue(storage, priority='urgent')
+        assert renderer.render_tile(z, x, y) is empty
+    assert len(loads) == 1
+
+    time.sleep(0.2)
+    assert renderer.render_tile(z, x, y) is empty
+    deadline = time.monotonic() + 10
+    while not pixels(renderer.render_tile(z, x, y)).any():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert len(loads) == 2
+
+
+def test_heatmap_route(tmp_path):
+    app = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')})
+    client = app.test_client()
+    create_issue(app.extensions['sqlite_storage'])
+    x, y = tile_of(10, LATITUDE, LONGITUDE)
+
+    response = client.get(f'/api/heatmap/10/{x}/{y}.png')
+    assert response.status_code == 200 and response.mimetype == 'image/png'
+    assert pixels(response.data)[..., 3].max() > 0
+
+    assert client.get('/api/heatmap/23/0/0.png').status_code == 400
+    assert client.get('/api/heatmap/2/4/0.png').status_code == 400
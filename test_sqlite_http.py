@@ -0,0 +1,339 @@
+import gzip
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+from flask import jsonify
+
+from app_sqlite import create_app
+from sqlite_db import ISSUE_VIEWS, MAX_BATCH_IDS
+from sqlite_routes import MAX_PAGE_SIZE
+
+
+@pytest.fixture
+def app(tmp_path):
+    return create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')})
+
+
+def create_issue(client, **fields):
+    response = client.post('/api/issues', json={
+        "title": "Broken lamp",
+        "description": "Lamp in the corridor is broken",
+        "location": "Airport",
+        "reportedById": 1,
+        "reportedByName": "reporter",
+        **fields,
+    })
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def set_changed_at(app, changed_at):
+    """Record a change at a chosen time, as a write at that moment would"""
+    conn = sqlite3.connect(app.extensions['sqlite_storage'].db_path)
+    conn.execute('UPDATE change_counter SET version = version + 1, changed_at = ? WHERE id = 1', (changed_at,))
+    conn.commit()
+    conn.close()
+
+
+def test_etag_revalidation(app):
+    client = app.test_client()
+    create_issue(client)
+
+    first = client.get('/api/issues')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+    unchanged = client.get('/api/issues', headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    assert unchanged.headers['ETag'] == etag
+    # Each query has its own ETag
+    assert client.get('/api/issues?view=summary', headers={"If-None-Match": etag}).status_code == 200
+
+    create_issue(client)
+    changed = client.get('/api/issues', headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert len(changed.get_json()) == 2
+
+    # A stale ETag wins over a matching If-Modified-Since
+    headers = {"If-None-Match": etag, "If-Modified-Since": changed.headers['Last-Modified']}
+    assert client.get('/api/issues', headers=headers).status_code == 200
+
+
+def test_if_modified_since_sees_writes_within_the_same_second(app):
+    client = app.test_client()
+    create_issue(client)
+
+    set_changed_at(app, '2020-01-01T00:00:00.300')
+    first = client.get('/api/issues')
+    assert first.headers['Last-Modified'] == 'Wed, 01 Jan 2020 00:00:01 GMT'
+    assert client.get('/api/issues', headers={"If-Modified-Since": first.headers['Last-Modified']}).status_code == 304
+
+    # A write in the current second is never announced, so a second write
+    # in that same second cannot be hidden behind a 304
+    now = datetime.utcnow()
+    set_changed_at(app, now.isoformat(timespec='milliseconds'))
+    polled = client.get('/api/issues')
+    assert polled.last_modified.replace(tzinfo=None) < now
+    set_changed_at(app, now.replace(microsecond=999000).isoformat(timespec='milliseconds'))
+    headers = {"If-Modified-Since": polled.headers['Last-Modified']}
+    assert client.get('/api/issues', headers=headers).status_code == 200
+
+
+def test_large_responses_are_compressed(app):
+    client = app.test_client()
+    for _ in range(10):
+        create_issue(client)
+
+    plain = client.get('/api/issues')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    compressed = client.get('/api/issues', headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+
+    small = client.get('/api/issues/1', headers={"Accept-Encoding": "gzip"})
+    assert 'Content-Encoding' not in small.headers
+
+    # Revalidations stay empty
+    not_modified = client.get('/api/issues', headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers['ETag']})
+    assert not_modified.status_code == 304 and 'Content-Encoding' not in not_modified.headers
+
+
+def test_brotli_is_preferred_when_available(app):
+    brotli = pytest.importorskip('brotli')
+    client = app.test_client()
+    for _ in range(10):
+        create_issue(client)
+
+    response = client.get('/api/issues', headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == client.get('/api/issues').get_json()
+
+
+def test_only_api_timestamp_fields_are_formatted(app):
+    @app.route('/other')
+    def other():
+        return jsonify({"created_at": 5, "run_at": True})
+
+    client = app.test_client()
+    issue = create_issue(client)
+    assert datetime.fromisoformat(issue['created_at'])
+    assert client.get(f"/api/issues/{issue['id']}").get_json()['created_at'] == issue['created_at']
+
+    # Job payloads are returned as they were enqueued
+    job_id = app.extensions['sqlite_storage'].enqueue_job('notify', {"issueId": 1, "created_at": 5})
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['payload'] == {"issueId": 1, "created_at": 5}
+    assert datetime.fromisoformat(job['created_at'])
+
+    # Routes outside the API keep their own JSON
+    assert client.get('/other').get_json() == {"created_at": 5, "run_at": True}
+
+
+def test_conditional_writes(app):
+    client = app.test_client()
+    issue = create_issue(client)
+    url = f"/api/issues/{issue['id']}"
+    etag = client.get(url).headers['ETag']
+    assert etag == '"1"'
+
+    updated = client.patch(url, json={"title": "Broken lamps"}, headers={"If-Match": etag})
+    assert updated.status_code == 200 and updated.headers['ETag'] == '"2"'
+
+    # A stale If-Match is a failed precondition
+    stale = client.patch(url, json={"title": "Lost update"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.get_json() == {
+        "error": f"Issue {issue['id']} has been modified (current version 2)", "currentVersion": 2,
+    }
+    assert stale.headers['ETag'] == '"2"'
+    fix = client.post(f"{url}/fix", json={"fixedById": 2, "fixedByName": "fixer"}, headers={"If-Match": etag})
+    assert fix.status_code == 412
+
+    # A stale version in the body is a conflict
+    conflict = client.patch(f"{url}/status", json={"status": "in_progress", "version": 1})
+    assert conflict.status_code == 409
+    assert conflict.get_json() == {
+        "error": f"Issue {issue['id']} has been modified (current version 2)", "currentVersion": 2,
+    }
+
+    for headers, body, error in (
+        ({"If-Match": '"1", "2"'}, {"title": "Two versions"}, "If-Match must name exactly one issue version"),
+        ({"If-Match": '"abc"'}, {"title": "Not a version"}, "If-Match must name exactly one issue version"),
+        ({}, {"title": "Text version", "version": "2"}, "version must be an integer"),
+    ):
+        malformed = client.patch(url, json=body, headers=headers)
+        assert malformed.status_code == 400
+        assert malformed.get_json() == {"error": error}
+
+    # None of the rejected writes got through, and If-Match: * always matches
+    assert client.get(url).get_json()['title'] == 'Broken lamps'
+    assert client.patch(url, json={"title": "Any version"}, headers={"If-Match": '*'}).status_code == 200
+
+
+def test_issues_by_ids(app, monkeypatch):
+    client = app.test_client()
+    first = create_issue(client)
+    second = create_issue(client, title="Broken door")
+
+    storage = app.extensions['sqlite_storage']
+    calls = []
+    get_issues_by_ids = storage.get_issues_by_ids
+
+    def counted(ids, *args):
+        calls.append(list(ids))
+        return get_issues_by_ids(ids, *args)
+
+    monkeypatch.setattr(storage, 'get_issues_by_ids', counted)
+
+    # Repeated ids are coalesced into one query, and unknown ids reported
+    response = client.get(f"/api/issues?ids={second['id']},{first['id']},{second['id']},999")
+    assert response.status_code == 200
+    result = response.get_json()
+    assert [issue['id'] for issue in result['items']] == [second['id'], first['id']]
+    assert result['items'][0]['title'] == 'Broken door'
+    assert result['missing'] == [999]
+    assert calls == [[second['id'], first['id'], 999]]
+
+    assert client.get('/api/issues?ids=').get_json() == {"items": [], "missing": []}
+
+    ids = ','.join(str(id) for id in range(1, MAX_BATCH_IDS + 2))
+    too_many = client.get(f'/api/issues?ids={ids}')
+    assert too_many.status_code == 400
+    assert too_many.get_json() == {"error": f"At most {MAX_BATCH_IDS} ids can be requested at once"}
+
+    for ids in ('1,abc', '1;2', '-1', '1.5'):
+        malformed = client.get(f'/api/issues?ids={ids}')
+        assert malformed.status_code == 400
+        assert malformed.get_json() == {"error": "ids must be a comma-separated list of issue ids"}
+    assert len(calls) == 1
+
+
+def test_issue_query_rejects_bad_arguments(app):
+    client = app.test_client()
+    issue = create_issue(client, priority='high')
+
+    response = client.get('/api/issues/query?priority=high&sort=-priority&page=1&pageSize=10&view=summary')
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()['items']] == [issue['id']]
+
+    page_error = f"page must be >= 1 and pageSize between 1 and {MAX_PAGE_SIZE}"
+    for query, error in (
+        ('colour=red', "Unknown filters: colour"),
+        ('status=pending&reporter=1', "Unknown filters: reporter"),
+        ('sort=password', "Unsupported sort key: password"),
+        ('sort=-description', "Unsupported sort key: description"),
+        ('reportedBy=ann', "Invalid reportedBy: ann"),
+        ('minEstimatedCost=cheap', "Invalid minEstimatedCost: cheap"),
+        ('page=0', page_error),
+        ('page=two', page_error),
+        ('pageSize=0', page_error),
+        (f'pageSize={MAX_PAGE_SIZE + 1}', page_error),
+    ):
+        response = client.get(f'/api/issues/query?{query}')
+        assert response.status_code == 400, query
+        assert response.get_json() == {"error": error}
+
+
+def test_user_issue_feed_route(app):
+    client = app.test_client()
+    ids = [create_issue(client, title=f"Issue {n}")['id'] for n in range(3)]
+    create_issue(client, reportedById=2)
+    for id in (ids[2], ids[0]):
+        time.sleep(0.002)
+        assert client.post(f'/api/issues/{id}/fix', json={"fixedById": 7, "fixedByName": "fixer"}).status_code == 200
+
+    # The cursor picks up where the previous page ended
+    first = client.get('/api/users/1/issues?limit=2').get_json()
+    assert [issue['id'] for issue in first['items']] == [ids[2], ids[1]]
+    assert first['counts'] == {"pending": 1, "fixed": 2, "total": 3}
+    rest = client.get(f"/api/users/1/issues?limit=2&cursor={first['nextCursor']}").get_json()
+    assert [issue['id'] for issue in rest['items']] == [ids[0]]
+    assert rest['nextCursor'] is None
+
+    # Fixers see what they fixed, latest fix first
+    fixed = client.get('/api/users/7/issues?role=fixer&status=fixed').get_json()
+    assert [issue['id'] for issue in fixed['items']] == [ids[0], ids[2]]
+    assert client.get('/api/users/7/issues').get_json()['items'] == []
+
+    for query, error in (
+        ('cursor=abc', "Invalid cursor"),
+        ('cursor=1:2:3', "Invalid cursor"),
+        ('role=owner', "Unknown role: owner"),
+        ('limit=0', f"limit must be between 1 and {MAX_PAGE_SIZE}"),
+    ):
+        response = client.get(f'/api/users/1/issues?{query}')
+        assert response.status_code == 400, query
+        assert response.get_json() == {"error": error}
+
+
+def test_issue_projections(app):
+    client = app.test_client()
+    issue = create_issue(client, priority='high')
+    app.extensions['sqlite_storage'].create_user({"username": "ann", "password": "secret", "role": "reporter"})
+
+    sparse = client.get('/api/issues?fields=id,title').get_json()
+    assert sparse == [{"id": issue['id'], "title": "Broken lamp"}]
+    assert client.get('/api/issues/query?fields=id,priority').get_json()['items'] == [
+        {"id": issue['id'], "priority": 'high'},
+    ]
+
+    summary = client.get('/api/issues/by-status/pending?view=summary').get_json()
+    assert set(summary[0]) == set(ISSUE_VIEWS['summary'])
+    assert summary[0]['thumbnail_url'] is None and 'description' not in summary[0]
+    # The view wins over fields
+    assert set(client.get('/api/issues?view=summary&fields=id').get_json()[0]) == set(ISSUE_VIEWS['summary'])
+
+    for query, error in (
+        ('fields=id,password', "Unknown fields: password"),
+        ('fields=username', "Unknown fields: username"),
+        ('view=everything', "Unknown view: everything"),
+    ):
+        for url in ('/api/issues', '/api/issues/query', '/api/issues/by-type/general', '/api/users/1/issues'):
+            response = client.get(f'{url}?{query}')
+            assert response.status_code == 400, (url, query)
+            assert response.get_json() == {"error": error}
+
+
+def test_image_modes(app):
+    client = app.test_client()
+    storage = app.extensions['sqlite_storage']
+    with_images = create_issue(client)
+    without = create_issue(client)
+    for filename in ('a,1.jpg', 'b.jpg'):
+        storage.create_image({"filename": filename, "issueId": with_images['id'], "uploadedById": 1})
+
+    def listed(query):
+        return {issue['id']: issue for issue in client.get(f'/api/issues?{query}').get_json()}
+
+    full = listed('')
+    assert full[with_images['id']]['image_urls'] == ['a,1.jpg', 'b.jpg']
+    assert full[without['id']]['image_urls'] == [] and 'thumbnail_url' not in full[without['id']]
+    assert listed('images=all') == full
+
+    first = listed('images=first')
+    assert first[with_images['id']]['thumbnail_url'] == 'a,1.jpg'
+    assert first[without['id']]['thumbnail_url'] is None
+    assert 'image_urls' not in first[with_images['id']]
+    assert set(first[with_images['id']]) - {'thumbnail_url'} == set(full[with_images['id']]) - {'image_urls'}
+
+    none = listed('images=none')
+    assert not {'image_urls', 'thumbnail_url'} & set(none[with_images['id']])
+    assert none[with_images['id']]['title'] == 'Broken lamp'
+
+    # Image modes replace the image fields of a view or fieldset
+    summary = listed('view=summary&images=none')[with_images['id']]
+    assert set(summary) == set(ISSUE_VIEWS['summary']) - {'thumbnail_url'}
+    assert listed('fields=id&images=all')[with_images['id']] == {
+        "id": with_images['id'], "image_urls": ['a,1.jpg', 'b.jpg'],
+    }
+    batch = client.get(f"/api/issues?ids={with_images['id']}&images=first").get_json()
+    assert batch['items'][0]['thumbnail_url'] == 'a,1.jpg'
+
+    response = client.get('/api/issues?images=some')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Unknown images option: some"}
@@ -0,0 +1,217 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app_sqlite import create_app
+from sqlite_db import IssueVersionConflict, SharedMemorySQLiteStorage, SQLiteStorage
+from sqlite_jobs import BUILTIN_HANDLERS, JobQueue, JobWorkerPool, backoff_seconds, work
+
+
+def record(storage, payload):
+    return {"seen": payload}
+
+
+def explode(storage, payload):
+    raise RuntimeError("handler failed")
+
+
+def create_issue(storage):
+    return storage.create_issue({
+        "title": "Broken light",
+        "description": "Job test issue",
+        "location": "Airport",
+        "reportedById": 1,
+        "reportedByName": "reporter",
+    })
+
+
+def wait_for(queue, job_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not become {status}: {queue.get(job_id)}")
+
+
+def test_subscribed_jobs_commit_with_their_write(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    storage.subscribe_job('issue_created', 'notify', priority=1)
+    storage.subscribe_job('status_changed', 'notify')
+    issue = create_issue(storage)
+    storage.update_issue_status(issue['id'], 'in_progress', 2, 'fixer')
+
+    # A status change rejected by its version check enqueues nothing
+    with pytest.raises(IssueVersionConflict):
+        storage.update_issue_status(issue['id'], 'fixed', 2, 'fixer', expected_version=1)
+
+    # Jobs survive a restart: a new storage on the same file sees them
+    queue = JobQueue(SQLiteStorage(str(tmp_path / 'issues.db')))
+    first = queue.claim('worker-a')
+    second = queue.claim('worker-a')
+    assert queue.claim('worker-a') is None
+    assert first['payload'] == {"issueId": issue['id']}
+    assert second['payload'] == {
+        "issueId": issue['id'], "oldStatus": 'pending', "newStatus": 'in_progress', "changedById": 2,
+    }
+    assert first['status'] == 'running' and first['attempts'] == 1
+
+
+def test_failed_jobs_back_off_then_dead_letter(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    queue = JobQueue(storage)
+    job_id = storage.enqueue_job('flaky', {"n": 1}, max_attempts=2)
+
+    job = queue.claim('worker-a')
+    assert queue.fail(job, 'worker-a', 'RuntimeError: boom') == 'queued'
+    retried = queue.get(job_id)
+    assert retried['last_error'] == 'RuntimeError: boom'
+    assert retried['run_at'] > retried['updated_at']
+    # Not due again until the backoff passed
+    assert queue.claim('worker-a') is None
+
+    conn = sqlite3.connect(storage.db_path)
+    conn.execute('UPDATE jobs SET run_at = 0')
+    conn.commit()
+    conn.close()
+    job = queue.claim('worker-a')
+    assert job['attempts'] == 2
+    assert queue.fail(job, 'worker-a', 'RuntimeError: boom') == 'dead'
+    assert queue.get(job_id)['finished_at'] is not None
+    assert queue.stats()['dead'] == 1
+
+    assert queue.retry_dead() == 1
+    assert queue.claim('worker-a')['attempts'] == 1
+
+
+def test_backoff_doubles_up_to_a_cap():
+    for _ in range(20):
+        assert 2.5 <= backoff_seconds(1) <= 5
+        assert 40 <= backoff_seconds(5) <= 80
+        assert 1800 <= backoff_seconds(100) <= 3600
+
+
+def test_expired_job_lease_goes_to_another_worker(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    queue = JobQueue(storage)
+    job_id = storage.enqueue_job('slow')
+    storage.enqueue_job('urgent', priority=5)
+
+    urgent = queue.claim('worker-a', lease_seconds=60)
+    assert urgent['kind'] == 'urgent'
+    stale = queue.claim('worker-a', lease_seconds=0)
+    assert stale['id'] == job_id
+    time.sleep(0.01)
+
+    taken = queue.claim('worker-b', lease_seconds=60)
+    assert taken['id'] == job_id and taken['attempts'] == 2
+    # The first worker lost the lease, so its late result is ignored
+    assert not queue.complete(stale, 'worker-a', {"late": True})
+    assert queue.complete(taken, 'worker-b', {"ok": True})
+    assert queue.get(job_id)['result'] == {"ok": True}
+
+
+def test_workers_without_handlers_claim_nothing(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    queue = JobQueue(storage)
+    job_id = storage.enqueue_job('notify')
+    assert queue.claim('worker-a', []) is None
+
+    stop = threading.Event()
+    worker = threading.Thread(target=work, args=(storage, {}, 'worker-a', stop), kwargs={"poll": 0.01})
+    worker.start()
+    time.sleep(0.1)
+    stop.set()
+    worker.join()
+    assert queue.get(job_id)['status'] == 'queued'
+    assert queue.claim('worker-b')['id'] == job_id
+
+
+def test_builtin_jobs_run_on_shared_memory_storage():
+    storage = SharedMemorySQLiteStorage()
+    queue = JobQueue(storage)
+    job_id = storage.enqueue_job('maintain_database')
+
+    pool = JobWorkerPool(storage, BUILTIN_HANDLERS, workers=1, poll=0.05)
+    pool.start()
+    try:
+        job = wait_for(queue, job_id, 'done')
+    finally:
+        pool.stop()
+        storage.close()
+    assert job['result'][0]['fileBytesBefore'] is None
+    assert 'optimize' in job['result'][0]['tasks']
+
+
+def test_thread_pool_runs_jobs(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    queue = JobQueue(storage)
+    storage.subscribe_job('comment_created', 'record')
+    issue = create_issue(storage)
+    storage.create_comment({"content": "On it", "userId": 2, "userName": "fixer", "issueId": issue['id']})
+    failing = storage.enqueue_job('explode', max_attempts=1)
+
+    pool = JobWorkerPool(storage, {'record': record, 'explode': explode}, workers=2, poll=0.05)
+    pool.start()
+    try:
+        done = wait_for(queue, 1, 'done')
+        dead = wait_for(queue, failing, 'dead')
+    finally:
+        pool.stop()
+    assert done['result']['seen']['issueId'] == issue['id']
+    assert dead['last_error'] == 'RuntimeError: handler failed'
+
+
+def test_process_pool_runs_builtin_jobs(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    create_issue(storage)
+    job_id = storage.enqueue_job('verify_activity_counters', {"repair": False})
+
+    pool = JobWorkerPool(storage, workers=1, mode='process', poll=0.05)
+    pool.start()
+    try:
+        job = wait_for(JobQueue(storage), job_id, 'done', timeout=60)
+    finally:
+        pool.stop()
+    assert job['result'][0]['driftedIssues'] == 0
+
+
+def test_background_archive_route(tmp_path):
+    app = create_app({
+        "SQLITE_DB_PATH": str(tmp_path / 'issues.db'),
+        "SQLITE_ARCHIVE_PATH": str(tmp_path / 'archive.db'),
+        "JOB_WORKERS": 1,
+    })
+    app.extensions['sqlite_jobs'].poll = 0.05
+    client = app.test_client()
+
+    response = client.post('/api/archive', json={"background": True, "olderThanDays": 30})
+    assert response.status_code == 202
+    job_id = response.get_json()['jobId']
+    try:
+        deadline = time.monotonic() + 10
+        while client.get(f'/api/jobs/{job_id}').get_json()['status'] != 'done':
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        assert job['result']['archivedIssues'] == 0
+        assert job['payload'] == {"olderThanDays": 30, "batchSize": 500}
+        assert client.get('/api/jobs/999').status_code == 404
+        metrics = client.get('/api/metrics/jobs').get_json()
+        assert metrics['enabled'] and metrics['done'] == 1 and metrics['workers'] == 1
+    finally:
+        app.extensions['sqlite_jobs'].stop()
+
+
+def test_job_routes_without_a_job_queue():
+    client = create_app({"STORAGE_BACKEND": 'memory', "JOB_WORKERS": 1}).test_client()
+
+    response = client.post('/api/archive', json={"background": True})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "This storage backend has no job queue"}
+    assert client.get('/api/jobs/1').status_code == 400
+    assert client.get('/api/metrics/jobs').get_json() == {"enabled": False}
@@ -0,0 +1,120 @@
+import sqlite3
+import time
+
+from app_sqlite import create_app
+from sqlite_db import SQLiteStorage, _create_base_schema
+from sqlite_maintenance import MaintenanceScheduler, convert_auto_vacuum, maintain_database
+
+
+def pragma(path, name):
+    conn = sqlite3.connect(path)
+    value = conn.execute(f'PRAGMA {name}').fetchone()[0]
+    conn.close()
+    return value
+
+
+def fill_and_empty(storage, count=200):
+    """Create and delete issues with long descriptions, leaving free pages behind"""
+    ids = [
+        storage.create_issue({
+            "title": f"Issue {n}",
+            "description": 'x' * 2000,
+            "location": "Airport",
+            "reportedById": 1,
+            "reportedByName": "reporter",
+        })['id']
+        for n in range(count)
+    ]
+    for id in ids:
+        storage.delete_issue(id)
+
+
+def test_pass_reclaims_free_pages_and_checkpoints(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    fill_and_empty(storage)
+    # A passive checkpoint moves the deletes into the file's free list
+    pragma(storage.db_path, 'wal_checkpoint(PASSIVE)')
+    assert pragma(storage.db_path, 'freelist_count') > 0
+
+    report = maintain_database(storage, truncate_wal=True)
+    assert report["autoVacuum"] == 'incremental'
+    assert set(report["tasks"]) == {"optimize", "incrementalVacuum", "checkpoint"}
+    assert report["tasks"]["incrementalVacuum"]["reclaimedPages"] > 0
+    assert report["tasks"]["checkpoint"]["mode"] == 'TRUNCATE'
+    assert report["pagesAfter"] < report["pagesBefore"]
+
+
+def test_pass_never_vacuums_older_databases(tmp_path):
+    path = str(tmp_path / 'issues.db')
+    # Created before auto_vacuum=INCREMENTAL became the default
+    conn = sqlite3.connect(path)
+    _create_base_schema(conn.cursor())
+    conn.commit()
+    conn.close()
+    storage = SQLiteStorage(path)
+
+    report = maintain_database(storage)
+    assert report["autoVacuum"] == 'none'
+    assert set(report["tasks"]) == {"optimize", "checkpoint"}
+    assert pragma(path, 'auto_vacuum') == 0
+
+    # Converting is a separate, explicit step
+    assert convert_auto_vacuum(storage)["converted"] is True
+    assert pragma(path, 'auto_vacuum') == 2
+    assert convert_auto_vacuum(storage)["converted"] is False
+    assert pragma(path, 'integrity_check') == 'ok'
+
+
+def test_scheduler_runs_once_the_data_is_quiet(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    scheduler = MaintenanceScheduler(storage, interval=60, quiet_period=0, poll=0.01)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 10
+        while scheduler.last_report is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    assert scheduler.last_report["databases"][0]["database"] == storage.db_path
+    assert "error" not in scheduler.last_report
+
+
+def test_scheduler_keeps_running_after_a_failed_pass(tmp_path, caplog):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    scheduler = MaintenanceScheduler(storage, interval=0, quiet_period=0, poll=0.01)
+    run_once = scheduler.run_once
+    calls = []
+
+    def fail_first(*args):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("disk on fire")
+        return run_once()
+
+    scheduler.run_once = fail_first
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 10
+        while len(calls) < 2 or "databases" not in (scheduler.last_report or {}):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    assert scheduler.last_report["databases"][0]["database"] == storage.db_path
+    failures = [record for record in caplog.records if record.name == 'sqlite_maintenance']
+    assert failures[0].exc_info[0] is RuntimeError
+
+
+def test_maintenance_report_route(tmp_path):
+    client = create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')}).test_client()
+    assert client.get('/api/metrics/maintenance').get_json() == {"enabled": False, "lastReport": None}
+
+    app = create_app({"SQLITE_DB_PATH": str(tmp_path / 'other.db'), "SQLITE_MAINTENANCE_INTERVAL": 3600})
+    scheduler = app.extensions['sqlite_maintenance']
+    scheduler.run_once()
+    try:
+        report = app.test_client().get('/api/metrics/maintenance').get_json()
+    finally:
+        scheduler.stop()
+    assert report["enabled"] and report["lastReport"]["databases"][0]["autoVacuum"] == 'incremental'
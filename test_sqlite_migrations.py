@@ -0,0 +1,98 @@
+import sqlite3
+
+import sqlite_db
+from sqlite_db import SCHEMA_VERSION, SQLiteStorage, _create_base_schema, to_epoch_ms
+
+CREATED = '2025-05-05T11:12:13.307'
+FIXED = '2025-05-06T08:00:00.000'
+
+
+def create_legacy_database(path, issue_id=1):
+    """Create a database as the original code wrote it: no user_version, ISO-8601 text timestamps"""
+    conn = sqlite3.connect(path)
+    _create_base_schema(conn.cursor())
+    conn.execute('''
+    INSERT INTO issues (id, title, description, location, status, reported_by_id, reported_by_name,
+                        fixed_by_id, fixed_by_name, fixed_at, time_to_fix, created_at, updated_at)
+    VALUES (?, 'Broken lamp', 'Lamp in the corridor is broken', 'Airport', 'fixed', 1, 'reporter',
+            2, 'fixer', ?, 1248, ?, ?)
+    ''', (issue_id, FIXED, CREATED, FIXED))
+    conn.execute("INSERT INTO images (filename, issue_id, created_at) VALUES ('a.jpg', ?, ?)", (issue_id, CREATED))
+    conn.execute(
+        "INSERT INTO comments (content, user_id, user_name, issue_id, created_at) VALUES ('On it', 2, 'fixer', ?, ?)",
+        (issue_id, CREATED)
+    )
+    conn.execute('''
+    INSERT INTO status_history (issue_id, old_status, new_status, changed_by_id, changed_by_name, created_at)
+    VALUES (?, 'pending', 'fixed', 2, 'fixer', ?)
+    ''', (issue_id, FIXED))
+    conn.commit()
+    conn.close()
+
+
+def integrity(path):
+    conn = sqlite3.connect(path)
+    result = conn.execute('PRAGMA integrity_check').fetchall()
+    conn.close()
+    return result
+
+
+def test_legacy_database_is_migrated_with_backfills_outside_the_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / 'issues.db')
+    create_legacy_database(path)
+
+    # Each backfill must see the schema just before its migration
+    seen = {}
+    for stage, backfill in list(sqlite_db.BACKFILLS.items()):
+        def recording(conn, stage=stage, backfill=backfill):
+            seen[stage] = conn.execute('PRAGMA user_version').fetchone()[0]
+            assert not conn.in_transaction
+            backfill(conn)
+        monkeypatch.setitem(sqlite_db.BACKFILLS, stage, recording)
+
+    storage = SQLiteStorage(path)
+    issue = storage.get_issue(1)
+    assert seen == {stage: stage - 1 for stage in sqlite_db.BACKFILLS}
+
+    assert issue['created_at'] == to_epoch_ms(CREATED)
+    assert issue['fixed_at'] == to_epoch_ms(FIXED)
+    assert issue['image_urls'] == ['a.jpg']
+    assert storage.get_comments(1)[0]['created_at'] == to_epoch_ms(CREATED)
+    assert storage.get_status_history(1)[0]['created_at'] == to_epoch_ms(FIXED)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%epoch%'").fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM issue_similarity_bands WHERE issue_id = 1').fetchone()[0] > 0
+    conn.close()
+    assert integrity(path) == [('ok',)]
+
+    # New rows keep counting up from the old AUTOINCREMENT sequence
+    created = storage.create_issue({
+        "title": "Leak", "description": "Water", "location": "Airport", "reportedById": 1, "reportedByName": "r",
+    })
+    assert created['id'] == 2
+
+
+def test_legacy_archive_is_converted_on_first_attach(tmp_path):
+    path = str(tmp_path / 'issues.db')
+    archive_path = str(tmp_path / 'issues_archive.db')
+    storage = SQLiteStorage(path, archive_path)
+    storage.initialize_db()
+    create_legacy_database(archive_path, issue_id=100)
+
+    issue = storage.get_issue(100)
+    assert issue['created_at'] == to_epoch_ms(CREATED)
+    assert issue['fixed_at'] == to_epoch_ms(FIXED)
+    assert issue['image_urls'] == ['a.jpg']
+    assert issue['comment_count'] == 1 and issue['status_change_count'] == 1
+    assert storage.get_issue(100, include_archived=False) is None
+
+    conn = sqlite3.connect(archive_path)
+    types = {
+        table: conn.execute(f'SELECT typeof(created_at) FROM {table}').fetchone()[0]
+        for table in ('issues', 'images', 'comments', 'status_history')
+    }
+    conn.close()
+    assert set(types.values()) == {'integer'}
+    assert integrity(archive_path) == [('ok',)]
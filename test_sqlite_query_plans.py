@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from sqlite_db import ISSUE_VIEWS, SQLiteStorage, _compile_listing
+
+
+@pytest.fixture
+def conn(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    storage.initialize_db()
+    conn = sqlite3.connect(storage.db_path)
+    yield conn
+    conn.close()
+
+
+def plan(conn, sql, params=()):
+    """Get the EXPLAIN QUERY PLAN details of a statement, one string per step"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+@pytest.mark.parametrize('where, params, index', [
+    ('', (), 'idx_issues_summary'),
+    ('WHERE i.status = ?', ('pending',), 'idx_issues_status_summary'),
+])
+def test_summary_listings_read_only_their_covering_index(conn, where, params, index):
+    sql = _compile_listing(tuple(ISSUE_VIEWS['summary']), where, 'i.created_at DESC', True)
+    steps = plan(conn, sql, params + (50, 0))
+    assert len(steps) == 1
+    assert f'USING COVERING INDEX {index}' in steps[0]
+
+
+@pytest.mark.parametrize('column, index', [
+    ('reported_by_id', 'idx_issues_reported_by_created_at'),
+    ('fixed_by_id', 'idx_issues_fixed_by_fixed_at'),
+])
+def test_user_feed_counts_read_only_the_users_index_entries(conn, column, index):
+    steps = plan(conn, f'SELECT status, COUNT(*) FROM issues WHERE {column} = ? GROUP BY status', (1,))
+    assert f'SEARCH issues USING COVERING INDEX {index} ({column}=?)' in steps
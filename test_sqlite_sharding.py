@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from sqlite_db import SQLiteStorage
+from sqlite_jobs import JobQueue, job_queue
+from sqlite_sharding import SHARD_ID_SPAN, ShardRouter, ShardedSQLiteStorage, split_database
+
+
+def create_issue(storage, location, **fields):
+    # Distinct creation times keep newest-first listings deterministic
+    time.sleep(0.002)
+    return storage.create_issue({
+        "title": "Broken lamp",
+        "description": "Lamp in the corridor is broken",
+        "location": location,
+        "reportedById": 1,
+        "reportedByName": "reporter",
+        **fields,
+    })
+
+
+@pytest.fixture
+def router(tmp_path):
+    return ShardRouter(
+        {1: str(tmp_path / 'site-1.db'), 2: str(tmp_path / 'site-2.db')},
+        {"Airport": 1, "Mall": 2},
+    )
+
+
+def test_router_maps_locations_and_ids(router):
+    assert router.shard_for_location('Airport') == 1
+    assert router.shard_for_location('Mall') == 2
+    # Other locations hash onto a stable shard
+    assert router.shard_for_location('Station') in (1, 2)
+    assert router.shard_for_location('Station') == router.shard_for_location('Station')
+
+    assert router.shard_for_id(2 * SHARD_ID_SPAN + 7) == 2
+    assert router.shard_for_id(7) is None
+
+    parsed = ShardRouter.from_spec(['1=a.db', '2=b.db'], ["MC Donald's Jana Bazynskiego 2=2"])
+    assert parsed.shard_paths == {1: 'a.db', 2: 'b.db'}
+    assert parsed.location_groups == {"MC Donald's Jana Bazynskiego 2": 2}
+
+    with pytest.raises(ValueError):
+        ShardRouter({})
+    with pytest.raises(ValueError):
+        ShardRouter({0: 'a.db'})
+    with pytest.raises(ValueError):
+        ShardRouter({1: 'a.db'}, {"Mall": 2})
+
+
+def test_listings_merge_across_shards(router):
+    storage = ShardedSQLiteStorage(router)
+    issues = [
+        create_issue(storage, 'Airport', priority='low'),
+        create_issue(storage, 'Mall', priority='urgent'),
+        create_issue(storage, 'Airport', priority='high'),
+        create_issue(storage, 'Mall', priority='medium'),
+    ]
+    ids = [issue['id'] for issue in issues]
+    assert [id // SHARD_ID_SPAN for id in ids] == [1, 2, 1, 2]
+
+    assert storage.get_issue(ids[1])['location'] == 'Mall'
+    assert storage.get_issue(5) is None
+    assert [issue['id'] for issue in storage.get_issues(fields=('id',))] == ids[::-1]
+
+    # Pages are cut from the merged order, and totals add up
+    first = storage.query_issues(sort='-priority', page_size=3)
+    second = storage.query_issues(sort='-priority', page=2, page_size=3)
+    assert first['total'] == second['total'] == 4
+    assert [issue['id'] for issue in first['items'] + second['items']] == [ids[1], ids[2], ids[3], ids[0]]
+
+    feed = storage.get_user_issues(1, limit=3, fields=('id',))
+    rest = storage.get_user_issues(1, limit=3, cursor=feed['nextCursor'], fields=('id',))
+    assert [issue['id'] for issue in feed['items'] + rest['items']] == ids[::-1]
+    assert rest['nextCursor'] is None and feed['counts'] == {"pending": 4, "total": 4}
+
+    assert storage.get_issue_statistics()['totalIssues'] == 4
+
+
+def test_leases_are_kept_in_the_issues_shard(router):
+    storage = ShardedSQLiteStorage(router)
+    create_issue(storage, 'Airport')
+    mall = create_issue(storage, 'Mall')
+
+    claimed = storage.claim_next_issue(7, 'tech', location='Mall')
+    assert claimed['id'] == mall['id']
+    assert storage.renew_issue_lease(mall['id'], 7, 3600)['lease_expires_at'] > claimed['lease_expires_at']
+    assert storage.release_issue_lease(mall['id'], 7)['status'] == 'pending'
+    assert storage.renew_issue_lease(5, 7) is None and storage.release_issue_lease(5, 7) is None
+
+
+def test_split_database_moves_archive_and_jobs(tmp_path, router):
+    source = SQLiteStorage(str(tmp_path / 'issues.db'))
+    source.create_user({"username": "tech", "password": "x", "role": "technician"})
+    airport = create_issue(source, 'Airport', imageUrls=['a.jpg'])
+    mall = create_issue(source, 'Mall')
+    archived = create_issue(source, 'Mall')
+    source.create_comment({"content": "On it", "userId": 1, "userName": "tech", "issueId": airport['id']})
+    source.mark_issue_as_fixed(archived['id'], 1, 'tech')
+    time.sleep(0.002)
+    assert source.archive_fixed_issues(older_than_days=0)['archivedIssues'] == 1
+    job_id = source.enqueue_job('notify', {"issueId": mall['id']})
+
+    assert split_database(source.db_path, router) == {1: 1, 2: 1}
+    storage = ShardedSQLiteStorage(router)
+
+    moved = storage.get_issue(SHARD_ID_SPAN + airport['id'])
+    assert moved['image_urls'] == ['a.jpg']
+    assert moved['comment_count'] == 1 and moved['image_count'] == 1
+    assert storage.get_comments(moved['id'])[0]['content'] == 'On it'
+    assert storage.get_user_by_username('tech') is not None
+    assert storage.query_issues()['total'] == 2
+
+    # Archived issues stay reachable in their location's shard
+    archived_id = 2 * SHARD_ID_SPAN + archived['id']
+    assert storage.get_issue(archived_id)['status'] == 'fixed'
+    assert storage.get_issue(archived_id, include_archived=False) is None
+    # New ids never reuse an archived one
+    assert create_issue(storage, 'Mall')['id'] > archived_id
+
+    job = JobQueue(storage.home).claim('worker')
+    assert job['id'] == job_id and job['kind'] == 'notify'
+    assert job['payload'] == {"issueId": 2 * SHARD_ID_SPAN + mall['id']}
+    assert job_queue(storage).stats()['running'] == 1
+
+    # Archiving keeps working on the split shards
+    storage.mark_issue_as_fixed(moved['id'], 1, 'tech')
+    time.sleep(0.002)
+    assert storage.archive_fixed_issues(older_than_days=0)['archivedIssues'] == 1
+    assert storage.get_issue(moved['id'])['image_urls'] == ['a.jpg']
+    assert storage.query_issues()['total'] == 2
@@ -0,0 +1,61 @@
+import pytest
+
+from app_sqlite import create_app
+
+REPORT = {
+    "title": "Deep fryer leaking oil",
+    "description": "The fryer next to the grill leaks oil onto the floor",
+    "location": "Airport",
+    "reportedById": 1,
+    "reportedByName": "reporter",
+}
+
+
+@pytest.fixture
+def client(tmp_path):
+    return create_app({"SQLITE_DB_PATH": str(tmp_path / 'issues.db')}).test_client()
+
+
+def test_similar_issues_routes(client):
+    fryer = client.post('/api/issues', json=REPORT).get_json()
+
+    response = client.post('/api/issues/similar', json={**REPORT, "title": "Fryer leaking oil"})
+    assert response.status_code == 200
+    assert [issue['id'] for issue in response.get_json()['items']] == [fryer['id']]
+
+    # A null description is the same as none
+    response = client.post('/api/issues/similar', json={**REPORT, "description": None})
+    assert [issue['id'] for issue in response.get_json()['items']] == [fryer['id']]
+
+    created = client.post('/api/issues', json={**REPORT, "checkDuplicates": True})
+    assert created.status_code == 201
+    assert [issue['id'] for issue in created.get_json()['possibleDuplicates']] == [fryer['id']]
+
+
+@pytest.mark.parametrize('field, value', [
+    ('title', 42),
+    ('title', ['Deep', 'fryer']),
+    ('description', 3.5),
+    ('description', {"text": "leak"}),
+    ('location', 7),
+])
+def test_non_string_text_is_rejected(client, field, value):
+    fryer = client.post('/api/issues', json=REPORT).get_json()
+    report = {**REPORT, field: value}
+
+    for response in (
+        client.post('/api/issues/similar', json=report),
+        client.post('/api/issues', json={**report, "checkDuplicates": True}),
+        client.post('/api/issues', json=report),
+        client.patch(f"/api/issues/{fryer['id']}", json={field: value}),
+    ):
+        assert response.status_code == 400
+        assert response.get_json() == {"error": f"{field} must be a string"}
+
+    assert client.get(f"/api/issues/{fryer['id']}").get_json()[field] == REPORT[field]
+    assert len(client.get('/api/issues').get_json()) == 1
+
+
+def test_similar_issues_needs_an_object(client):
+    assert client.post('/api/issues/similar', json=['Deep fryer']).status_code == 400
+    assert client.post('/api/issues/similar', json={**REPORT, "title": None}).status_code == 400
@@ -0,0 +1,482 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from memory_storage import InMemoryStorage
+from sqlite_db import IssueVersionConflict, SharedMemorySQLiteStorage, SQLiteStorage
+from storage_backend import DuplicateUsername, LeaseNotHeld, UnsupportedOperation
+
+
+@pytest.fixture(params=['sqlite', 'sqlite-memory', 'memory'])
+def storage(request, tmp_path):
+    """Every StorageBackend implementation, run through the same tests"""
+    if request.param == 'sqlite':
+        storage = SQLiteStorage(str(tmp_path / 'issues.db'), str(tmp_path / 'archive.db'))
+    elif request.param == 'sqlite-memory':
+        storage = SharedMemorySQLiteStorage()
+    else:
+        storage = InMemoryStorage()
+    storage.initialize_db()
+    yield storage
+    storage.close()
+
+
+def create_issue(storage, **fields):
+    # Distinct creation times keep newest-first listings deterministic
+    time.sleep(0.002)
+    return storage.create_issue({
+        "title": "Broken lamp",
+        "description": "Lamp in the corridor is broken",
+        "location": "Airport",
+        "reportedById": 1,
+        "reportedByName": "reporter",
+        **fields,
+    })
+
+
+def test_users(storage):
+    user = storage.create_user({"username": "ann", "email": "ann@example.com", "password": "x", "role": "reporter"})
+
+    assert storage.get_user(user['id'])['username'] == 'ann'
+    assert storage.get_user_by_username('ann')['id'] == user['id']
+    assert storage.get_user_by_username('bob') is None
+    assert storage.get_user(user['id'] + 1) is None
+
+    with pytest.raises(DuplicateUsername) as duplicate:
+        storage.create_user({"username": "ann", "password": "y", "role": "technician"})
+    assert duplicate.value.username == 'ann'
+    assert storage.get_user_by_username('ann')['id'] == user['id']
+    assert storage.create_user({"username": "bob", "password": "y", "role": "technician"})['id'] != user['id']
+
+
+def test_issue_crud_and_versions(storage):
+    issue = create_issue(storage, imageUrls=['a.jpg', 'b.jpg'], priority='high')
+
+    assert issue['status'] == 'pending'
+    assert issue['version'] == 1
+    assert issue['image_urls'] == ['a.jpg', 'b.jpg']
+    assert storage.get_issue(issue['id']) == issue
+
+    updated = storage.update_issue(issue['id'], {"title": "Fixed title", "unknown": 1}, expected_version=1)
+    assert updated['title'] == 'Fixed title'
+    assert updated['version'] == 2
+    assert updated['updated_at'] >= issue['updated_at']
+
+    with pytest.raises(IssueVersionConflict) as conflict:
+        storage.update_issue(issue['id'], {"title": "Stale"}, expected_version=1)
+    assert conflict.value.current_version == 2
+    assert storage.update_issue(issue['id'] + 100, {"title": "Missing"}) is None
+
+    assert storage.delete_issue(issue['id']) is True
+    assert storage.delete_issue(issue['id']) is False
+    assert storage.get_issue(issue['id']) is None
+
+
+def test_status_changes_are_recorded(storage):
+    issue = create_issue(storage)
+
+    unchanged = storage.update_issue_status(issue['id'], 'pending', 2, 'fixer')
+    assert unchanged['version'] == 1
+
+    storage.update_issue_status(issue['id'], 'in_progress', 2, 'fixer', notes='on it')
+    time.sleep(0.002)
+    with pytest.raises(IssueVersionConflict):
+        storage.mark_issue_as_fixed(issue['id'], 2, 'fixer', expected_version=1)
+    fixed = storage.mark_issue_as_fixed(issue['id'], 2, 'fixer', expected_version=2)
+
+    assert fixed['status'] == 'fixed'
+    assert fixed['version'] == 3
+    assert fixed['fixed_by_name'] == 'fixer'
+    assert fixed['fixed_at'] >= fixed['created_at']
+    assert fixed['time_to_fix'] == 0
+    assert storage.update_issue_status(issue['id'] + 100, 'fixed') is None
+
+    history = storage.get_status_history(issue['id'])
+    assert [(h['old_status'], h['new_status']) for h in history] == [('in_progress', 'fixed'), ('pending', 'in_progress')]
+    assert history[1]['notes'] == 'on it'
+
+
+def test_listings(storage):
+    first = create_issue(storage, issueType='electrical', imageUrls=['a.jpg', 'b.jpg'])
+    second = create_issue(storage, issueType='plumbing', status='in_progress')
+
+    assert [issue['id'] for issue in storage.get_issues()] == [second['id'], first['id']]
+    assert storage.get_issues()[1]['image_urls'] == ['a.jpg', 'b.jpg']
+    assert storage.get_issues(fields=('id', 'title', 'thumbnail_url')) == [
+        {"id": second['id'], "title": "Broken lamp", "thumbnail_url": None},
+        {"id": first['id'], "title": "Broken lamp", "thumbnail_url": 'a.jpg'},
+    ]
+    # Filenames are returned whole, commas included, in upload order
+    storage.create_image({"filename": 'c,1.jpg', "issueId": second['id'], "uploadedById": 1})
+    storage.create_image({"filename": 'd.jpg', "issueId": second['id'], "uploadedById": 1})
+    assert storage.get_issue(second['id'])['image_urls'] == ['c,1.jpg', 'd.jpg']
+    assert storage.get_issues_by_status('in_progress')[0]['image_urls'] == ['c,1.jpg', 'd.jpg']
+    assert storage.get_issues(fields=('thumbnail_url',)) == [{"thumbnail_url": 'c,1.jpg'}, {"thumbnail_url": 'a.jpg'}]
+    assert [issue['id'] for issue in storage.get_issues_by_status('in_progress')] == [second['id']]
+    assert [issue['id'] for issue in storage.get_issues_by_type('electrical', fields=('id',))] == [first['id']]
+    with pytest.raises(ValueError):
+        storage.get_issues(fields=('id', 'password'))
+
+
+def test_query_filters_sort_and_pages(storage):
+    issues = [
+        create_issue(storage, priority='low', estimatedCost=30),
+        create_issue(storage, priority='urgent', estimatedCost=10, location='Mall'),
+        create_issue(storage, priority='high', estimatedCost=20),
+        create_issue(storage, priority='high', estimatedCost=None),
+    ]
+    ids = [issue['id'] for issue in issues]
+
+    result = storage.query_issues(sort='-priority', page_size=2)
+    assert result['total'] == 4
+    assert [issue['id'] for issue in result['items']] == [ids[1], ids[3]]
+    assert [issue['id'] for issue in storage.query_issues(sort='-priority', page=2, page_size=2)['items']] == [
+        ids[2], ids[0]
+    ]
+
+    # Missing values sort first ascending and last descending
+    assert [issue['id'] for issue in storage.query_issues(sort='estimated_cost')['items']] == [
+        ids[3], ids[1], ids[2], ids[0]
+    ]
+    assert storage.query_issues(sort='-estimated_cost')['items'][-1]['id'] == ids[3]
+
+    filtered = storage.query_issues({"priority": ['high', 'low'], "location": 'Airport', "min_estimated_cost": 15})
+    assert [issue['id'] for issue in filtered['items']] == [ids[2], ids[0]]
+
+    created_from = datetime.utcnow() - timedelta(minutes=1)
+    assert storage.query_issues({"created_from": created_from.isoformat()})['total'] == 4
+    assert storage.query_issues({"fixed_from": created_from.isoformat()})['total'] == 0
+    assert storage.query_issues({"status": 'fixed'}) == {"items": [], "total": 0, "page": 1, "pageSize": 50}
+
+    with pytest.raises(ValueError):
+        storage.query_issues({"colour": 'red'})
+    with pytest.raises(ValueError):
+        storage.query_issues(sort='-password')
+
+
+def test_user_issue_feeds(storage):
+    ids = [create_issue(storage, reportedById=1 if n < 5 else 2)['id'] for n in range(6)]
+    storage.mark_issue_as_fixed(ids[1], 7, 'fixer')
+    time.sleep(0.002)
+    storage.mark_issue_as_fixed(ids[5], 7, 'fixer')
+
+    first = storage.get_user_issues(1, limit=2, fields=('title',))
+    assert first['items'] == [{"title": "Broken lamp"}] * 2
+    assert first['counts'] == {"pending": 4, "fixed": 1, "total": 5}
+    second = storage.get_user_issues(1, limit=2, cursor=first['nextCursor'])
+    last = storage.get_user_issues(1, limit=2, cursor=second['nextCursor'])
+    assert [issue['id'] for issue in second['items'] + last['items']] == [ids[2], ids[1], ids[0]]
+    assert last['nextCursor'] is None
+
+    pending = storage.get_user_issues(1, statuses=['pending', 'in_progress'])
+    assert [issue['id'] for issue in pending['items']] == [ids[4], ids[3], ids[2], ids[0]]
+    # Fixers' feeds go by fix time, latest first
+    fixed = storage.get_user_issues(7, role='fixer', limit=1)
+    assert [issue['id'] for issue in fixed['items']] == [ids[5]]
+    assert storage.get_user_issues(7, role='fixer', cursor=fixed['nextCursor'])['items'][0]['id'] == ids[1]
+    assert storage.get_user_issues(3) == {"items": [], "nextCursor": None, "counts": {"total": 0}}
+
+    with pytest.raises(ValueError):
+        storage.get_user_issues(1, role='owner')
+    with pytest.raises(ValueError):
+        storage.get_user_issues(1, cursor='yesterday')
+
+
+def test_get_issues_by_ids(storage):
+    first = create_issue(storage, imageUrls=['a.jpg'])
+    second = create_issue(storage)
+
+    result = storage.get_issues_by_ids([second['id'], 999, first['id'], second['id']], fields=('title', 'image_urls'))
+
+    assert result == {
+        "items": [{"title": "Broken lamp", "image_urls": []}, {"title": "Broken lamp", "image_urls": ['a.jpg']}],
+        "missing": [999],
+    }
+
+
+def test_nearby_and_heatmap(storage):
+    near = create_issue(storage, latitude='54.35', longitude='18.60', priority='urgent')
+    create_issue(storage, latitude='52.23', longitude='21.01')
+    create_issue(storage)
+    fixed = create_issue(storage, latitude='54.36', longitude='18.61')
+    storage.mark_issue_as_fixed(fixed['id'], 2, 'fixer')
+
+    assert [issue['id'] for issue in storage.get_nearby_issues(54.351, 18.601, 5)] == [near['id'], fixed['id']]
+    assert sorted(storage.get_heatmap_points()) == [(52.23, 21.01, 2), (54.35, 18.6, 4)]
+
+
+def test_comments_and_images(storage):
+    issue = create_issue(storage)
+    first = storage.create_comment({"content": "First", "userId": 1, "userName": "ann", "issueId": issue['id']})
+    time.sleep(0.002)
+    storage.create_comment({"content": "Second", "userId": 2, "userName": "bob", "issueId": issue['id']})
+    image = storage.create_image({"filename": 'c.jpg', "issueId": issue['id']})
+
+    assert first['content'] == 'First'
+    assert [comment['content'] for comment in storage.get_comments(issue['id'])] == ['First', 'Second']
+    assert storage.get_image(image['id'])['filename'] == 'c.jpg'
+    assert [image['filename'] for image in storage.get_images_by_issue_id(issue['id'])] == ['c.jpg']
+    assert storage.get_issue(issue['id'])['image_urls'] == ['c.jpg']
+
+    history = storage.create_status_history({
+        "issueId": issue['id'], "oldStatus": 'pending', "newStatus": 'in_progress', "changedById": 2,
+    })
+    assert history['changed_by_id'] == 2
+    assert storage.get_status_history(issue['id'])[0]['id'] == history['id']
+
+
+def test_analytics(storage):
+    electrical = [create_issue(storage, issueType='electrical', location='Mall') for _ in range(3)]
+    create_issue(storage, issueType='plumbing')
+    for issue in electrical[:2]:
+        storage.mark_issue_as_fixed(issue['id'], 2, 'fixer')
+
+    statistics = storage.get_issue_statistics()
+    assert {key: statistics[key] for key in ('totalIssues', 'openIssues', 'fixedIssues', 'averageFixTime')} == {
+        "totalIssues": 4, "openIssues": 2, "fixedIssues": 2, "averageFixTime": 0,
+    }
+    assert statistics['mostReportedLocation'] == 'Mall'
+    assert statistics['lastFixDate'] == storage.get_issue(electrical[1]['id'])['fixed_at']
+    assert storage.get_issue_statistics('plumbing')['fixedIssues'] == 0
+
+    today = datetime.utcnow().date()
+    points = storage.get_issue_timeseries(start=today - timedelta(days=1), end=today + timedelta(days=1))
+    assert points == [
+        {"bucket": (today - timedelta(days=1)).isoformat(), "opened": 0, "fixed": 0, "backlog": 0},
+        {"bucket": today.isoformat(), "opened": 4, "fixed": 2, "backlog": 2},
+    ]
+    assert storage.get_fix_time_percentiles() == [
+        {"group": 'electrical', "count": 2, "averageFixTime": 0, "medianFixTime": 0, "p90FixTime": 0},
+    ]
+    with pytest.raises(ValueError):
+        storage.get_issue_timeseries(bucket='year')
+
+
+def test_writes_bump_data_version(storage):
+    before = storage.get_data_version()['version']
+    issue = create_issue(storage)
+    after_create = storage.get_data_version()['version']
+    storage.create_comment({"content": "Hi", "userId": 1, "userName": "ann", "issueId": issue['id']})
+
+    assert after_create > before
+    assert storage.get_data_version()['version'] > after_create
+    assert storage.get_write_metrics()['transactions'] >= 2
+
+
+def test_archive_fixed_issues(storage):
+    fixed = create_issue(storage, imageUrls=['a.jpg'])
+    storage.create_comment({"content": "Done", "userId": 1, "userName": "ann", "issueId": fixed['id']})
+    storage.mark_issue_as_fixed(fixed['id'], 2, 'fixer')
+    open_issue = create_issue(storage)
+
+    result = storage.archive_fixed_issues(older_than_days=-1)
+
+    assert result['archivedIssues'] == 1
+    assert [issue['id'] for issue in storage.get_issues()] == [open_issue['id']]
+    assert storage.get_issue(fixed['id'], include_archived=False) is None
+    archived = storage.get_issue(fixed['id'])
+    assert archived['status'] == 'fixed'
+    assert archived['image_urls'] == ['a.jpg']
+    assert [comment['content'] for comment in storage.get_comments(fixed['id'])] == ['Done']
+    assert len(storage.get_status_history(fixed['id'])) == 1
+    assert storage.get_issues_by_ids([fixed['id']])['missing'] == []
+    assert storage.archive_fixed_issues(older_than_days=-1)['archivedIssues'] == 0
+
+
+def test_activity_counters(storage):
+    issue = create_issue(storage, imageUrls=['a.jpg'])
+    assert (issue['comment_count'], issue['image_count'], issue['status_change_count']) == (0, 1, 0)
+    assert issue['last_activity_at'] == issue['created_at']
+
+    time.sleep(0.002)
+    comment = storage.create_comment({"content": "Hi", "userId": 1, "userName": "ann", "issueId": issue['id']})
+    storage.create_image({"filename": 'b.jpg', "issueId": issue['id']})
+    time.sleep(0.002)
+    fixed = storage.mark_issue_as_fixed(issue['id'], 2, 'fixer', expected_version=1)
+
+    # Counter upkeep is not an edit: only the status change bumped the version
+    assert fixed['version'] == 2
+    assert (fixed['comment_count'], fixed['image_count'], fixed['status_change_count']) == (1, 2, 1)
+    assert fixed['last_activity_at'] == fixed['fixed_at'] > comment['created_at']
+
+    summary = storage.query_issues(fields=('id', 'comment_count', 'image_count', 'last_activity_at'))['items']
+    assert summary == [{
+        "id": issue['id'], "comment_count": 1, "image_count": 2, "last_activity_at": fixed['fixed_at'],
+    }]
+
+    storage.archive_fixed_issues(older_than_days=-1)
+    assert storage.get_issue(issue['id'])['comment_count'] == 1
+
+
+def test_sqlite_counter_drift_is_repaired(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'issues.db'))
+    issue = create_issue(storage)
+    storage.create_comment({"content": "Hi", "userId": 1, "userName": "ann", "issueId": issue['id']})
+
+    conn = sqlite3.connect(storage.db_path)
+    conn.execute('UPDATE issues SET comment_count = 5, image_count = 2 WHERE id = ?', (issue['id'],))
+    conn.commit()
+    conn.close()
+
+    assert storage.verify_activity_counters()['issueIds'] == [issue['id']]
+    assert storage.verify_activity_counters(repair=True)['repaired'] is True
+    assert storage.verify_activity_counters()['driftedIssues'] == 0
+    assert storage.get_issue(issue['id'])['comment_count'] == 1
+
+
+def test_optional_operations(storage):
+    issue = create_issue(storage)
+    if isinstance(storage, InMemoryStorage):
+        assert not storage.supports_jobs()
+        for call in (
+            lambda: storage.enqueue_job('notify', {"issueId": issue['id']}),
+            lambda: storage.subscribe_job('issue_created', 'notify'),
+            storage.verify_activity_counters,
+            storage.peek_next_issue,
+            storage.rebuild_similarity_index,
+            storage.prepare_archive,
+        ):
+            with pytest.raises(UnsupportedOperation):
+                call()
+        return
+
+    assert storage.supports_jobs()
+    assert storage.enqueue_job('notify', {"issueId": issue['id']}) > 0
+    assert storage.verify_activity_counters()['driftedIssues'] == 0
+    assert storage.peek_next_issue()['id'] == issue['id']
+
+
+def test_work_queue_claims(storage):
+    low = create_issue(storage, priority='low', issueType='electrical')
+    old_high = create_issue(storage, priority='high', issueType='electrical')
+    create_issue(storage, priority='high', issueType='electrical')
+    plumbing = create_issue(storage, priority='urgent', issueType='plumbing', location='Mall')
+
+    claimed = storage.claim_next_issue(7, 'tech', ['electrical'])
+    assert claimed['id'] == old_high['id']
+    assert claimed['status'] == 'in_progress'
+    assert (claimed['claimed_by_id'], claimed['claimed_by_name']) == (7, 'tech')
+    assert claimed['lease_expires_at'] > claimed['updated_at']
+    assert claimed['version'] == 2
+    assert claimed['status_change_count'] == 1
+    assert storage.get_status_history(old_high['id'])[0]['notes'] == 'Claimed from the work queue'
+
+    assert storage.claim_next_issue(8, 'other', ['plumbing'], 'Airport') is None
+    assert storage.claim_next_issue(8, 'other', ['plumbing'], 'Mall')['id'] == plumbing['id']
+    assert storage.claim_next_issue(8, 'other')['priority'] == 'high'
+    assert storage.claim_next_issue(8, 'other')['id'] == low['id']
+    assert storage.claim_next_issue(8, 'other') is None
+
+
+def test_expired_leases_return_to_the_queue(storage):
+    issue = create_issue(storage)
+    storage.claim_next_issue(7, 'tech', lease_seconds=0)
+    time.sleep(0.002)
+
+    reclaimed = storage.claim_next_issue(8, 'other')
+
+    assert reclaimed['id'] == issue['id']
+    assert reclaimed['claimed_by_id'] == 8
+    # The release and the new claim share a timestamp, so order by id
+    history = sorted(storage.get_status_history(issue['id']), key=lambda h: h['id'])
+    assert [(h['old_status'], h['new_status'], h['notes']) for h in history] == [
+        ('pending', 'in_progress', 'Claimed from the work queue'),
+        ('in_progress', 'pending', 'Lease expired'),
+        ('pending', 'in_progress', 'Claimed from the work queue'),
+    ]
+
+    fixed = storage.mark_issue_as_fixed(issue['id'], 8, 'other')
+    assert fixed['lease_expires_at'] is None
+
+
+def test_expired_leases_clear_the_claimant(storage):
+    issue = create_issue(storage, issueType='electrical')
+    storage.claim_next_issue(7, 'tech', lease_seconds=0)
+    time.sleep(0.002)
+
+    # Looking for other work still puts the expired issue back
+    assert storage.claim_next_issue(8, 'other', ['plumbing']) is None
+    released = storage.get_issue(issue['id'])
+    assert released['status'] == 'pending'
+    assert (released['claimed_by_id'], released['claimed_by_name'], released['lease_expires_at']) == (None, None, None)
+    with pytest.raises(LeaseNotHeld):
+        storage.renew_issue_lease(issue['id'], 7)
+
+
+def test_renewing_and_releasing_leases(storage):
+    issue = create_issue(storage)
+    claimed = storage.claim_next_issue(7, 'tech', lease_seconds=60)
+
+    renewed = storage.renew_issue_lease(issue['id'], 7, lease_seconds=3600)
+    assert renewed['lease_expires_at'] >= claimed['lease_expires_at'] + 3500 * 1000
+    assert renewed['version'] == claimed['version'] + 1
+    with pytest.raises(LeaseNotHeld) as e:
+        storage.renew_issue_lease(issue['id'], 8)
+    assert (e.value.id, e.value.claimed_by_id) == (issue['id'], 8)
+    with pytest.raises(LeaseNotHeld):
+        storage.release_issue_lease(issue['id'], 8)
+    assert storage.renew_issue_lease(issue['id'] + 100, 7) is None
+    assert storage.release_issue_lease(issue['id'] + 100, 7) is None
+
+    released = storage.release_issue_lease(issue['id'], 7, 'Needs a ladder')
+    assert released['status'] == 'pending'
+    assert (released['claimed_by_id'], released['claimed_by_name'], released['lease_expires_at']) == (None, None, None)
+    assert released['status_change_count'] == 2
+    latest = max(storage.get_status_history(issue['id']), key=lambda h: h['id'])
+    assert (latest['old_status'], latest['new_status'], latest['changed_by_id'], latest['changed_by_name'],
+            latest['notes']) == ('in_progress', 'pending', 7, 'tech', 'Needs a ladder')
+    with pytest.raises(LeaseNotHeld):
+        storage.release_issue_lease(issue['id'], 7)
+
+    # The released issue is the next one claimed
+    assert storage.claim_next_issue(8, 'other')['id'] == issue['id']
+
+
+def test_claimant_status_updates_extend_the_lease(storage):
+    issue = create_issue(storage)
+    claimed = storage.claim_next_issue(7, 'tech', lease_seconds=1)
+
+    # The claimant's own updates keep the issue theirs
+    kept = storage.update_issue_status(issue['id'], 'in_progress', 7, 'tech')
+    assert kept['lease_expires_at'] > claimed['lease_expires_at']
+    assert kept['claimed_by_id'] == 7
+    on_hold = storage.update_issue_status(issue['id'], 'on_hold', 7, 'tech')
+    assert on_hold['lease_expires_at'] >= kept['lease_expires_at']
+
+    # Anyone else's change ends the lease
+    other = storage.update_issue_status(issue['id'], 'in_progress', 9, 'dispatcher')
+    assert other['lease_expires_at'] is None
+    with pytest.raises(LeaseNotHeld):
+        storage.renew_issue_lease(issue['id'], 7)
+
+    # Moving an issue back to pending leaves it unclaimed
+    pending = storage.update_issue_status(issue['id'], 'pending', 9, 'dispatcher')
+    assert (pending['claimed_by_id'], pending['claimed_by_name']) == (None, None)
+
+
+def test_similar_issues(storage):
+    fryer = create_issue(storage, title="Fryer not heating", description="The left fryer does not heat up",
+                         location='Mall', pinX=410, pinY=220)
+    far_fryer = create_issue(storage, title="Fryer not heating", description="The left fryer does not heat up",
+                             location='Mall', pinX=1400, pinY=900)
+    create_issue(storage, title="Fryer not heating", description="The left fryer does not heat up", location='Airport')
+    create_issue(storage, title="Door handle loose", description="Back door handle is loose", location='Mall')
+    fixed = create_issue(storage, title="Fryer not heating up", description="Left fryer cold", location='Mall')
+    storage.mark_issue_as_fixed(fixed['id'], 2, 'fixer')
+
+    report = {"title": "Left fryer not heating", "description": "Fryer on the left does not heat",
+              "location": 'Mall', "pinX": 400, "pinY": 230}
+    similar = storage.find_similar_issues(report)
+    # Same location only, open issues only, the nearer pin first
+    assert [issue['id'] for issue in similar] == [fryer['id'], far_fryer['id']]
+    assert similar[0]['similarity']['score'] > similar[1]['similarity']['score']
+    assert similar[0]['similarity']['distance'] == {"pixels": 14.1}
+    assert storage.find_similar_issues({**report, "title": "Ceiling tile missing", "description": ""}) == []
+
+    # Edits move an issue in and out of the index
+    storage.update_issue(far_fryer['id'], {"title": "Ceiling tile missing", "description": "Tile fell down"})
+    assert [issue['id'] for issue in storage.find_similar_issues(report)] == [fryer['id']]
+    storage.delete_issue(fryer['id'])
+    assert storage.find_similar_issues(report) == []